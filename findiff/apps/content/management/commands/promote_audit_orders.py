@@ -0,0 +1,214 @@
+import datetime
+import os
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from findiff.apps.content.models import JobCheckpoint
+from findiff.apps.content.signals import (ARTICLE_CACHE, BOOK_CACHE,
+                                          CONTENT_CACHE)
+from findiff.apps.review.models import AuditOrder
+from findiff.apps.userprofile.models import UserProfile
+from findiff.common import storage
+from findiff.common.httpcache import bump_version
+from findiff.models import Article, Author, Book
+
+CHECKPOINT = 'promote_audit_orders'
+DEFAULT_AUTHOR = '佚名'
+READING_MODES = {'h': 'lr', 'v': 'rl'}
+PAGE_NUMBER = re.compile(r'(\d+)\D*$')
+ARTICLE_FIELDS = ('article_title', 'book_page', 'content_image', 'content_text')
+
+
+def page_title(content_text_name):
+    """每页文件名去掉目录和扩展名作为文章标题，文件名末尾的数字作为页码"""
+
+    title = os.path.splitext(os.path.basename(content_text_name))[0]
+    match = PAGE_NUMBER.search(title)
+    return title, int(match.group(1)) if match else None
+
+
+class Command(BaseCommand):
+    help = '将初审、复审均已完成的工单发布为书籍、文章，中断后从断点继续'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operator', type=int, required=True, help='发布操作人的用户ID')
+        parser.add_argument(
+            '--author', type=int, default=None,
+            help=f'新文章的作者ID，默认为“{DEFAULT_AUTHOR}”')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, help='每批处理的工单数，默认 1000')
+        parser.add_argument(
+            '--reset', action='store_true', help='忽略断点，从头开始发布')
+
+    def handle(self, *args, **options):
+        try:
+            operator = UserProfile.objects.get(pk=options['operator'])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f'用户 {options["operator"]} 不存在')
+        if options['author']:
+            try:
+                author = Author.objects.get(pk=options['author'])
+            except Author.DoesNotExist:
+                raise CommandError(f'作者 {options["author"]} 不存在')
+        else:
+            author, _ = Author.objects.get_or_create(
+                name=DEFAULT_AUTHOR, defaults={'operator': operator})
+
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        position = {} if options['reset'] else checkpoint.position
+        last_time = position.get('updated_time')
+        last_time = last_time and datetime.datetime.fromisoformat(last_time)
+        last_id = position.get('id', 0)
+
+        # NOTE 按 (updated_time, id) 增量读取，复审后再次修改的工单也会重新发布；
+        # 本次运行期间更新的工单留到下次运行
+        queryset = AuditOrder.objects.filter(
+            first_order_status='success',
+            second_order_status='success',
+            updated_time__lt=datetime.datetime.now(),
+        ).select_related('raw_data').only(
+            'updated_time',
+            'first_audit_result',
+            'first_audit_patch',
+            'second_audit_result',
+            'second_audit_patch',
+            'raw_data__book_id',
+            'raw_data__book_name',
+            'raw_data__writing_mode',
+            'raw_data__content_image',
+            'raw_data__content_text',
+            'raw_data__content_text_name',
+        ).order_by('updated_time', 'id')
+
+        total = created = updated = 0
+        while True:
+            batch = queryset
+            if last_time:
+                batch = batch.filter(
+                    Q(updated_time__gt=last_time) |
+                    Q(updated_time=last_time, id__gt=last_id))
+            orders = list(batch[:options['batch_size']])
+            if not orders:
+                break
+            last_time, last_id = orders[-1].updated_time, orders[-1].id
+
+            # 发布结果与断点在同一事务中提交，中断后重复执行不会重复发布
+            with transaction.atomic():
+                counts = self.promote(orders, operator, author)
+                checkpoint.position = {
+                    'updated_time': last_time.isoformat(),
+                    'id': last_id,
+                }
+                checkpoint.save(update_fields=['position', 'updated_time'])
+            total += len(orders)
+            created += counts[0]
+            updated += counts[1]
+            self.stdout.write(
+                f'已处理 {total} 个工单，新增 {created} 篇，更新 {updated} 篇')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：处理 {total} 个工单，新增 {created} 篇文章，更新 {updated} 篇'))
+
+    def promote(self, orders, operator, author):
+        """按 RawData.book_id 分组写入书籍，每页写入一篇文章
+
+        Django 3.2 的 bulk_create 不支持 update_conflicts，这里先查出已有文章，
+        新文章 bulk_create，内容变化的文章 bulk_update；文章编号为 RawData id。
+        批量写入不触发信号，扫描件引用计数在同一事务中维护。
+        返回 (新增文章数, 更新文章数)
+        """
+
+        books = {}
+        pages = {}
+        for order in orders:
+            raw_data = order.raw_data
+            if not raw_data.book_id:
+                continue
+            first_result, second_result = order.get_audit_results()
+            title, book_page = page_title(raw_data.content_text_name)
+            books.setdefault(raw_data.book_id, raw_data)
+            # 同一页有多个工单时以最后更新的为准
+            pages[raw_data.book_id, str(raw_data.pk)] = {
+                'article_title': title,
+                'book_page': book_page,
+                'content_image': raw_data.content_image,
+                'content_text': second_result or first_result,
+            }
+        if not pages:
+            return 0, 0
+
+        # NOTE 新书默认不开放，编辑确认后再开放；已有书籍的信息不覆盖
+        book_ids = dict(Book.objects.filter(book_snum__in=books).values_list(
+            'book_snum', 'id'))
+        new_books = [
+            Book(
+                book_snum=book_snum,
+                book_name=raw_data.book_name,
+                writing_mode=raw_data.writing_mode,
+                reading_mode=READING_MODES.get(raw_data.writing_mode, 'lr'),
+                book_open_status='close',
+                operator=operator,
+            )
+            for book_snum, raw_data in books.items()
+            if book_snum not in book_ids
+        ]
+        if new_books:
+            Book.objects.bulk_create(new_books, ignore_conflicts=True)
+            book_ids = dict(Book.objects.filter(
+                book_snum__in=books).values_list('book_snum', 'id'))
+
+        existing = {
+            (article.book_id_id, article.article_snum): article
+            for article in Article.objects.filter(
+                book_id__in=book_ids.values(),
+                article_snum__in=[snum for _, snum in pages],
+            ).only('id', 'book_id', 'article_snum', *ARTICLE_FIELDS)
+        }
+        now = datetime.datetime.now()
+        new_articles = []
+        changed = []
+        acquired = []
+        released = []
+        for (book_snum, article_snum), fields in pages.items():
+            book_id = book_ids[book_snum]
+            article = existing.get((book_id, article_snum))
+            if article is None:
+                new_articles.append(Article(
+                    book_id_id=book_id,
+                    author_id=author,
+                    article_snum=article_snum,
+                    article_review_status='success',
+                    operator=operator,
+                    **fields,
+                ))
+                acquired.append(fields['content_image'])
+            elif any(getattr(article, name) != value
+                     for name, value in fields.items()):
+                if article.content_image != fields['content_image']:
+                    released.append(article.content_image)
+                    acquired.append(fields['content_image'])
+                for name, value in fields.items():
+                    setattr(article, name, value)
+                article.operator = operator
+                article.updated_time = now
+                changed.append(article)
+
+        # NOTE 与并发发布冲突而未写入的新文章也会计入引用，只会推迟清理文件
+        Article.objects.bulk_create(new_articles, ignore_conflicts=True)
+        Article.objects.bulk_update(
+            changed, ARTICLE_FIELDS + ('operator', 'updated_time'))
+        storage.acquire([storage.media_name(name) for name in acquired])
+        storage.release([storage.media_name(name) for name in released])
+
+        # bulk_create、bulk_update 不触发 post_save，需手动使公开接口缓存失效
+        names = [BOOK_CACHE % book_id for book_id in {
+            article.book_id_id for article in new_articles + changed}]
+        names += [ARTICLE_CACHE % article.pk for article in changed]
+        if new_books:
+            names.append(CONTENT_CACHE)
+        bump_version(*names)
+        return len(new_articles), len(changed)
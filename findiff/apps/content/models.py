@@ -0,0 +1,16 @@
+from django.db import models
+
+
+class JobCheckpoint(models.Model):
+    """批处理任务的断点，任务中断后从断点继续"""
+
+    name = models.CharField('任务名称', max_length=100, unique=True)
+    position = models.JSONField('断点位置', default=dict)
+    updated_time = models.DateTimeField('更新时间', auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}-{self.position}'
+
+    class Meta:
+        verbose_name = '任务断点'
+        verbose_name_plural = verbose_name
@@ -0,0 +1,102 @@
+"""书籍、文章、原始校对数据的全文检索
+
+MySQL 上使用 ngram（二元分词）全文索引：倒排索引由 InnoDB 在写入时增量维护，
+查询使用 MATCH ... AGAINST，按相关度排序。索引见 findiff 0003、review 0009 迁移。
+其他数据库或检索词短于分词长度时退回 icontains，按 id 倒序。
+
+摘要在数据库中截取（第一个检索词附近 SNIPPET_LENGTH 个字），不读取全文。
+书籍、文章只检索已开放的内容，与公开接口一致；原始校对数据需要查看工单的权限。
+"""
+import re
+
+from django.db.models import F, IntegerField, Q, Value
+from django.db.models.functions import Greatest, StrIndex, Substr
+
+from findiff.apps.review.models import RawData
+from findiff.common.fulltext import fulltext_available, match_against
+from findiff.models import Article, Book
+
+SNIPPET_LENGTH = 80
+SNIPPET_BEFORE = 20
+MAX_TERMS = 8
+
+# type: (模型, 全文索引覆盖的列, 标题列, 摘要列, 额外返回的列)
+SOURCES = {
+    'article': (Article, ('article_title', 'content_text'),
+                'article_title', 'content_text', ('book_id',)),
+    'book': (Book, ('book_name',), 'book_name', 'book_name', ()),
+    'rawdata': (RawData, ('book_name', 'content_text'),
+                'book_name', 'content_text', ('book_id',)),
+}
+# 检索范围: 可见数据的条件
+VISIBLE = {
+    'article': Q(article_open_status='open', book_id__book_open_status='open'),
+    'book': Q(book_open_status='open'),
+}
+# 检索范围: 所需权限
+SOURCE_PERMS = {
+    'rawdata': ('userprofile.list_audit_order',),
+}
+
+
+def parse_terms(query):
+    """按空白、逗号拆分检索词，去重后最多保留 MAX_TERMS 个"""
+
+    terms = []
+    for term in re.split(r'[\s,，]+', query or ''):
+        if term and term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def search(source, terms):
+    """返回检索结果的 values 查询集：id、title、score、snippet 及额外列"""
+
+    model, columns, title, text, extra = SOURCES[source]
+    queryset = model.objects.filter(VISIBLE.get(source, Q()))
+
+    if fulltext_available(queryset, terms):
+        queryset = queryset.filter(match_against(model, columns, terms))
+        score = match_against(model, columns, terms, score=True)
+        ordering = ('-score', '-id')
+    else:
+        condition = Q()
+        for term in terms:
+            term_condition = Q()
+            for column in columns:
+                term_condition |= Q(**{f'{column}__icontains': term})
+            condition &= term_condition
+        queryset = queryset.filter(condition)
+        score = Value(0.0)
+        ordering = ('-id',)
+
+    # 从第一个检索词前 SNIPPET_BEFORE 个字开始截取摘要
+    position = StrIndex(text, Value(terms[0]))
+    start = Greatest(position - SNIPPET_BEFORE, Value(1),
+                     output_field=IntegerField())
+    return queryset.annotate(
+        score=score,
+        title=F(title),
+        snippet=Substr(text, start, SNIPPET_LENGTH),
+    ).values('id', 'title', 'score', 'snippet', *extra).order_by(*ordering)
+
+
+def highlight(snippet, terms):
+    """检索词在摘要中的位置 [[start, end], ...]，重叠的区间合并"""
+
+    spans = []
+    lowered = (snippet or '').lower()
+    for term in terms:
+        term = term.lower()
+        start = lowered.find(term)
+        while start != -1:
+            spans.append([start, start + len(term)])
+            start = lowered.find(term, start + 1)
+
+    merged = []
+    for span in sorted(spans):
+        if merged and span[0] <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], span[1])
+        else:
+            merged.append(span)
+    return merged
@@ -0,0 +1,99 @@
+from rest_framework import serializers
+
+from findiff.models import Article, Author, Book
+from .search import SOURCES, highlight, parse_terms
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """检索参数"""
+
+    q = serializers.CharField(max_length=100, help_text='检索词，多个用空格分隔')
+    type = serializers.ChoiceField(
+        choices=sorted(SOURCES), default='article', help_text='检索范围')
+
+    def validate_q(self, value):
+        if not parse_terms(value):
+            raise serializers.ValidationError('检索词不能为空')
+        return value
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """检索结果，highlights 为检索词在 snippet 中的位置"""
+
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    score = serializers.FloatField()
+    snippet = serializers.CharField()
+    highlights = serializers.SerializerMethodField()
+    book_id = serializers.CharField(required=False)
+
+    def get_highlights(self, obj):
+        return highlight(obj['snippet'], self.context['terms'])
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Author
+        fields = ('id', 'name', 'dynasty', 'writing_school')
+
+
+class BookSerializer(serializers.ModelSerializer):
+    """公开书籍"""
+
+    authors = AuthorSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Book
+        fields = (
+            'id',
+            'book_snum',
+            'book_name',
+            'authors',
+            'writing_mode',
+            'reading_mode',
+            'book_genre',
+            'book_dynasty',
+            'updated_time',
+        )
+
+
+class TocArticleSerializer(serializers.ModelSerializer):
+    """书籍目录中的文章，不含正文"""
+
+    author = serializers.CharField(source='author_id.name', read_only=True)
+
+    class Meta:
+        model = Article
+        fields = (
+            'id',
+            'article_snum',
+            'article_title',
+            'author',
+            'book_page',
+            'article_page',
+        )
+
+
+class ArticleSerializer(serializers.ModelSerializer):
+    """公开文章详情"""
+
+    book_id = serializers.IntegerField(source='book_id_id', read_only=True)
+    author = AuthorSerializer(source='author_id', read_only=True)
+
+    class Meta:
+        model = Article
+        fields = (
+            'id',
+            'book_id',
+            'article_snum',
+            'article_title',
+            'author',
+            'book_page',
+            'article_page',
+            'article_genre',
+            'article_dynasty',
+            'content_image',
+            'content_text',
+            'updated_time',
+        )
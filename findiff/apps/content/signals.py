@@ -0,0 +1,75 @@
+"""书籍、文章、作者变化时使公开接口的响应缓存失效
+
+缓存名称：
+    BOOKS_CACHE           书籍列表
+    BOOK_CACHE % id       书籍详情、目录
+    ARTICLE_CACHE % id    文章详情
+书籍开放状态、作者信息影响所有接口，书籍、作者变化时递增 CONTENT_CACHE，
+全部缓存失效；文章变化只影响所在书籍的目录和文章本身
+
+文章扫描件与原始数据共用文件，文章保存、删除时同时维护文件引用计数
+"""
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from findiff.common import storage
+from findiff.common.httpcache import bump_version
+from findiff.models import Article, Author, Book
+
+CONTENT_CACHE = 'content'
+BOOKS_CACHE = 'content_books'
+BOOK_CACHE = 'content_book_%s'
+ARTICLE_CACHE = 'content_article_%s'
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def article_changed(sender, instance, **kwargs):
+    bump_version(BOOK_CACHE % instance.book_id_id,
+                 ARTICLE_CACHE % instance.pk)
+
+
+@receiver(pre_save, sender=Article)
+def article_image_changed(sender, instance, raw=False, update_fields=None,
+                          **kwargs):
+    """新建文章或更换扫描件时更新文件引用计数
+
+    NOTE bulk_create、bulk_update 不触发信号，调用方需自行 acquire、release
+    """
+
+    if raw:
+        return
+    old_image = None
+    if not instance._state.adding:
+        if update_fields is not None and 'content_image' not in update_fields:
+            return
+        old_image = Article.objects.filter(pk=instance.pk).values_list(
+            'content_image', flat=True).first()
+    if old_image == instance.content_image:
+        return
+    if old_image:
+        storage.release([storage.media_name(old_image)])
+    if instance.content_image:
+        storage.acquire([storage.media_name(instance.content_image)])
+
+
+@receiver(post_delete, sender=Article)
+def release_content_image(sender, instance, **kwargs):
+    """文章删除后释放扫描件引用"""
+
+    storage.release([storage.media_name(instance.content_image)])
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def content_changed(sender, **kwargs):
+    bump_version(CONTENT_CACHE)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(CONTENT_CACHE)
@@ -0,0 +1,306 @@
+import datetime
+import io
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.http import parse_http_date
+from rest_framework.test import APIClient
+
+from findiff.apps.review.models import AuditOrder, RawData
+from findiff.apps.userprofile.models import UserProfile
+from findiff.common import httpcache, versions
+from findiff.models import Article, Author, Book, CacheVersion, MediaFile
+
+from . import search
+from .models import JobCheckpoint
+from .signals import BOOKS_CACHE, CONTENT_CACHE
+
+
+def create_book(operator, book_open_status='open', book_name='千字文'):
+    return Book.objects.create(
+        book_snum=f'B{Book.objects.count() + 1}',
+        book_name=book_name,
+        writing_mode='v',
+        reading_mode='rl',
+        book_open_status=book_open_status,
+        operator=operator,
+    )
+
+
+def create_article(book, author, content_text, article_open_status='open'):
+    return Article.objects.create(
+        book_id=book,
+        author_id=author,
+        article_snum=str(Article.objects.count() + 1),
+        article_title='第一页',
+        article_open_status=article_open_status,
+        content_image='/media/1.png',
+        content_text=content_text,
+        operator=book.operator,
+    )
+
+
+class SearchTest(TestCase):
+    """检索：sqlite 上走 icontains，只检索开放的书籍、文章"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.operator = UserProfile.objects.create(user=cls.user)
+        cls.author = Author.objects.create(name='周兴嗣', operator=cls.operator)
+        cls.book = create_book(cls.operator)
+        cls.closed_book = create_book(
+            cls.operator, book_open_status='close', book_name='千字文注')
+        cls.article = create_article(cls.book, cls.author, '天地玄黄宇宙洪荒')
+        create_article(cls.book, cls.author, '天地玄黄宇宙洪荒',
+                       article_open_status='close')
+        create_article(cls.closed_book, cls.author, '天地玄黄宇宙洪荒')
+        RawData.objects.create(
+            book_name='千字文', writing_mode='v', content_image='/media/1.png',
+            content_text='天地玄黄宇宙洪荒', content_text_name='1.txt',
+            content_image_name='1.png')
+
+    def test_parse_terms(self):
+        self.assertEqual(search.parse_terms(' 天地, 玄黄，天地\t宇宙 '),
+                         ['天地', '玄黄', '宇宙'])
+        self.assertEqual(search.parse_terms(None), [])
+        self.assertEqual(
+            len(search.parse_terms(' '.join(map(str, range(20))))),
+            search.MAX_TERMS)
+
+    def test_highlight(self):
+        # 重叠、相邻的区间合并，不区分大小写
+        self.assertEqual(search.highlight('天地玄黄玄黄', ['地玄', '玄黄']), [[1, 6]])
+        self.assertEqual(search.highlight('Abc abc', ['B']), [[1, 2], [5, 6]])
+        self.assertEqual(search.highlight(None, ['天']), [])
+
+    def test_open_only(self):
+        results = list(search.search('article', ['玄黄', '洪荒']))
+        self.assertEqual([item['id'] for item in results], [self.article.id])
+        self.assertEqual(results[0]['book_id'], self.book.id)
+        self.assertEqual(results[0]['score'], 0.0)
+
+        results = list(search.search('book', ['千字文']))
+        self.assertEqual([item['id'] for item in results], [self.book.id])
+
+        # 所有检索词都需匹配
+        self.assertFalse(search.search('article', ['玄黄', '日月']).exists())
+
+    def test_snippet(self):
+        text = '天' * 50 + '日月盈昃' + '地' * 100
+        article = create_article(self.book, self.author, text)
+        item = search.search('article', ['日月']).get()
+        self.assertEqual(item['id'], article.id)
+        start = 50 - search.SNIPPET_BEFORE
+        self.assertEqual(item['snippet'],
+                         text[start:start + search.SNIPPET_LENGTH])
+        self.assertEqual(search.highlight(item['snippet'], ['日月']),
+                         [[search.SNIPPET_BEFORE, search.SNIPPET_BEFORE + 2]])
+
+        # 检索词在开头时从第一个字截取
+        item = search.search('article', ['天天']).get()
+        self.assertEqual(item['snippet'], text[:search.SNIPPET_LENGTH])
+
+    def test_rawdata_perms(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/content/search/', {'q': '玄黄'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['highlights'], [[2, 4]])
+
+        params = {'q': '玄黄', 'type': 'rawdata'}
+        response = client.get('/content/search/', params)
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_superuser = True
+        client.force_authenticate(self.user)
+        response = client.get('/content/search/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class PublicContentTest(TestCase):
+    """公开接口：只返回开放的内容，数据变化后缓存失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        operator = UserProfile.objects.create(
+            user=User.objects.create_user('editor'))
+        cls.author = Author.objects.create(name='周兴嗣', operator=operator)
+        cls.book = create_book(operator)
+        cls.closed_book = create_book(operator, book_open_status='close')
+        cls.article = create_article(cls.book, cls.author, '天地玄黄')
+        cls.closed_article = create_article(
+            cls.book, cls.author, '宇宙洪荒', article_open_status='close')
+        cls.closed_book_article = create_article(
+            cls.closed_book, cls.author, '日月盈昃')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_closed(self):
+        response = self.client.get('/content/books/')
+        self.assertEqual([book['id'] for book in response.data['results']],
+                         [self.book.id])
+        response = self.client.get(f'/content/books/{self.book.id}/toc/')
+        self.assertEqual([item['article_snum'] for item in response.data],
+                         [self.article.article_snum])
+
+        for url in (f'/content/books/{self.closed_book.id}/',
+                    f'/content/books/{self.closed_book.id}/toc/',
+                    f'/content/articles/{self.closed_article.id}/',
+                    f'/content/articles/{self.closed_book_article.id}/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_article_changed(self):
+        url = f'/content/articles/{self.article.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.content_text = '天地元黄'
+            self.article.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['content_text'], '天地元黄')
+
+        # 关闭书籍后书中文章不再公开
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.book_open_status = 'close'
+            self.book.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unknown_params(self):
+        self.client.get('/content/books/')
+        self.client.get('/content/books/', {'book_genre': '蒙学'})
+        # 命中缓存时不查询数据库
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/content/books/', {'book_genre': '蒙学', 'nonce': '1'})
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.client.get('/content/books/', {'nonce': '2'})
+
+        # 版本号副本被淘汰时，书籍列表与全局版本号一次查询
+        cache.delete_many([
+            versions.VERSION_KEY % (httpcache.VERSION_KEY % name)
+            for name in (BOOKS_CACHE, CONTENT_CACHE)])
+        with self.assertNumQueries(1):
+            self.client.get('/content/books/', {'nonce': '3'})
+
+    def test_last_modified(self):
+        past = datetime.datetime.now() - datetime.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            other = create_book(self.book.operator, book_name='百家姓')
+        Book.objects.update(updated_time=past)
+        CacheVersion.objects.update(updated_time=past)
+        cache.clear()
+
+        response = self.client.get('/content/books/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(parse_http_date(last_modified),
+                         int(past.timestamp()))
+        response = self.client.get(
+            '/content/books/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # 关闭书籍后可见书籍的 updated_time 不变，Last-Modified 仍前移
+        with self.captureOnCommitCallbacks(execute=True):
+            other.book_open_status = 'close'
+            other.save()
+        response = self.client.get(
+            '/content/books/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.data['results']],
+                         [self.book.id])
+        self.assertGreater(parse_http_date(response['Last-Modified']),
+                           parse_http_date(last_modified))
+
+
+class PromoteAuditOrdersTest(TestCase):
+    """发布校对结果：重复执行不重复发布，从断点继续，维护扫描件引用"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = UserProfile.objects.create(
+            user=User.objects.create_user('editor'))
+
+    def create_order(self, book_id, page, text, second_order_status='success'):
+        raw_data = RawData.objects.create(
+            book_id=book_id,
+            book_name='千字文',
+            writing_mode='v',
+            content_image=f'/media/{book_id}/{page}.png',
+            content_text='天地玄黄',
+            content_text_name=f'{book_id}/{page:04d}.txt',
+            content_image_name=f'{page}.png',
+        )
+        return AuditOrder.objects.create(
+            raw_data=raw_data,
+            first_order_status='success',
+            first_audit_result='天地元黄',
+            second_order_status=second_order_status,
+            second_audit_result=text,
+        )
+
+    def promote(self, *args):
+        out = io.StringIO()
+        call_command('promote_audit_orders', '--operator', self.operator.id,
+                     '--batch-size', 2, *args, stdout=out)
+        return out.getvalue().splitlines()[-1]
+
+    def ref_count(self, url):
+        return MediaFile.objects.get(name=url[len('/media/'):]).ref_count
+
+    def test_promote(self):
+        orders = [self.create_order('B001', page, f'第{page}页')
+                  for page in range(1, 4)]
+        self.create_order('', 1, '没有书籍ID')
+        self.create_order('B002', 1, '复审未完成', second_order_status='suspend')
+
+        self.assertEqual(self.promote(),
+                         '完成：处理 4 个工单，新增 3 篇文章，更新 0 篇')
+        book = Book.objects.get()
+        self.assertEqual(
+            (book.book_snum, book.book_open_status, book.reading_mode),
+            ('B001', 'close', 'rl'))
+        articles = Article.objects.order_by('book_page')
+        self.assertEqual(
+            [(article.article_snum, article.article_title, article.book_page,
+              article.content_text) for article in articles],
+            [(str(order.raw_data_id), f'{page:04d}', page, f'第{page}页')
+             for page, order in enumerate(orders, 1)])
+        image = orders[0].raw_data.content_image
+        self.assertEqual(self.ref_count(image), 1)
+
+        # 重复执行不重复发布、不重复计入引用
+        self.assertEqual(self.promote(),
+                         '完成：处理 0 个工单，新增 0 篇文章，更新 0 篇')
+        self.assertEqual(self.promote('--reset'),
+                         '完成：处理 4 个工单，新增 0 篇文章，更新 0 篇')
+        self.assertEqual(Article.objects.count(), 3)
+        self.assertEqual(self.ref_count(image), 1)
+
+        # 删除文章时释放引用
+        articles[0].delete()
+        self.assertEqual(self.ref_count(image), 0)
+
+    def test_resume(self):
+        orders = [self.create_order('B001', page, f'第{page}页')
+                  for page in range(1, 4)]
+        self.promote()
+        checkpoint = JobCheckpoint.objects.get(name='promote_audit_orders')
+        self.assertEqual(checkpoint.position['id'], orders[-1].id)
+
+        # 断点之后修改的工单重新发布，其余工单不再处理
+        AuditOrder.objects.filter(id=orders[1].id).update(
+            second_audit_result='第二页',
+            updated_time=datetime.datetime.now())
+        self.assertEqual(self.promote(),
+                         '完成：处理 1 个工单，新增 0 篇文章，更新 1 篇')
+        article = Article.objects.get(article_snum=str(orders[1].raw_data_id))
+        self.assertEqual(article.content_text, '第二页')
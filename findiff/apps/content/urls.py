@@ -0,0 +1,12 @@
+from django.urls import path
+from rest_framework.routers import DefaultRouter
+from .views import PublicArticleViewSet, PublicBookViewSet, SearchView
+
+router = DefaultRouter()
+router.register('books', PublicBookViewSet)
+router.register('articles', PublicArticleViewSet)
+
+urlpatterns = [
+    path('search/', SearchView.as_view()),
+    *router.urls,
+]
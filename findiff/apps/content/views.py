@@ -0,0 +1,138 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import AllowAny
+
+from findiff.common.httpcache import cached_response
+from findiff.common.permissions.perms import PermsRequired
+from findiff.models import Article, Book
+
+from .search import SOURCE_PERMS, parse_terms, search
+from .serializers import (
+    ArticleSerializer,
+    BookSerializer,
+    SearchQuerySerializer,
+    SearchResultSerializer,
+    TocArticleSerializer,
+)
+from .signals import ARTICLE_CACHE, BOOK_CACHE, BOOKS_CACHE, CONTENT_CACHE
+
+# 允许客户端、CDN 缓存公开接口响应的秒数
+CACHE_MAX_AGE = 60
+
+
+class SearchView(ListAPIView):
+    """书籍、文章、原始校对数据全文检索，按相关度排序"""
+
+    serializer_class = SearchResultSerializer
+    filter_backends = ()
+
+    def get_permissions(self):
+        perms = SOURCE_PERMS.get(self.request.query_params.get('type'))
+        if perms:
+            self.permission_classes = [PermsRequired(*perms)]
+        return super().get_permissions()
+
+    def get_params(self):
+        if not hasattr(self, '_params'):
+            res = SearchQuerySerializer(data=self.request.query_params)
+            res.is_valid(raise_exception=True)
+            self._params = res.validated_data
+            self._params['terms'] = parse_terms(self._params['q'])
+        return self._params
+
+    def get_queryset(self):
+        params = self.get_params()
+        return search(params['type'], params['terms'])
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['terms'] = self.get_params()['terms']
+        return context
+
+    @swagger_auto_schema(query_serializer=SearchQuerySerializer)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class PublicContentMixin(object):
+    """公开接口：不鉴权，响应按缓存名称缓存并带 ETag、Last-Modified"""
+
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    # 影响响应内容的查询参数，其他参数不计入缓存 key，避免随意加参数绕过缓存
+    cache_params = ('page', 'page_size', 'search', 'book_genre', 'book_dynasty')
+
+    def cached(self, name, build):
+        # 依赖全局版本号，书籍、作者变化时全部缓存失效
+        query_params = self.request.query_params
+        params = [self.action, [
+            (param, query_params.getlist(param))
+            for param in self.cache_params if param in query_params
+        ]]
+        return cached_response(self.request, name, build, params=params,
+                               depends=[CONTENT_CACHE], max_age=CACHE_MAX_AGE)
+
+
+class PublicBookViewSet(PublicContentMixin, viewsets.ReadOnlyModelViewSet):
+    """开放的书籍列表、详情及目录"""
+
+    queryset = Book.objects.filter(book_open_status='open').prefetch_related(
+        'authors').order_by('id')
+    serializer_class = BookSerializer
+    search_fields = ('book_name',)
+    filterset_fields = ('book_genre', 'book_dynasty')
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            books = self.paginate_queryset(
+                self.filter_queryset(self.get_queryset()))
+            # NOTE 书籍变化都会递增 CONTENT_CACHE，Last-Modified 取其递增时间；
+            # 不取可见书籍的 updated_time，关闭书籍后它不会前移
+            return self.get_paginated_response(
+                self.get_serializer(books, many=True).data).data
+
+        return self.cached(BOOKS_CACHE, build)
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            book = self.get_object()
+            return self.get_serializer(book).data, book.updated_time
+
+        return self.cached(BOOK_CACHE % kwargs['pk'], build)
+
+    @action(methods=['get'], detail=True, serializer_class=TocArticleSerializer)
+    def toc(self, request, *args, **kwargs):
+        """书籍目录，按书籍页码排序，不含正文"""
+
+        def build():
+            book = self.get_object()
+            articles = list(Article.objects.filter(
+                book_id=book, article_open_status='open',
+            ).select_related('author_id').only(
+                'article_snum', 'article_title', 'book_page', 'article_page',
+                'updated_time', 'author_id__name',
+            ).order_by('book_page', 'id'))
+            modified = max([book.updated_time, *(
+                article.updated_time for article in articles)])
+            return self.get_serializer(articles, many=True).data, modified
+
+        return self.cached(BOOK_CACHE % kwargs['pk'], build)
+
+
+class PublicArticleViewSet(PublicContentMixin, mixins.RetrieveModelMixin,
+                           viewsets.GenericViewSet):
+    """开放的文章详情，所在书籍也需开放"""
+
+    queryset = Article.objects.filter(
+        article_open_status='open', book_id__book_open_status='open',
+    ).select_related('author_id')
+    serializer_class = ArticleSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            article = self.get_object()
+            return self.get_serializer(article).data, article.updated_time
+
+        return self.cached(ARTICLE_CACHE % kwargs['pk'], build)
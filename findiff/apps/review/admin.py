@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import AuditOrder, RawData
+from .models import (AuditDraft, AuditMetricRollup, AuditOrder, AuditOrderEvent,
+                     BookAuditStat, BookProgress, RawData)
 
 admin.site.register(AuditOrder)
 admin.site.register(RawData)
+admin.site.register(BookAuditStat)
+admin.site.register(AuditDraft)
+admin.site.register(BookProgress)
+admin.site.register(AuditOrderEvent)
+admin.site.register(AuditMetricRollup)
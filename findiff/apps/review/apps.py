@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ReviewConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'findiff.apps.review'
+
+    def ready(self):
+        from . import signals  # noqa: F401
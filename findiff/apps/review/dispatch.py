@@ -0,0 +1,208 @@
+"""校对领单
+
+领单按优先级依次尝试：
+    0. 用户指定状态（audit_status）的本人工单
+    1. 本人 unaudit / suspend 工单
+    2. 复审待分配工单（初审人不能是本人）
+    3. 初审待分配工单
+
+2、3 级优先从预取队列（dispatch_queue）取候选工单，队列不可用时在同一
+事务内通过 SELECT ... FOR UPDATE SKIP LOCKED 锁定候选行；两种方式最终都用
+带状态条件的 UPDATE 认领，保证同一工单不会被两人同时领取，且每次领单的
+查询数固定。
+"""
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from . import events, progress
+from .dispatch_queue import get_queue
+from .models import AuditOrder
+
+SELF_PENDING_STATUS = ('suspend', 'unaudit')
+
+# 队列中连续取到已被他人领走的工单时，最多重试的次数
+QUEUE_ATTEMPTS = 3
+
+
+def own_orders(user, audit_status):
+    """本人名下指定状态最早的工单，初审人、复审人各取一条
+
+    两个分支分别走 (first_audit_user, created_time)、
+    (second_audit_user, created_time) 索引，避免 OR 条件导致的 index merge
+    和 filesort。
+    """
+
+    status_q = Q(first_order_status__in=audit_status) \
+        | Q(second_order_status__in=audit_status)
+    return [
+        AuditOrder.objects.filter(status_q, **{field: user}).order_by(
+            'created_time').values_list('id', 'created_time')[:1]
+        for field in ('first_audit_user', 'second_audit_user')
+    ]
+
+
+def own_order_id(user, audit_status):
+    """本人名下指定状态最早的工单 id，没有时返回 None"""
+
+    first, second = own_orders(user, audit_status)
+    if connection.features.supports_slicing_ordering_in_compound:
+        rows = list(first.union(second, all=True))
+    else:
+        rows = [*first, *second]
+    if not rows:
+        return None
+    return min(rows, key=lambda row: (row[1], row[0]))[0]
+
+
+def second_audit_orders(user=None):
+    """可领取的复审工单，指定 user 时排除其初审的工单"""
+
+    queryset = AuditOrder.objects.filter(
+        first_order_status='success',
+        second_order_status='unassign',
+    )
+    if user is not None:
+        queryset = queryset.filter(~Q(first_audit_user=user))
+    return queryset.order_by('created_time')
+
+
+def first_audit_orders():
+    """可领取的初审工单"""
+
+    return AuditOrder.objects.filter(
+        first_order_status='unassign',
+    ).order_by('created_time')
+
+
+def dispatch_queries(user):
+    """领单用到的全部查询，供 explain_dispatch 命令检查执行计划"""
+
+    first, second = own_orders(user, SELF_PENDING_STATUS)
+    if connection.features.supports_slicing_ordering_in_compound:
+        own = {'own_orders': first.union(second, all=True)}
+    else:
+        own = {'own_orders_first': first, 'own_orders_second': second}
+    return {
+        **own,
+        'second_audit': second_audit_orders(user).values_list('id')[:1],
+        'second_audit_refill': second_audit_orders().values_list(
+            'id', 'first_audit_user_id')[:1],
+        'first_audit': first_audit_orders().values_list(
+            'id', 'first_audit_user_id')[:1],
+    }
+
+
+def claim(queryset, step, user):
+    """锁定 queryset 中第一条未被锁定的工单并分配给 user
+
+    return: 工单 id，没有可领工单时返回 None
+    """
+
+    with transaction.atomic():
+        order_id = queryset.select_for_update(
+            skip_locked=True).values_list('id', flat=True).first()
+        if order_id is None:
+            return None
+        return order_id if assign(order_id, step, user) else None
+
+
+def claim_queued(step, user):
+    """从预取队列领取工单，未配置队列或队列中无可领工单时返回 None"""
+
+    queue = get_queue()
+    if queue is None:
+        return None
+
+    source = first_audit_orders() if step == 'first_audit' \
+        else second_audit_orders()
+    for _ in range(QUEUE_ATTEMPTS):
+        order_id = queue.pop(step, user.id, source)
+        if order_id is None:
+            return None
+        if assign(order_id, step, user):
+            return order_id
+    return None
+
+
+def enqueue(step, entries):
+    """事务提交后把新的可领工单加入预取队列
+
+    entries: [(order_id, first_audit_user_id), ...]
+    """
+
+    queue = get_queue()
+    if queue is not None and entries:
+        transaction.on_commit(lambda: queue.push(step, entries))
+
+
+def expire(step):
+    """事务提交后标记预取队列需要重新从数据库补充"""
+
+    queue = get_queue()
+    if queue is not None:
+        transaction.on_commit(lambda: queue.expire(step))
+
+
+@transaction.atomic
+def assign(order_id, step, user):
+    """工单仍处于待分配状态时才分配，返回是否分配成功
+
+    领单与书籍进度计数在同一事务内提交
+    """
+
+    now = datetime.datetime.now()
+    if step == 'first_audit':
+        updated = AuditOrder.objects.filter(
+            id=order_id,
+            first_order_status='unassign',
+        ).update(
+            first_audit_user=user,
+            first_audit_time=now,
+            first_order_status='unaudit',
+            updated_time=now,
+            version=F('version') + 1,
+        )
+    else:
+        updated = AuditOrder.objects.filter(
+            ~Q(first_audit_user=user),
+            id=order_id,
+            first_order_status='success',
+            second_order_status='unassign',
+        ).update(
+            second_audit_user=user,
+            second_audit_time=now,
+            second_order_status='unaudit',
+            updated_time=now,
+            version=F('version') + 1,
+        )
+    if updated:
+        progress.transition(step, 'unassign', 'unaudit', order_id=order_id)
+        events.record(order_id, step, 'assigned', 'unassign', user)
+    return updated == 1
+
+
+def next_order_id(user, audit_status=None):
+    """按优先级为 user 分配下一张工单，返回工单 id，无可领工单时返回 None"""
+
+    # 0. 如果用户传递audit_status in [unaudit, suspend]，则优先下发
+    if audit_status:
+        order_id = own_order_id(user, list(audit_status))
+        if order_id is not None:
+            return order_id
+
+    # 1. 当前用户unaudit suspend优先
+    order_id = own_order_id(user, SELF_PENDING_STATUS)
+    if order_id is not None:
+        return order_id
+
+    # 2. 复审unaudit订单优先
+    order_id = claim_queued('second_audit', user) \
+        or claim(second_audit_orders(user), 'second_audit', user)
+    if order_id is not None:
+        return order_id
+
+    # 3. 最低优先级，分配初审待分配订单
+    return claim_queued('first_audit', user) \
+        or claim(first_audit_orders(), 'first_audit', user)
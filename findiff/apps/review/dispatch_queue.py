@@ -0,0 +1,202 @@
+"""领单预取队列
+
+按领单级别（复审、初审）缓存一批按 created_time 排好序的可领工单 id，
+领单时直接从队列头部弹出候选工单，再交由 dispatch.assign 做带状态条件的
+认领；队列为空时按批次从数据库补充。
+
+队列只是候选集合，最终是否领取成功以数据库条件 UPDATE 为准，所以多进程
+各自持有队列、队列中存在过期 id 都不会导致重复派单。但多进程各自持有的
+MemoryDispatchQueue 会预取相同的工单，领单时相互冲突，只适合单进程部署；
+多进程部署使用基于共享缓存的 CacheDispatchQueue。
+
+配置示例：
+    DISPATCH_QUEUE = {
+        'BACKEND': 'findiff.apps.review.dispatch_queue.CacheDispatchQueue',
+        'OPTIONS': {'batch_size': 200},
+    }
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+STEPS = ('first_audit', 'second_audit')
+
+
+class BaseDispatchQueue(object):
+    """队列后端基类
+
+    队列状态 state 格式：
+    {
+        'entries': [(order_id, first_audit_user_id), ...],
+        'exhausted': True,  # 上次补充时已取完数据库中全部候选工单
+    }
+    """
+
+    def __init__(self, batch_size=200, max_skip=20):
+        self.batch_size = batch_size
+        self.max_skip = max_skip
+
+    @contextmanager
+    def lock(self, step):
+        raise NotImplementedError
+
+    def load(self, step):
+        raise NotImplementedError
+
+    def store(self, step, state):
+        raise NotImplementedError
+
+    def empty_state(self):
+        return {'entries': [], 'exhausted': False}
+
+    def refill(self, queryset):
+        entries = list(queryset.values_list(
+            'id', 'first_audit_user_id')[:self.batch_size])
+        return {
+            'entries': entries,
+            'exhausted': len(entries) < self.batch_size,
+        }
+
+    def pop(self, step, user_id, queryset):
+        """弹出 user 可领取的第一张工单 id
+
+        queryset: 队列为空时用于补充候选工单的查询
+        return: 工单 id，队列中没有可领工单时返回 None
+        """
+
+        with self.lock(step) as locked:
+            if not locked:
+                return None
+
+            state = self.load(step)
+            if not state['entries']:
+                state = self.refill(queryset)
+
+            order_id = None
+            entries = state['entries']
+            candidates = itertools.islice(entries, self.max_skip)
+            for index, (entry_id, first_user_id) in enumerate(candidates):
+                # 复审不能领取自己初审的工单
+                if first_user_id != user_id:
+                    order_id = entry_id
+                    del entries[index]
+                    break
+
+            self.store(step, state)
+            return order_id
+
+    def push(self, step, entries):
+        """追加新的可领工单
+
+        队列未取完数据库中全部候选工单时，新工单排在未加载的工单之后，
+        由后续补充加载，这里直接忽略。
+        """
+
+        with self.lock(step) as locked:
+            if not locked:
+                return
+            state = self.load(step)
+            if not state['exhausted']:
+                return
+            state['entries'].extend(entries)
+            self.store(step, state)
+
+    def expire(self, step):
+        """标记队列需要从数据库补充，用于批量变更工单后"""
+
+        with self.lock(step) as locked:
+            if not locked:
+                return
+            state = self.load(step)
+            state['exhausted'] = False
+            self.store(step, state)
+
+    def clear(self):
+        for step in STEPS:
+            with self.lock(step):
+                self.store(step, self.empty_state())
+
+
+class MemoryDispatchQueue(BaseDispatchQueue):
+    """进程内队列"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._locks = {step: threading.Lock() for step in STEPS}
+        self._states = {}
+
+    @contextmanager
+    def lock(self, step):
+        with self._locks[step]:
+            yield True
+
+    def load(self, step):
+        return self._states.get(step) or self.empty_state()
+
+    def store(self, step, state):
+        state['entries'] = deque(state['entries'])
+        self._states[step] = state
+
+
+class CacheDispatchQueue(BaseDispatchQueue):
+    """基于 Django cache 的键值存储队列，可替换为 Redis 等共享缓存"""
+
+    def __init__(self, alias='default', key_prefix='dispatch_queue',
+                 timeout=300, lock_timeout=5, lock_wait=1, **options):
+        super().__init__(**options)
+        self.alias = alias
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, step, suffix='state'):
+        return f'{self.key_prefix}:{step}:{suffix}'
+
+    @contextmanager
+    def lock(self, step):
+        key = self.make_key(step, 'lock')
+        deadline = time.monotonic() + self.lock_wait
+        locked = self.cache.add(key, 1, self.lock_timeout)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.01)
+            locked = self.cache.add(key, 1, self.lock_timeout)
+        try:
+            yield locked
+        finally:
+            if locked:
+                self.cache.delete(key)
+
+    def load(self, step):
+        state = self.cache.get(self.make_key(step))
+        return state or self.empty_state()
+
+    def store(self, step, state):
+        state['entries'] = list(state['entries'])
+        self.cache.set(self.make_key(step), state, self.timeout)
+
+
+_queue = None
+
+
+def get_queue():
+    """按 settings.DISPATCH_QUEUE 初始化队列，未配置时返回 None"""
+
+    global _queue
+    config = getattr(settings, 'DISPATCH_QUEUE', None)
+    if not config:
+        return None
+    if _queue is None:
+        backend = import_string(config['BACKEND'])
+        _queue = backend(**config.get('OPTIONS', {}))
+    return _queue
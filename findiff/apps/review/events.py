@@ -0,0 +1,126 @@
+"""工单状态变化事件
+
+record() 在事务提交后把事件放入进程内缓冲区，缓冲区满 batch_size 条时
+批量写入 AuditOrderEvent；后台线程每 flush_interval 秒写入一次，没有新请求时
+事件也不会一直留在缓冲区，进程正常退出时写入剩余事件。
+进程被强制结束（如 uWSGI 超时重启 worker）会丢失最多 flush_interval 秒的事件，
+统计指标允许少量缺失，rollup_audit_events 按 --lookback-hours 重新汇总延迟写入的事件。
+
+配置示例：
+    AUDIT_EVENT_BUFFER = {
+        'batch_size': 100,
+        'flush_interval': 10,
+    }
+配置为 None 时每个事件在事务提交后直接写入。
+"""
+import atexit
+import datetime
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+from .models import AuditOrderEvent
+
+logger = logging.getLogger(__name__)
+
+
+def write(events):
+    """批量写入事件，写入失败只记录日志，不影响工单操作"""
+
+    try:
+        AuditOrderEvent.objects.bulk_create(events)
+    except DatabaseError:
+        logger.exception('写入 %s 条工单事件失败', len(events))
+
+
+class EventBuffer(object):
+    """进程内事件缓冲区，多线程共用
+
+    NOTE 定时写入的线程在第一次 add 时启动，uWSGI 等先导入再 fork 的部署中
+    每个 worker 各自启动；fork 前缓冲区中的事件由父进程写入，子进程丢弃
+    """
+
+    def __init__(self, batch_size=100, flush_interval=10):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.events = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, event):
+        with self._lock:
+            self._start()
+            self.events.append(event)
+            if len(self.events) < self.batch_size:
+                return
+            events = self.take()
+        write(events)
+
+    def take(self):
+        events, self.events = self.events, []
+        return events
+
+    def flush(self):
+        with self._lock:
+            events = self.take()
+        if events:
+            write(events)
+
+    def close(self):
+        """停止定时写入并写入剩余事件"""
+
+        self._stopped.set()
+        self.flush()
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self.events = []
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._run, name='audit-event-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+            # 线程不经过请求周期，需自行关闭超时的数据库连接
+            close_old_connections()
+
+
+_buffer = None
+
+
+def get_buffer():
+    """按 settings.AUDIT_EVENT_BUFFER 初始化缓冲区，未配置时返回 None"""
+
+    global _buffer
+    config = getattr(settings, 'AUDIT_EVENT_BUFFER', None)
+    if not config:
+        return None
+    if _buffer is None:
+        _buffer = EventBuffer(**config)
+        atexit.register(_buffer.close)
+    return _buffer
+
+
+def record(order_id, step, event, from_status, user):
+    """记录工单 step 阶段从 from_status 发生 event，事务回滚时不记录"""
+
+    item = AuditOrderEvent(
+        order_id=order_id,
+        audit_step=step,
+        event=event,
+        from_status=from_status,
+        user_id=getattr(user, 'pk', user),
+        created_time=datetime.datetime.now(),
+    )
+    buffer = get_buffer()
+    transaction.on_commit(
+        lambda: buffer.add(item) if buffer else write([item]))
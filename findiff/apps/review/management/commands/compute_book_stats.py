@@ -0,0 +1,103 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from findiff.apps.review.models import AuditOrder, BookAuditStat, RawData
+from findiff.apps.review.stats import merge_stats, page_stats
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = '按书籍统计 OCR 错误率、复审修改率和高频错字，结果写入 BookAuditStat'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--book', action='append', default=[],
+            help='只统计指定书籍ID，可重复指定')
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='计算编辑距离的进程数，默认为 CPU 核数，1 表示不使用进程池')
+        parser.add_argument(
+            '--chunk-size', type=int, default=200,
+            help='每个任务包含的页数，默认 200')
+        parser.add_argument(
+            '--window', type=int, default=32,
+            help='每批提交到进程池的任务数，限制内存占用，默认 32')
+        parser.add_argument(
+            '--fetch-size', type=int, default=2000,
+            help='每次从数据库读取的行数，默认 2000')
+
+    def book_ids(self, options):
+        queryset = RawData.objects.exclude(book_id='')
+        if options['book']:
+            queryset = queryset.filter(book_id__in=options['book'])
+        return list(queryset.order_by('book_id').values_list(
+            'book_id', flat=True).distinct())
+
+    def rows(self, book_id, fetch_size):
+        """按 id 分批读取一本书的每页文字，不一次性加载到内存
+
+        NOTE MySQL 驱动的 iterator 仍会缓存整个结果集，这里按 id 分段查询
+        """
+
+        queryset = AuditOrder.objects.filter(
+            raw_data__book_id=book_id).order_by('id')
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).values_list(
+                'id',
+                'first_order_status',
+                'second_order_status',
+                'raw_data__content_text',
+                'first_audit_result',
+                'first_audit_patch',
+                'second_audit_result',
+                'second_audit_patch',
+            )[:fetch_size])
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield from (row[1:] for row in rows)
+
+    def book_stats(self, mapper, book_id, options):
+        """分批提交到进程池，同时在途的不超过 window 个任务"""
+
+        pages = self.rows(book_id, options['fetch_size'])
+        tasks = chunked(pages, options['chunk_size'])
+        results = []
+        for window in chunked(tasks, options['window']):
+            results.extend(mapper(page_stats, window))
+        return merge_stats(results)
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        executor = None if processes == 1 else \
+            ProcessPoolExecutor(max_workers=processes)
+        mapper = executor.map if executor else map
+
+        try:
+            for book_id in self.book_ids(options):
+                stats = self.book_stats(mapper, book_id, options)
+                book_name = RawData.objects.filter(book_id=book_id).values_list(
+                    'book_name', flat=True).first()
+                BookAuditStat.objects.update_or_create(
+                    book_id=book_id,
+                    defaults={'book_name': book_name or '', **stats},
+                )
+                self.stdout.write(
+                    f'{book_id} {book_name}: {stats["pages"]} 页，'
+                    f'OCR 错误 {stats["ocr_errors"]}/{stats["ocr_chars"]}')
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS('书籍校对统计完成'))
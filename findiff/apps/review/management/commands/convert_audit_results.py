@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from findiff.apps.review.models import AuditOrder
+
+FIELDS = (
+    'first_audit_result',
+    'first_audit_patch',
+    'second_audit_result',
+    'second_audit_patch',
+)
+
+
+class Command(BaseCommand):
+    help = '将已有工单的初审、复审结果转换为补丁存储，--reverse 时还原为全文'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reverse', action='store_true', help='补丁还原为全文存储')
+        parser.add_argument(
+            '--batch-size', type=int, default=500, help='每批处理的工单数，默认 500')
+        parser.add_argument(
+            '--dry-run', action='store_true', help='只统计，不写入数据库')
+
+    def handle(self, *args, **options):
+        use_patch = not options['reverse']
+        if use_patch:
+            # 已按补丁存储或没有结果的工单不需要转换
+            pending = ~Q(first_audit_result='') | ~Q(second_audit_result='')
+        else:
+            pending = Q(first_audit_patch__isnull=False) | \
+                Q(second_audit_patch__isnull=False)
+
+        queryset = AuditOrder.objects.filter(pending).select_related(
+            'raw_data').only('raw_data__content_text', *FIELDS).order_by('id')
+        last_id = 0
+        total = changed = saved = 0
+        while True:
+            with transaction.atomic():
+                orders = list(queryset.filter(id__gt=last_id).select_for_update(
+                    of=('self',))[:options['batch_size']])
+                if not orders:
+                    break
+                last_id = orders[-1].id
+
+                updated = []
+                for order in orders:
+                    before = self.size(order)
+                    order.set_audit_results(
+                        *order.get_audit_results(), use_patch=use_patch)
+                    after = self.size(order)
+                    if after != before or not use_patch:
+                        updated.append(order)
+                        saved += before - after
+                total += len(orders)
+                changed += len(updated)
+                if updated and not options['dry_run']:
+                    AuditOrder.objects.bulk_update(updated, FIELDS)
+
+            self.stdout.write(f'已处理 {total} 个工单，转换 {changed} 个')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：转换 {changed}/{total} 个工单，'
+            f'结果存储{"减少" if saved >= 0 else "增加"} {abs(saved)} 字节'))
+
+    def size(self, order):
+        return sum(len(value.encode() if isinstance(value, str) else value)
+                   for value in (getattr(order, field) for field in FIELDS)
+                   if value)
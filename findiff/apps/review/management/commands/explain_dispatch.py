@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from findiff.apps.review import dispatch
+from findiff.apps.userprofile.models import UserProfile
+
+
+def explain(queryset):
+    """执行 EXPLAIN，返回每一行执行计划组成的 dict 列表"""
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = '检查领单查询的执行计划，出现全表扫描或 filesort 时报错'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            default=0,
+            help='生成查询时使用的 UserProfile id',
+        )
+
+    def handle(self, *args, **options):
+        # NOTE 数据量很小时 MySQL 可能直接选择全表扫描，请在接近生产规模的库上运行
+        if connection.vendor != 'mysql':
+            raise CommandError('仅支持 MySQL')
+
+        user = UserProfile(id=options['user'])
+        problems = []
+        for name, queryset in dispatch.dispatch_queries(user).items():
+            for row in explain(queryset):
+                extra = row.get('Extra') or ''
+                self.stdout.write(
+                    f"{name}: table={row.get('table')} type={row.get('type')} "
+                    f"key={row.get('key')} rows={row.get('rows')} "
+                    f"extra={extra}")
+                if row.get('type') == 'ALL':
+                    problems.append(f'{name}: 全表扫描 {row.get("table")}')
+                if 'filesort' in extra:
+                    problems.append(f'{name}: 使用了 filesort')
+
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('领单查询执行计划检查通过'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from findiff.apps.review import progress
+from findiff.apps.review.models import BookProgress, RawData
+
+
+class Command(BaseCommand):
+    help = '按 AuditOrder 重新统计书籍校对进度，修正 BookProgress 的计数偏差'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--book', action='append', default=[],
+            help='只统计指定书籍ID，可重复指定')
+
+    def handle(self, *args, **options):
+        queryset = RawData.objects.exclude(book_id='')
+        if options['book']:
+            queryset = queryset.filter(book_id__in=options['book'])
+        book_ids = list(queryset.order_by('book_id').values_list(
+            'book_id', flat=True).distinct())
+
+        changed = 0
+        for book_id in book_ids:
+            book_progress, drifted = progress.rebuild(book_id)
+            if drifted:
+                changed += 1
+                self.stdout.write(
+                    f'{book_id} {book_progress.book_name}: 计数已修正')
+
+        # 已没有工单的书籍
+        stale = BookProgress.objects.exclude(book_id__in=book_ids)
+        if options['book']:
+            stale = stale.filter(book_id__in=options['book'])
+        deleted, _ = stale.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：统计 {len(book_ids)} 本书，修正 {changed} 本，'
+            f'删除 {deleted} 条无工单的进度'))
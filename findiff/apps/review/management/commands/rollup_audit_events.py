@@ -0,0 +1,57 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from findiff.apps.review.metrics import HOUR, rollup_hour, truncate_hour
+from findiff.apps.review.models import AuditMetricRollup, AuditOrderEvent
+
+
+class Command(BaseCommand):
+    help = '按小时、校对人汇总工单事件的吞吐量和状态停留时长，结果写入 AuditMetricRollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', default=None,
+            help='从指定时间所在小时开始汇总，格式 YYYY-mm-dd HH:MM，'
+                 '默认从已汇总的最后一小时往前 --lookback-hours 小时开始')
+        parser.add_argument(
+            '--lookback-hours', type=int, default=1,
+            help='重新汇总已汇总的最后一小时之前的小时数，默认 1')
+
+    def start_hour(self, since, lookback_hours):
+        if since:
+            try:
+                return truncate_hour(datetime.datetime.fromisoformat(since))
+            except ValueError:
+                raise CommandError(f'时间格式无效：{since}')
+        if lookback_hours < 0:
+            raise CommandError('--lookback-hours 不能小于 0')
+        # NOTE 事件缓冲后写入，重新汇总最后一小时及之前几小时，补上延迟写入的事件
+        last = AuditMetricRollup.objects.aggregate(hour=Max('hour'))['hour']
+        if last:
+            return last - lookback_hours * HOUR
+        first = AuditOrderEvent.objects.aggregate(
+            time=Min('created_time'))['time']
+        return first and truncate_hour(first)
+
+    def handle(self, *args, **options):
+        hour = self.start_hour(options['since'], options['lookback_hours'])
+        if hour is None:
+            self.stdout.write('没有工单事件')
+            return
+
+        end = truncate_hour(datetime.datetime.now())
+        total = 0
+        while hour <= end:
+            rollups = rollup_hour(hour)
+            # 重新汇总时替换该小时已有的结果
+            with transaction.atomic():
+                AuditMetricRollup.objects.filter(hour=hour).delete()
+                AuditMetricRollup.objects.bulk_create(rollups)
+            total += len(rollups)
+            self.stdout.write(f'{hour:%Y-%m-%d %H}:00 汇总 {len(rollups)} 条')
+            hour += HOUR
+
+        self.stdout.write(self.style.SUCCESS(f'完成：共汇总 {total} 条'))
@@ -0,0 +1,100 @@
+"""校对吞吐量与状态停留时长汇总
+
+每个事件离开的状态为 from_status，停留时长为距同一工单上一个事件的秒数；
+初审领单之前没有事件，从工单创建时间起算。每小时按 (校对人, 审核阶段) 汇总，
+另外按审核阶段汇总全部校对人（user 为空）。
+"""
+import datetime
+import math
+from collections import Counter, defaultdict
+
+from django.db.models import OuterRef, Subquery
+
+from .models import AuditMetricRollup, AuditOrder, AuditOrderEvent
+
+PERCENTILES = (50, 90, 99)
+HOUR = datetime.timedelta(hours=1)
+
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def percentile(values, p):
+    """values 已排序，按最近秩取第 p 百分位"""
+
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    summary = {
+        'count': len(durations),
+        'avg': round(sum(durations) / len(durations), 1),
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}'] = round(percentile(durations, p), 1)
+    return summary
+
+
+def hour_events(start):
+    """start 所在小时的事件及同一工单上一个事件的时间"""
+
+    previous = AuditOrderEvent.objects.filter(
+        order=OuterRef('order'),
+        created_time__lt=OuterRef('created_time'),
+    ).order_by('-created_time').values('created_time')[:1]
+    # NOTE 事件不建外键约束，工单已删除时不能用 JOIN，按子查询取创建时间
+    order_created = AuditOrder.objects.filter(
+        pk=OuterRef('order')).values('created_time')[:1]
+    return AuditOrderEvent.objects.filter(
+        created_time__gte=start,
+        created_time__lt=start + HOUR,
+    ).annotate(
+        previous_time=Subquery(previous),
+        order_created=Subquery(order_created),
+    ).values_list(
+        'user_id',
+        'audit_step',
+        'event',
+        'from_status',
+        'created_time',
+        'previous_time',
+        'order_created',
+    )
+
+
+def rollup_hour(start):
+    """汇总 start 所在小时的事件，返回未保存的 AuditMetricRollup 列表"""
+
+    counts = defaultdict(Counter)
+    durations = defaultdict(lambda: defaultdict(list))
+    for (user_id, step, event, from_status, created_time,
+         previous_time, order_created) in hour_events(start):
+        if previous_time is None and event == 'assigned' \
+                and step == 'first_audit':
+            previous_time = order_created
+        keys = [(None, step)]
+        if user_id is not None:
+            keys.append((user_id, step))
+        for key in keys:
+            counts[key][event] += 1
+            if previous_time is not None:
+                durations[key][from_status].append(
+                    (created_time - previous_time).total_seconds())
+
+    return [
+        AuditMetricRollup(
+            hour=start,
+            user_id=user_id,
+            audit_step=step,
+            assigned=counts[user_id, step]['assigned'],
+            submitted=counts[user_id, step]['submitted'],
+            suspended=counts[user_id, step]['suspended'],
+            durations={
+                status: summarize(values)
+                for status, values in durations[user_id, step].items()
+            },
+        )
+        for user_id, step in counts
+    ]
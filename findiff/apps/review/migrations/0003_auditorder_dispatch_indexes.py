@@ -0,0 +1,39 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0002_alter_rawdata_writing_mode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditorder',
+            name='first_order_status',
+            field=models.CharField(blank=True, choices=[('unassign', '未分配'), ('unaudit', '待审核'), ('success', '成功'), ('fail', '失败'), ('suspend', '挂起')], default='unassign', help_text='初审状态', max_length=30, verbose_name='初审状态'),
+        ),
+        migrations.AlterField(
+            model_name='auditorder',
+            name='second_order_status',
+            field=models.CharField(blank=True, choices=[('unassign', '未分配'), ('unaudit', '待审核'), ('success', '成功'), ('fail', '失败'), ('suspend', '挂起')], default='unassign', help_text='复审状态', max_length=30, verbose_name='复审状态'),
+        ),
+        migrations.AddIndex(
+            model_name='auditorder',
+            index=models.Index(fields=['first_order_status', 'created_time'], name='audit_first_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditorder',
+            index=models.Index(fields=['second_order_status', 'first_order_status', 'created_time'], name='audit_second_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditorder',
+            index=models.Index(fields=['first_audit_user', 'created_time'], name='audit_first_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditorder',
+            index=models.Index(fields=['second_audit_user', 'created_time'], name='audit_second_user_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0003_auditorder_dispatch_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rawdata',
+            name='batch_id',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='批量导入时的批次号', max_length=32, verbose_name='导入批次'),
+        ),
+    ]
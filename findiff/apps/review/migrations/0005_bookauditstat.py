@@ -0,0 +1,34 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0004_rawdata_batch_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookAuditStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.CharField(max_length=10, unique=True, verbose_name='书籍ID')),
+                ('book_name', models.CharField(blank=True, default='', max_length=200, verbose_name='书名')),
+                ('pages', models.PositiveIntegerField(default=0, verbose_name='页数')),
+                ('audited_pages', models.PositiveIntegerField(default=0, verbose_name='已初审页数')),
+                ('second_audited_pages', models.PositiveIntegerField(default=0, verbose_name='已复审页数')),
+                ('ocr_chars', models.PositiveIntegerField(default=0, help_text='已校对页面的 OCR 字数', verbose_name='OCR 字数')),
+                ('ocr_errors', models.PositiveIntegerField(default=0, help_text='OCR 文字与最终校对结果的编辑距离', verbose_name='OCR 错误数')),
+                ('first_chars', models.PositiveIntegerField(default=0, help_text='已复审页面的初审字数', verbose_name='初审字数')),
+                ('second_corrections', models.PositiveIntegerField(default=0, help_text='初审结果与复审结果的编辑距离', verbose_name='复审修改数')),
+                ('hot_chars', models.JSONField(default=list, help_text='OCR 错误最多的文字，[{"source", "target", "count"}, ...]', verbose_name='高频错字')),
+                ('computed_time', models.DateTimeField(auto_now=True, verbose_name='统计时间')),
+            ],
+            options={
+                'verbose_name': '书籍校对统计',
+                'verbose_name_plural': '书籍校对统计',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0005_bookauditstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditorder',
+            name='first_audit_patch',
+            field=models.BinaryField(blank=True, default=None, help_text='初审结果相对 OCR 文字的压缩补丁，不为空时 first_audit_result 为空', null=True, verbose_name='初审补丁'),
+        ),
+        migrations.AddField(
+            model_name='auditorder',
+            name='second_audit_patch',
+            field=models.BinaryField(blank=True, default=None, help_text='复审结果相对初审结果的压缩补丁，不为空时 second_audit_result 为空', null=True, verbose_name='复审补丁'),
+        ),
+    ]
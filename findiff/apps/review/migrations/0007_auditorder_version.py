@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0006_auditorder_result_patch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditorder',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='每次分配、提交时递增，用于检测并发修改', verbose_name='版本号'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprofile', '0002_userprofile_search_text'),
+        ('review', '0007_auditorder_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audit_step', models.CharField(choices=[('first_audit', '初审'), ('second_audit', '复审')], max_length=20, verbose_name='审核阶段')),
+                ('text', models.TextField(blank=True, default='', verbose_name='草稿内容')),
+                ('seq', models.PositiveIntegerField(default=0, help_text='每次保存递增，用于校验增量的基准', verbose_name='草稿序号')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drafts', to='review.auditorder', verbose_name='校对订单')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='userprofile.userprofile', verbose_name='最后保存人')),
+            ],
+            options={
+                'verbose_name': '校对草稿',
+                'verbose_name_plural': '校对草稿',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='auditdraft',
+            constraint=models.UniqueConstraint(fields=('order', 'audit_step'), name='audit_draft_order_step_uniq'),
+        ),
+    ]
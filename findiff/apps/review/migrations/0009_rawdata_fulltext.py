@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from findiff.common.fulltext import fulltext_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0008_auditdraft'),
+    ]
+
+    operations = [
+        fulltext_index('review_rawdata', 'rawdata_content_ft',
+                       ['book_name', 'content_text']),
+    ]
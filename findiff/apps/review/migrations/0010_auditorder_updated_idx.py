@@ -0,0 +1,17 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0009_rawdata_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditorder',
+            index=models.Index(fields=['updated_time'], name='audit_updated_idx'),
+        ),
+    ]
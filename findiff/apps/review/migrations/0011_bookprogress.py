@@ -0,0 +1,36 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0010_auditorder_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.CharField(max_length=10, unique=True, verbose_name='书籍ID')),
+                ('book_name', models.CharField(blank=True, default='', max_length=200, verbose_name='书名')),
+                ('first_unassign', models.IntegerField(default=0, verbose_name='初审未分配')),
+                ('first_unaudit', models.IntegerField(default=0, verbose_name='初审待审核')),
+                ('first_success', models.IntegerField(default=0, verbose_name='初审成功')),
+                ('first_fail', models.IntegerField(default=0, verbose_name='初审失败')),
+                ('first_suspend', models.IntegerField(default=0, verbose_name='初审挂起')),
+                ('second_unassign', models.IntegerField(default=0, verbose_name='复审未分配')),
+                ('second_unaudit', models.IntegerField(default=0, verbose_name='复审待审核')),
+                ('second_success', models.IntegerField(default=0, verbose_name='复审成功')),
+                ('second_fail', models.IntegerField(default=0, verbose_name='复审失败')),
+                ('second_suspend', models.IntegerField(default=0, verbose_name='复审挂起')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '书籍校对进度',
+                'verbose_name_plural': '书籍校对进度',
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.5 on 2026-10-19 05:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprofile', '0002_userprofile_search_text'),
+        ('review', '0011_bookprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditOrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audit_step', models.CharField(choices=[('first_audit', '初审'), ('second_audit', '复审')], max_length=20, verbose_name='审核阶段')),
+                ('event', models.CharField(choices=[('assigned', '领单'), ('submitted', '提交'), ('suspended', '挂起')], max_length=20, verbose_name='事件')),
+                ('from_status', models.CharField(choices=[('unassign', '未分配'), ('unaudit', '待审核'), ('success', '成功'), ('fail', '失败'), ('suspend', '挂起')], help_text='事件发生前该阶段的状态', max_length=30, verbose_name='原状态')),
+                ('created_time', models.DateTimeField(db_index=True, verbose_name='发生时间')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='review.auditorder', verbose_name='校对订单')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='userprofile.userprofile', verbose_name='操作人')),
+            ],
+            options={
+                'verbose_name': '工单事件',
+                'verbose_name_plural': '工单事件',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='小时')),
+                ('audit_step', models.CharField(choices=[('first_audit', '初审'), ('second_audit', '复审')], max_length=20, verbose_name='审核阶段')),
+                ('assigned', models.PositiveIntegerField(default=0, verbose_name='领单数')),
+                ('submitted', models.PositiveIntegerField(default=0, verbose_name='提交数')),
+                ('suspended', models.PositiveIntegerField(default=0, verbose_name='挂起数')),
+                ('durations', models.JSONField(default=dict, help_text='离开各状态前停留的秒数，{状态: {"count", "avg", "p50", "p90", "p99"}, ...}', verbose_name='状态停留时长')),
+                ('computed_time', models.DateTimeField(auto_now=True, verbose_name='统计时间')),
+                ('user', models.ForeignKey(blank=True, help_text='为空时为全部校对人的汇总', null=True, on_delete=django.db.models.deletion.CASCADE, to='userprofile.userprofile', verbose_name='校对人')),
+            ],
+            options={
+                'verbose_name': '校对指标汇总',
+                'verbose_name_plural': '校对指标汇总',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='auditorderevent',
+            index=models.Index(fields=['order', 'created_time'], name='audit_event_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditmetricrollup',
+            index=models.Index(fields=['hour', 'user'], name='audit_metric_hour_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditmetricrollup',
+            index=models.Index(fields=['user', 'hour'], name='audit_metric_user_idx'),
+        ),
+    ]
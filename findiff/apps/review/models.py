@@ -1,7 +1,11 @@
 import datetime
 
+from django.conf import settings
 from django.db import models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad, Right
 
+from findiff.common import textdiff
 from findiff.models.model_constant import AUDIT_STATUS_CHOICES, WRITING_MODE
 
 
@@ -43,6 +47,14 @@ class RawData(models.Model):
         help_text='扫描件上传前的文件名',
         max_length=200,
     )
+    batch_id = models.CharField(
+        '导入批次',
+        help_text='批量导入时的批次号',
+        max_length=32,
+        blank=True,
+        default='',
+        db_index=True,
+    )
 
     def __str__(self):
         return f'{self.id}-{self.book_name}'
@@ -89,10 +101,16 @@ class AuditOrder(models.Model):
         blank=True,
         default='',
     )
+    first_audit_patch = models.BinaryField(
+        '初审补丁',
+        help_text='初审结果相对 OCR 文字的压缩补丁，不为空时 first_audit_result 为空',
+        null=True,
+        blank=True,
+        default=None,
+    )
     first_order_status = models.CharField(
         '初审状态',
         help_text='初审状态',
-        db_index=True,
         max_length=30,
         choices=AUDIT_STATUS_CHOICES,
         blank=True,
@@ -121,10 +139,16 @@ class AuditOrder(models.Model):
         blank=True,
         default='',
     )
+    second_audit_patch = models.BinaryField(
+        '复审补丁',
+        help_text='复审结果相对初审结果的压缩补丁，不为空时 second_audit_result 为空',
+        null=True,
+        blank=True,
+        default=None,
+    )
     second_order_status = models.CharField(
         '复审状态',
         help_text='复审状态',
-        db_index=True,
         max_length=30,
         choices=AUDIT_STATUS_CHOICES,
         blank=True,
@@ -141,6 +165,11 @@ class AuditOrder(models.Model):
         help_text='更新时间',
         auto_now=True,
     )
+    version = models.PositiveIntegerField(
+        '版本号',
+        help_text='每次分配、提交时递增，用于检测并发修改',
+        default=0,
+    )
     operator = models.ForeignKey(
         'userprofile.UserProfile',
         on_delete=models.PROTECT,
@@ -152,15 +181,353 @@ class AuditOrder(models.Model):
         related_name='auditorder_operator_set',
     )
 
+    def get_audit_results(self):
+        """还原 (初审结果, 复审结果) 全文，按补丁存储时需读取 raw_data"""
+
+        if self.first_audit_patch is None and self.second_audit_patch is None:
+            return self.first_audit_result, self.second_audit_result
+        return tuple(textdiff.resolve_chain(self.raw_data.content_text, [
+            (self.first_audit_result, self.first_audit_patch),
+            (self.second_audit_result, self.second_audit_patch),
+        ]))
+
+    def get_first_audit_result(self):
+        return self.get_audit_results()[0]
+
+    def get_second_audit_result(self):
+        return self.get_audit_results()[1]
+
+    def get_step_text(self, step):
+        """step 阶段的当前文字，尚未提交时为上一阶段的文字"""
+
+        first_result, second_result = self.get_audit_results()
+        if step == 'first_audit':
+            return first_result or self.raw_data.content_text
+        return second_result or first_result
+
+    def set_audit_results(self, first, second, use_patch=None):
+        """写入初审、复审结果全文
+
+        use_patch 为 True 时按补丁存储（OCR → 初审 → 复审），
+        默认取 settings.AUDIT_RESULT_PATCH；补丁不比全文小时仍存全文
+        """
+
+        if use_patch is None:
+            use_patch = settings.AUDIT_RESULT_PATCH
+        previous = self.raw_data.content_text if use_patch else ''
+        for step, text in (('first_audit', first), ('second_audit', second)):
+            patch = textdiff.make_patch(previous, text) \
+                if use_patch and text else None
+            setattr(self, f'{step}_result', '' if patch else text)
+            setattr(self, f'{step}_patch', patch)
+            previous = text or previous
+
+    def set_audit_result(self, step, text):
+        """写入一个阶段的结果，另一阶段的补丁随之重新生成"""
+
+        first, second = self.get_audit_results()
+        if step == 'first_audit':
+            first = text
+        else:
+            second = text
+        self.set_audit_results(first, second)
+
     def make_order_id(self):
         return 'AUDIT%s%.6d' % (
             datetime.datetime.now().strftime('%Y%m%d'),
             int(str(self.id)[-6:]),
         )
 
+    @classmethod
+    def order_id_expression(cls):
+        """与 make_order_id 规则一致的数据库表达式，用于批量生成订单号"""
+
+        return Concat(
+            Value('AUDIT%s' % datetime.datetime.now().strftime('%Y%m%d')),
+            LPad(Right(Cast('id', CharField()), 6), 6, Value('0')),
+            output_field=CharField(),
+        )
+
     def __str__(self):
         return f'{self.id}-{self.order_id}'
 
     class Meta:
         verbose_name = '校对订单'
         verbose_name_plural = verbose_name
+        # NOTE 对应 review.dispatch 中各级领单查询，first_order_status、
+        # second_order_status 的单列索引由以下联合索引的前缀代替
+        indexes = [
+            models.Index(
+                fields=['first_order_status', 'created_time'],
+                name='audit_first_status_idx',
+            ),
+            models.Index(
+                fields=['second_order_status', 'first_order_status',
+                        'created_time'],
+                name='audit_second_status_idx',
+            ),
+            models.Index(
+                fields=['first_audit_user', 'created_time'],
+                name='audit_first_user_idx',
+            ),
+            models.Index(
+                fields=['second_audit_user', 'created_time'],
+                name='audit_second_user_idx',
+            ),
+            # promote_audit_orders 按 (updated_time, id) 增量读取
+            models.Index(
+                fields=['updated_time'],
+                name='audit_updated_idx',
+            ),
+        ]
+
+
+AUDIT_STEP_CHOICES = (
+    ('first_audit', '初审'),
+    ('second_audit', '复审'),
+)
+
+
+class AuditDraft(models.Model):
+    """校对中的草稿，每个工单每个阶段一条，提交工单后删除"""
+
+    order = models.ForeignKey(
+        AuditOrder,
+        verbose_name='校对订单',
+        on_delete=models.CASCADE,
+        related_name='drafts',
+    )
+    audit_step = models.CharField(
+        '审核阶段',
+        max_length=20,
+        choices=AUDIT_STEP_CHOICES,
+    )
+    text = models.TextField('草稿内容', blank=True, default='')
+    seq = models.PositiveIntegerField(
+        '草稿序号', default=0, help_text='每次保存递增，用于校验增量的基准')
+    user = models.ForeignKey(
+        'userprofile.UserProfile',
+        on_delete=models.SET_NULL,
+        verbose_name='最后保存人',
+        null=True,
+        blank=True,
+    )
+    updated_time = models.DateTimeField('更新时间', auto_now=True)
+
+    def __str__(self):
+        return f'{self.order_id}-{self.audit_step}-{self.seq}'
+
+    class Meta:
+        verbose_name = '校对草稿'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order', 'audit_step'],
+                name='audit_draft_order_step_uniq',
+            ),
+        ]
+
+
+class BookAuditStat(models.Model):
+    """按书籍汇总的校对统计，由 compute_book_stats 命令生成"""
+
+    book_id = models.CharField(
+        '书籍ID',
+        max_length=10,
+        unique=True,
+    )
+    book_name = models.CharField(
+        '书名',
+        max_length=200,
+        blank=True,
+        default='',
+    )
+    pages = models.PositiveIntegerField('页数', default=0)
+    audited_pages = models.PositiveIntegerField('已初审页数', default=0)
+    second_audited_pages = models.PositiveIntegerField('已复审页数', default=0)
+    ocr_chars = models.PositiveIntegerField(
+        'OCR 字数', default=0, help_text='已校对页面的 OCR 字数')
+    ocr_errors = models.PositiveIntegerField(
+        'OCR 错误数', default=0, help_text='OCR 文字与最终校对结果的编辑距离')
+    first_chars = models.PositiveIntegerField(
+        '初审字数', default=0, help_text='已复审页面的初审字数')
+    second_corrections = models.PositiveIntegerField(
+        '复审修改数', default=0, help_text='初审结果与复审结果的编辑距离')
+    hot_chars = models.JSONField(
+        '高频错字',
+        default=list,
+        help_text='OCR 错误最多的文字，[{"source", "target", "count"}, ...]',
+    )
+    computed_time = models.DateTimeField('统计时间', auto_now=True)
+
+    @property
+    def ocr_error_rate(self):
+        return round(self.ocr_errors / self.ocr_chars, 4) \
+            if self.ocr_chars else 0
+
+    @property
+    def correction_rate(self):
+        return round(self.second_corrections / self.first_chars, 4) \
+            if self.first_chars else 0
+
+    def __str__(self):
+        return f'{self.book_id}-{self.book_name}'
+
+    class Meta:
+        verbose_name = '书籍校对统计'
+        verbose_name_plural = verbose_name
+
+
+class BookProgress(models.Model):
+    """按书籍计数的初审、复审各状态工单数，工单状态变化时增量维护
+
+    计数列名为 {first,second}_{状态}，见 review.progress
+    """
+
+    book_id = models.CharField(
+        '书籍ID',
+        max_length=10,
+        unique=True,
+    )
+    book_name = models.CharField(
+        '书名',
+        max_length=200,
+        blank=True,
+        default='',
+    )
+    # NOTE 计数不使用 PositiveIntegerField，计数偏差时不影响工单提交，
+    # 由 reconcile_book_progress 命令修正
+    first_unassign = models.IntegerField('初审未分配', default=0)
+    first_unaudit = models.IntegerField('初审待审核', default=0)
+    first_success = models.IntegerField('初审成功', default=0)
+    first_fail = models.IntegerField('初审失败', default=0)
+    first_suspend = models.IntegerField('初审挂起', default=0)
+    second_unassign = models.IntegerField('复审未分配', default=0)
+    second_unaudit = models.IntegerField('复审待审核', default=0)
+    second_success = models.IntegerField('复审成功', default=0)
+    second_fail = models.IntegerField('复审失败', default=0)
+    second_suspend = models.IntegerField('复审挂起', default=0)
+    updated_time = models.DateTimeField('更新时间', auto_now=True)
+
+    @property
+    def pages(self):
+        return sum(getattr(self, f'first_{status}')
+                   for status, _ in AUDIT_STATUS_CHOICES)
+
+    @property
+    def progress(self):
+        """复审完成的比例"""
+
+        pages = self.pages
+        return round(self.second_success / pages, 4) if pages else 0
+
+    def __str__(self):
+        return f'{self.book_id}-{self.book_name}'
+
+    class Meta:
+        verbose_name = '书籍校对进度'
+        verbose_name_plural = verbose_name
+
+
+AUDIT_EVENT_CHOICES = (
+    ('assigned', '领单'),
+    ('submitted', '提交'),
+    ('suspended', '挂起'),
+)
+
+
+class AuditOrderEvent(models.Model):
+    """工单状态变化记录，由 review.events 缓冲后批量写入"""
+
+    # NOTE 事件延迟写入，工单可能已被删除，不建外键约束，删除工单时保留事件
+    order = models.ForeignKey(
+        AuditOrder,
+        verbose_name='校对订单',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='events',
+    )
+    audit_step = models.CharField(
+        '审核阶段',
+        max_length=20,
+        choices=AUDIT_STEP_CHOICES,
+    )
+    event = models.CharField(
+        '事件',
+        max_length=20,
+        choices=AUDIT_EVENT_CHOICES,
+    )
+    from_status = models.CharField(
+        '原状态',
+        help_text='事件发生前该阶段的状态',
+        max_length=30,
+        choices=AUDIT_STATUS_CHOICES,
+    )
+    user = models.ForeignKey(
+        'userprofile.UserProfile',
+        on_delete=models.SET_NULL,
+        verbose_name='操作人',
+        null=True,
+        blank=True,
+    )
+    created_time = models.DateTimeField('发生时间', db_index=True)
+
+    def __str__(self):
+        return f'{self.order_id}-{self.audit_step}-{self.event}'
+
+    class Meta:
+        verbose_name = '工单事件'
+        verbose_name_plural = verbose_name
+        indexes = [
+            # rollup_audit_events 查找同一工单的上一个事件
+            models.Index(
+                fields=['order', 'created_time'],
+                name='audit_event_order_idx',
+            ),
+        ]
+
+
+class AuditMetricRollup(models.Model):
+    """按小时、校对人汇总的吞吐量和各状态停留时长，由 rollup_audit_events 命令生成"""
+
+    hour = models.DateTimeField('小时')
+    user = models.ForeignKey(
+        'userprofile.UserProfile',
+        on_delete=models.CASCADE,
+        verbose_name='校对人',
+        help_text='为空时为全部校对人的汇总',
+        null=True,
+        blank=True,
+    )
+    audit_step = models.CharField(
+        '审核阶段',
+        max_length=20,
+        choices=AUDIT_STEP_CHOICES,
+    )
+    assigned = models.PositiveIntegerField('领单数', default=0)
+    submitted = models.PositiveIntegerField('提交数', default=0)
+    suspended = models.PositiveIntegerField('挂起数', default=0)
+    durations = models.JSONField(
+        '状态停留时长',
+        default=dict,
+        help_text='离开各状态前停留的秒数，'
+                  '{状态: {"count", "avg", "p50", "p90", "p99"}, ...}',
+    )
+    computed_time = models.DateTimeField('统计时间', auto_now=True)
+
+    def __str__(self):
+        return f'{self.hour}-{self.user_id}-{self.audit_step}'
+
+    class Meta:
+        verbose_name = '校对指标汇总'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(
+                fields=['hour', 'user'],
+                name='audit_metric_hour_idx',
+            ),
+            models.Index(
+                fields=['user', 'hour'],
+                name='audit_metric_user_idx',
+            ),
+        ]
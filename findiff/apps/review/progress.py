@@ -0,0 +1,117 @@
+"""书籍校对进度计数
+
+BookProgress 按书籍记录初审、复审各状态的工单数。工单创建、领单、提交、
+删除时在同一事务内增减计数，看板按书籍ID直接读取，不再对 AuditOrder
+分组统计。未设置书籍ID（book_id 为空）的工单不计数。
+
+计数由于直接修改数据库等原因出现偏差时，reconcile_book_progress 命令按
+AuditOrder 重新统计。
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, Subquery
+
+from findiff.models.model_constant import AUDIT_STATUS_CHOICES
+
+from .models import AuditOrder, BookProgress, RawData
+
+STEP_PREFIX = {
+    'first_audit': 'first',
+    'second_audit': 'second',
+}
+STATUS_FIELDS = {
+    'first_audit': 'first_order_status',
+    'second_audit': 'second_order_status',
+}
+COUNTERS = [f'{prefix}_{status}' for prefix in STEP_PREFIX.values()
+            for status, _ in AUDIT_STATUS_CHOICES]
+
+
+def counter(step, status):
+    return f'{STEP_PREFIX[step]}_{status}'
+
+
+def apply(queryset, deltas):
+    """queryset 中的进度按 deltas {计数列: 增量} 增减"""
+
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    return queryset.update(
+        updated_time=datetime.datetime.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()},
+    )
+
+
+def add_orders(book_id, book_name, count):
+    """书籍新增 count 个工单，初审、复审均为未分配"""
+
+    if not book_id or not count:
+        return
+    BookProgress.objects.get_or_create(
+        book_id=book_id, defaults={'book_name': book_name})
+    apply(BookProgress.objects.filter(book_id=book_id), {
+        counter('first_audit', 'unassign'): count,
+        counter('second_audit', 'unassign'): count,
+    })
+
+
+def transition(step, old, new, book_id=None, order_id=None):
+    """工单 step 阶段的状态由 old 变为 new
+
+    调用方未读取 raw_data 时传 order_id，按子查询定位书籍，不增加查询次数
+    """
+
+    if old == new:
+        return
+    if book_id is None:
+        book_id = Subquery(AuditOrder.objects.filter(
+            id=order_id).values('raw_data__book_id')[:1])
+    apply(BookProgress.objects.filter(book_id=book_id), {
+        counter(step, old): -1,
+        counter(step, new): 1,
+    })
+
+
+def remove_order(order):
+    """删除工单时减去其所在状态的计数"""
+
+    apply(BookProgress.objects.filter(book_id=order.raw_data.book_id), {
+        counter(step, getattr(order, field)): -1
+        for step, field in STATUS_FIELDS.items()
+    })
+
+
+def count_orders(book_id):
+    """按 AuditOrder 统计一本书各状态的工单数"""
+
+    counts = dict.fromkeys(COUNTERS, 0)
+    rows = AuditOrder.objects.filter(raw_data__book_id=book_id).values_list(
+        *STATUS_FIELDS.values()).annotate(count=Count('id')).order_by()
+    for first_status, second_status, count in rows:
+        counts[counter('first_audit', first_status)] += count
+        counts[counter('second_audit', second_status)] += count
+    return counts
+
+
+def rebuild(book_id):
+    """重新统计一本书的进度，返回 (进度, 是否与原计数不同)
+
+    NOTE 先锁定进度行再统计，统计期间状态变化的工单等待本事务提交后
+    再增减计数，不会丢失或重复计数
+    """
+
+    book_name = RawData.objects.filter(book_id=book_id).values_list(
+        'book_name', flat=True).first() or ''
+    with transaction.atomic():
+        progress, _ = BookProgress.objects.select_for_update().get_or_create(
+            book_id=book_id, defaults={'book_name': book_name})
+        counts = count_orders(book_id)
+        changed = any(getattr(progress, field) != value
+                      for field, value in counts.items())
+        if changed:
+            for field, value in counts.items():
+                setattr(progress, field, value)
+            progress.save(update_fields=[*COUNTERS, 'updated_time'])
+    return progress, changed
@@ -1,13 +1,29 @@
+import contextlib
 import datetime
+import functools
+import hashlib
+import json
+import posixpath
+import tarfile
+import uuid
+import zipfile
 from pathlib import Path
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils.encoding import force_text
+from django.utils.http import parse_etags
 from rest_framework import serializers, status
 from rest_framework.exceptions import APIException
 
-from findiff.common.filehash import filehash
-from .models import AuditOrder, RawData, AUDIT_STATUS_CHOICES, WRITING_MODE
+from findiff.apps.userprofile.models import UserProfile
+from findiff.common import textdiff
+from findiff.common.storage import acquire, media_name, register, store_file
+from . import dispatch, events, progress
+from .models import (
+    AuditDraft, AuditMetricRollup, AuditOrder, BookAuditStat, BookProgress,
+    RawData, AUDIT_STATUS_CHOICES, AUDIT_STEP_CHOICES, WRITING_MODE)
 
 
 class CustomValidation(APIException):
@@ -18,6 +34,14 @@ class CustomValidation(APIException):
             'detail': force_text('请求有误')}
 
 
+def current_userprofile(request):
+    """当前用户的 UserProfile，token 权限声明中带有 id 时不查询数据库"""
+
+    profile_id = getattr(request.user, 'userprofile_id', None)
+    return UserProfile(id=profile_id) if profile_id \
+        else request.user.userprofile
+
+
 class RawDataSerializer(serializers.ModelSerializer):
     """原始书籍数据"""
 
@@ -36,77 +60,20 @@ class ApplyAuditOrderSerializer(serializers.Serializer):
 
     def validate(self, attrs):
         data = super().validate(attrs)
-        current_user = self.context['request'].user.userprofile
-        self_audit_status = data.get('audit_status')
-
-        # 0. 如果用户传递audit_status in [unaudit, suspend]，则优先下发
-        if self_audit_status:
-            self_audit_status = list(self_audit_status)
-            self_status_orders = AuditOrder.objects.filter(
-                Q(first_order_status__in=self_audit_status)
-                | Q(second_order_status__in=self_audit_status),
-                Q(first_audit_user=current_user) | Q(
-                    second_audit_user=current_user),
-            ).order_by('created_time')
-
-            if self_status_orders.count() > 0:
-                data['next_order_id'] = self_status_orders.first().id
-                return data
-
-        # 1. 当前用户unaudit suspend优先
-        self_suspend_orders = AuditOrder.objects.filter(
-            Q(first_order_status__in=('suspend', 'unaudit'))
-            | Q(second_order_status__in=('suspend', 'unaudit')),
-            Q(first_audit_user=current_user)
-            | Q(second_audit_user=current_user),
-        ).order_by('created_time')
-
-        if self_suspend_orders.count() > 0:
-            data['next_order_id'] = self_suspend_orders.first().id
-            return data
-
-        # 2. 复审unaudit订单优先
-        self_sec_orders = AuditOrder.objects.filter(
-            ~Q(first_audit_user=current_user),
-            first_order_status='success',
-            second_order_status='unassign'
-        ).order_by('created_time')
-
-        if self_sec_orders.count() > 0:
-            order = self_sec_orders.first()
-            order.second_audit_user = current_user
-            order.second_audit_time = datetime.datetime.now()
-            order.second_order_status = 'unaudit'
-            order.save()
-            data['next_order_id'] = order.id
-            return data
-
-        # 3. 最低优先级，分配初审待分配订单
-        self_default_orders = AuditOrder.objects.filter(
-            first_order_status='unassign',
-        ).order_by('created_time')
-
-        if self_default_orders.count() > 0:
-            order = self_default_orders.first()
-            order.first_audit_user = current_user
-            order.first_audit_time = datetime.datetime.now()
-            order.first_order_status = 'unaudit'
-            order.save()
-            data['next_order_id'] = order.id
-            return data
-
-        raise CustomValidation('暂无可领订单', 'non_field_error',
-                               status.HTTP_400_BAD_REQUEST)
-
-
-class AuditOrderSerializer(serializers.ModelSerializer):
-    """工单详情"""
+        current_user = current_userprofile(self.context['request'])
 
-    audit_status = serializers.SerializerMethodField()
-    audit_user = serializers.SerializerMethodField()
-    audit_step = serializers.SerializerMethodField()
-    audit_result = serializers.SerializerMethodField()
-    raw_data = RawDataSerializer(read_only=True)
+        order_id = dispatch.next_order_id(current_user,
+                                          data.get('audit_status'))
+        if order_id is None:
+            raise CustomValidation('暂无可领订单', 'non_field_error',
+                                   status.HTTP_400_BAD_REQUEST)
+
+        data['next_order_id'] = order_id
+        return data
+
+
+class AuditStepMixin(object):
+    """根据工单状态计算当前审核步骤、状态和审核人"""
 
     def get_audit_status(self, obj):
         step = self.get_audit_step(obj)
@@ -120,13 +87,18 @@ class AuditOrderSerializer(serializers.ModelSerializer):
     def get_audit_step(self, obj):
         return 'second_audit' if obj.second_order_status != 'unassign' else 'first_audit'
 
+
+class AuditOrderSerializer(AuditStepMixin, serializers.ModelSerializer):
+    """工单详情"""
+
+    audit_status = serializers.SerializerMethodField()
+    audit_user = serializers.SerializerMethodField()
+    audit_step = serializers.SerializerMethodField()
+    audit_result = serializers.SerializerMethodField()
+    raw_data = RawDataSerializer(read_only=True)
+
     def get_audit_result(self, obj):
-        step = self.get_audit_step(obj)
-        if step == 'first_audit' and not obj.first_audit_result:
-            return obj.raw_data.content_text
-        if step == 'second_audit' and not obj.second_audit_result:
-            return obj.first_audit_result
-        return obj.first_audit_result if step == 'first_audit' else obj.second_audit_result
+        return obj.get_step_text(self.get_audit_step(obj))
 
     class Meta:
         model = AuditOrder
@@ -138,37 +110,367 @@ class AuditOrderSerializer(serializers.ModelSerializer):
             'audit_result',
             'audit_step',
             'raw_data',
+            'version',
+        )
+
+
+class AuditOrderDiffSerializer(serializers.ModelSerializer):
+    """工单各阶段文字的逐字比对
+
+    比对结果按 (工单 id, updated_time, OCR 文字的 md5) 缓存，工单提交、
+    修改 OCR 文字后缓存自然失效。OCR 文字的 md5 优先使用查询时的
+    raw_text_md5 注解，避免为计算 key 读取全文
+    """
+
+    # (名称, 比对前的文字, 比对后的文字)
+    DIFF_PAIRS = (
+        ('first_audit', 'content_text', 'first_audit_result'),
+        ('second_audit', 'first_audit_result', 'second_audit_result'),
+        ('total', 'content_text', 'second_audit_result'),
+    )
+    CACHE_KEY = 'review:diff:v2:%s:%s:%s'
+    CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+    diffs = serializers.SerializerMethodField()
+
+    def get_diffs(self, obj):
+        text_md5 = getattr(obj, 'raw_text_md5', None)
+        if text_md5 is None:
+            text_md5 = hashlib.md5(
+                obj.raw_data.content_text.encode()).hexdigest()
+        key = self.CACHE_KEY % (
+            obj.pk, obj.updated_time.isoformat(), text_md5)
+        diffs = cache.get(key)
+        if diffs is None:
+            diffs = self.build_diffs(obj)
+            cache.set(key, diffs, self.CACHE_TIMEOUT)
+        return diffs
+
+    def build_diffs(self, obj):
+        order = AuditOrder.objects.select_related('raw_data').get(pk=obj.pk)
+        texts = dict(zip(('first_audit_result', 'second_audit_result'),
+                         order.get_audit_results()))
+        texts['content_text'] = order.raw_data.content_text
+        diffs = {}
+        for name, source, target in self.DIFF_PAIRS:
+            # 尚未提交的阶段不参与比对
+            if texts[target]:
+                diffs[name] = textdiff.diff(texts[source], texts[target])
+        return diffs
+
+    class Meta:
+        model = AuditOrder
+        fields = (
+            'id',
+            'order_id',
+            'updated_time',
+            'diffs',
+        )
+
+
+class AuditOrderListSerializer(AuditStepMixin, serializers.ModelSerializer):
+    """工单列表，不含页面文字和审核结果，完整内容通过工单详情获取
+
+    支持 ?fields=id,order_id,audit_status 只返回指定字段
+    """
+
+    audit_status = serializers.SerializerMethodField()
+    audit_user = serializers.SerializerMethodField()
+    audit_step = serializers.SerializerMethodField()
+    book_id = serializers.CharField(source='raw_data.book_id', read_only=True)
+    book_name = serializers.CharField(
+        source='raw_data.book_name', read_only=True)
+    content_image = serializers.CharField(
+        source='raw_data.content_image', read_only=True)
+    content_image_name = serializers.CharField(
+        source='raw_data.content_image_name', read_only=True)
+
+    # 各字段需要从数据库读取的列
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'order_id': ('order_id',),
+        'audit_status': ('first_order_status', 'second_order_status'),
+        'audit_user': ('first_audit_user__nickname',
+                       'second_audit_user__nickname'),
+        'audit_step': ('second_order_status',),
+        'book_id': ('raw_data__book_id',),
+        'book_name': ('raw_data__book_name',),
+        'content_image': ('raw_data__content_image',),
+        'content_image_name': ('raw_data__content_image_name',),
+        'first_audit_time': ('first_audit_time',),
+        'second_audit_time': ('second_audit_time',),
+        'updated_time': ('updated_time',),
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.requested_fields(self.context.get('request'))
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """?fields= 指定的字段，未指定或均无效时返回全部字段"""
+
+        value = request.query_params.get('fields') if request else None
+        if not value:
+            return cls.Meta.fields
+        fields = [name for name in value.split(',') if name in cls.Meta.fields]
+        return fields or cls.Meta.fields
+
+    @classmethod
+    def columns(cls, fields):
+        """fields 对应的数据库列，用于 QuerySet.only"""
+
+        return sorted({column for name in fields
+                       for column in cls.FIELD_COLUMNS[name]})
+
+    class Meta:
+        model = AuditOrder
+        fields = (
+            'id',
+            'order_id',
+            'audit_status',
+            'audit_user',
+            'audit_step',
+            'book_id',
+            'book_name',
+            'content_image',
+            'content_image_name',
+            'first_audit_time',
+            'second_audit_time',
+            'updated_time',
         )
 
 
+class AuditOrderConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = '工单已被修改，请刷新后重试'
+    default_code = 'conflict'
+
+    def __init__(self, data):
+        # 保留版本号、比对结果的原始类型，不转为 ErrorDetail
+        self.detail = {'detail': self.default_detail, **data}
+
+
 class UpdateAuditOrderSerializer(serializers.Serializer):
-    """提交工单"""
+    """提交工单
+
+    提交时校验版本号，版本号取请求中的 version，其次为 If-Match 请求头，
+    都没有时使用读取工单时的版本号。版本号不一致时返回 409 及提交内容
+    与当前内容的比对结果
+    """
+
+    RESULT_FIELDS = (
+        'first_audit_result',
+        'first_audit_patch',
+        'second_audit_result',
+        'second_audit_patch',
+    )
 
     audit_step = serializers.ChoiceField(
-        choices=(('first_audit', '初审'), ('second_audit', '复审')),
+        choices=AUDIT_STEP_CHOICES,
         required=True,
         write_only=True,
     )
-    audit_result = serializers.CharField(required=True, write_only=True)
+    audit_result = serializers.CharField(required=False, write_only=True)
+    use_draft = serializers.BooleanField(
+        required=False, write_only=True, help_text='使用已保存的草稿作为提交内容')
     need_suspend = serializers.BooleanField(required=False, write_only=True)
+    version = serializers.IntegerField(required=False, min_value=0)
 
     def validate(self, attrs):
+        if not attrs.get('audit_result') and not attrs.get('use_draft'):
+            raise serializers.ValidationError(
+                {'audit_result': '该字段是必填项。'})
+        if attrs.get('version') is None:
+            version = self.if_match_version()
+            if version is not None:
+                attrs['version'] = version
         return super().validate(attrs)
 
+    def if_match_version(self):
+        request = self.context.get('request')
+        header = request.META.get('HTTP_IF_MATCH', '') if request else ''
+        etags = [etag for etag in parse_etags(header) if etag != '*']
+        if not etags:
+            return None
+        try:
+            return int(etags[0].strip('"'))
+        except ValueError:
+            raise serializers.ValidationError({'version': 'If-Match 无效'})
+
     def update(self, instance, validated_data):
         step = validated_data['audit_step']
-        result = validated_data['audit_result']
+        result = validated_data.get('audit_result')
+        if not result:
+            result = AuditDraft.objects.filter(
+                order=instance, audit_step=step).values_list(
+                    'text', flat=True).first()
+            if not result:
+                raise serializers.ValidationError({'use_draft': '没有可提交的草稿'})
         suspend = validated_data.pop('need_suspend', False)
+        version = validated_data.get('version', instance.version)
+        if version != instance.version:
+            raise self.conflict(instance.pk, step, result)
+
+        before = {field: getattr(instance, field)
+                  for field in self.RESULT_FIELDS}
+        status_field = 'first_order_status' if step == 'first_audit' \
+            else 'second_order_status'
+        old_status = getattr(instance, status_field)
+        instance.set_audit_result(step, result)
+        setattr(instance, status_field, 'suspend' if suspend else 'success')
+        instance.updated_time = datetime.datetime.now()
+
+        # 只写入变化的列，未修改的大文本列不重写
+        fields = [field for field in self.RESULT_FIELDS
+                  if getattr(instance, field) != before[field]]
+        fields += [status_field, 'updated_time']
+        with transaction.atomic():
+            updated = AuditOrder.objects.filter(
+                pk=instance.pk, version=version,
+            ).update(
+                version=F('version') + 1,
+                **{field: getattr(instance, field) for field in fields},
+            )
+            if not updated:
+                raise self.conflict(instance.pk, step, result)
+            instance.version = version + 1
+            progress.transition(step, old_status, getattr(
+                instance, status_field), book_id=instance.raw_data.book_id)
+            events.record(instance.pk, step,
+                          'suspended' if suspend else 'submitted', old_status,
+                          current_userprofile(self.context['request']))
+            # 草稿已合并到提交结果
+            AuditDraft.objects.filter(order=instance, audit_step=step).delete()
+
+        # 初审完成后进入复审领单队列
+        if instance.first_order_status == 'success' \
+                and instance.second_order_status == 'unassign':
+            dispatch.enqueue('second_audit', [
+                (instance.id, instance.first_audit_user_id)])
+        return instance
 
-        if step == 'first_audit':
-            instance.first_audit_result = result
-            instance.first_order_status = 'suspend' if suspend else 'success'
-        elif step == 'second_audit':
-            instance.second_audit_result = result
-            instance.second_order_status = 'suspend' if suspend else 'success'
+    def conflict(self, pk, step, result):
+        current = AuditOrder.objects.select_related('raw_data').get(pk=pk)
+        first_result, second_result = current.get_audit_results()
+        current_result = first_result if step == 'first_audit' \
+            else second_result
+        return AuditOrderConflict({
+            'version': current.version,
+            'audit_step': step,
+            'audit_result': current_result,
+            'diff': textdiff.diff(current_result, result),
+        })
+
+
+class AuditDraftSerializer(serializers.Serializer):
+    """校对草稿自动保存
+
+    读取时返回草稿全文和序号；保存时提交相对上次保存内容的增量
+    ops: [[start, end, text], ...]，依次把 [start, end) 替换为 text，
+    位置按 Unicode 字符计算（不是 UTF-16 编码单元）。
+    seq 必须等于上次保存后返回的序号，不一致时返回 409，客户端需重新读取；
+    也可以提交 text 全文覆盖草稿
+    """
+
+    MAX_OPS = 1000
+
+    audit_step = serializers.ChoiceField(choices=AUDIT_STEP_CHOICES)
+    seq = serializers.IntegerField(min_value=0)
+    ops = serializers.ListField(
+        child=serializers.ListField(min_length=3, max_length=3),
+        required=False,
+        write_only=True,
+        max_length=MAX_OPS,
+    )
+    text = serializers.CharField(
+        required=False, allow_blank=True, trim_whitespace=False)
+
+    def validate_ops(self, value):
+        for start, end, text in value:
+            if not isinstance(start, int) or not isinstance(end, int) \
+                    or not isinstance(text, str) or not 0 <= start <= end:
+                raise serializers.ValidationError('增量格式应为 [start, end, text]')
+        return value
 
-        instance.save()
-        return instance
+    def validate(self, attrs):
+        if ('ops' in attrs) == ('text' in attrs):
+            raise serializers.ValidationError('ops 与 text 需提供且只能提供一个')
+        return attrs
+
+    @staticmethod
+    def apply_ops(text, ops):
+        for start, end, replacement in ops:
+            if end > len(text):
+                raise serializers.ValidationError({'ops': '增量超出草稿范围'})
+            text = text[:start] + replacement + text[end:]
+        return text
+
+    @staticmethod
+    def draft_data(order, step):
+        """当前草稿，没有草稿时为该阶段的当前文字"""
+
+        draft = AuditDraft.objects.filter(
+            order=order, audit_step=step).only('text', 'seq').first()
+        if draft:
+            return {'audit_step': step, 'seq': draft.seq, 'text': draft.text}
+        return {'audit_step': step, 'seq': 0,
+                'text': order.get_step_text(step)}
+
+    def save(self, order):
+        step = self.validated_data['audit_step']
+        seq = self.validated_data['seq']
+        user_id = current_userprofile(self.context['request']).id
+
+        current = AuditDraft.objects.filter(order=order, audit_step=step).only(
+            'text', 'seq').first()
+        if current is None:
+            current = AuditDraft(order=order, audit_step=step, seq=0,
+                                 text=order.get_step_text(step))
+        if current.seq != seq:
+            raise DraftConflict({'seq': current.seq})
+
+        text = self.validated_data.get('text')
+        if text is None:
+            text = self.apply_ops(current.text, self.validated_data['ops'])
+
+        if current.pk is None:
+            try:
+                with transaction.atomic():
+                    AuditDraft.objects.create(
+                        order=order, audit_step=step, text=text, seq=seq + 1,
+                        user_id=user_id)
+            except IntegrityError:
+                raise DraftConflict({'seq': self.draft_data(order, step)['seq']})
+        else:
+            # 只在序号未变化时写入，并发保存时后到者返回 409
+            updated = AuditDraft.objects.filter(pk=current.pk, seq=seq).update(
+                text=text, seq=seq + 1, user_id=user_id,
+                updated_time=datetime.datetime.now())
+            if not updated:
+                raise DraftConflict({'seq': self.draft_data(order, step)['seq']})
+        return {'audit_step': step, 'seq': seq + 1}
+
+
+class DraftConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = '草稿已在其他地方修改，请重新读取'
+    default_code = 'conflict'
+
+    def __init__(self, data):
+        self.detail = {'detail': self.default_detail, **data}
+
+
+def save_media(fp, name):
+    """按文件内容 hash 存储到 MEDIA_ROOT，返回访问 URL
+
+    NOTE 写入后在事务外调用 register 登记文件，事务回滚时由 gc_media 回收；
+    再在创建引用数据的同一事务中调用 acquire 登记引用
+    """
+
+    return f'{settings.MEDIA_URL}{store_file(fp, name)}'
 
 
 class CreateAuditOrderSerializer(serializers.Serializer):
@@ -189,16 +491,268 @@ class CreateAuditOrderSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         upload_file = validated_data.pop('content_image')
-        file_rename = '%s%s' % (filehash(file=upload_file.file),
-                                Path(upload_file.name).suffix)
-        with open(Path(settings.MEDIA_ROOT) / file_rename, 'wb+') as fp:
-            for chunk in upload_file.chunks():
-                fp.write(chunk)
-
-        validated_data['content_image'] = f'{settings.MEDIA_URL}{file_rename}'
-        raw_data = RawData.objects.create(**validated_data)
-        raw_data.save()
-        order = AuditOrder.objects.create(raw_data=raw_data)
-        order.order_id = order.make_order_id()
-        order.save()
+        validated_data['content_image'] = save_media(
+            upload_file, upload_file.name)
+        register([media_name(validated_data['content_image'])])
+        with transaction.atomic():
+            raw_data = RawData.objects.create(**validated_data)
+            acquire([media_name(raw_data.content_image)])
+            order = AuditOrder.objects.create(raw_data=raw_data)
+            order.order_id = order.make_order_id()
+            AuditOrder.objects.filter(id=order.id).update(
+                order_id=order.order_id)
+            progress.add_orders(raw_data.book_id, raw_data.book_name, 1)
+            dispatch.enqueue('first_audit', [(order.id, None)])
         return order
+
+
+class BatchPageSerializer(serializers.Serializer):
+    """批量创建工单时的单页清单"""
+
+    content_text = serializers.CharField(allow_blank=True)
+    content_text_name = serializers.CharField(max_length=200)
+    content_image_name = serializers.CharField(max_length=200)
+
+
+class BatchCreateAuditOrderSerializer(serializers.Serializer):
+    """一次请求批量创建整本书的初始工单
+
+    两种上传方式二选一：
+        1. content_images 多个扫描件 + pages 清单（JSON 字符串）
+        2. archive zip/tar 压缩包，包内根目录的 manifest.json 为 pages 清单，
+           content_image_name 为扫描件在包内的相对路径
+    pages 清单格式：
+    [
+        {
+            'content_image_name': '0001.png',
+            'content_text': 'OCR 识别之后的文字内容',
+            'content_text_name': '0001.txt',
+        },
+        ...
+    ]
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+    IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+    BULK_BATCH_SIZE = 500
+
+    book_name = serializers.CharField(write_only=True, max_length=200)
+    book_id = serializers.CharField(
+        write_only=True, required=False, allow_blank=True, max_length=10)
+    writing_mode = serializers.ChoiceField(choices=WRITING_MODE, write_only=True)
+    pages = serializers.JSONField(binary=True, required=False, write_only=True)
+    content_images = serializers.ListField(
+        child=serializers.FileField(), required=False, write_only=True)
+    archive = serializers.FileField(required=False, write_only=True)
+    batch_id = serializers.CharField(read_only=True)
+    count = serializers.IntegerField(read_only=True)
+
+    @staticmethod
+    def member_path(name):
+        """压缩包内的规范化相对路径，绝对路径或含 .. 时返回 None"""
+
+        name = name.replace('\\', '/')
+        if name.startswith('/') or '..' in name.split('/'):
+            return None
+        path = posixpath.normpath(name)
+        return None if path == '.' else path
+
+    def open_archive(self, archive):
+        """解压包，返回 (manifest, {包内路径: 打开文件的函数})"""
+
+        fp = archive.file
+        if zipfile.is_zipfile(fp):
+            fp.seek(0)
+            package = zipfile.ZipFile(fp)
+            entries = [(info.filename, info) for info in package.infolist()
+                       if not info.is_dir()]
+            open_member = package.open
+        else:
+            fp.seek(0)
+            try:
+                package = tarfile.open(fileobj=fp)
+            except tarfile.TarError:
+                raise serializers.ValidationError(
+                    {'archive': '仅支持 zip、tar 压缩包'})
+            entries = [(member.name, member)
+                       for member in package.getmembers() if member.isfile()]
+            open_member = package.extractfile
+
+        # NOTE 按包内完整路径区分文件，不同目录下的同名扫描件不会互相覆盖
+        members = {}
+        for name, member in entries:
+            path = self.member_path(name)
+            if path is None:
+                raise serializers.ValidationError(
+                    {'archive': f'压缩包内的路径无效：{name}'})
+            if path in members:
+                raise serializers.ValidationError(
+                    {'archive': f'压缩包内有重复的文件：{path}'})
+            members[path] = member
+
+        if self.MANIFEST_NAME not in members:
+            raise serializers.ValidationError(
+                {'archive': f'压缩包缺少 {self.MANIFEST_NAME}'})
+        with open_member(members.pop(self.MANIFEST_NAME)) as manifest:
+            try:
+                pages = json.load(manifest)
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'archive': f'{self.MANIFEST_NAME} 不是合法的 JSON'})
+
+        images = {name: functools.partial(open_member, member)
+                  for name, member in members.items()}
+        return pages, images
+
+    def validate(self, attrs):
+        archive = attrs.pop('archive', None)
+        uploads = attrs.pop('content_images', None)
+        pages = attrs.pop('pages', None)
+        if bool(archive) == bool(uploads):
+            raise serializers.ValidationError(
+                '请上传 archive 压缩包或 content_images 扫描件，二者选其一')
+
+        if archive:
+            pages, images = self.open_archive(archive)
+        else:
+            if pages is None:
+                raise serializers.ValidationError({'pages': '缺少 pages 清单'})
+            images = {}
+            for upload in uploads:
+                name = Path(upload.name).name
+                if name in images:
+                    raise serializers.ValidationError(
+                        {'content_images': f'扫描件重名：{name}'})
+                images[name] = functools.partial(
+                    contextlib.nullcontext, upload)
+
+        page_serializer = BatchPageSerializer(data=pages, many=True)
+        if not page_serializer.is_valid():
+            raise serializers.ValidationError(
+                {'pages': page_serializer.errors})
+        pages = page_serializer.validated_data
+        if not pages:
+            raise serializers.ValidationError({'pages': '清单不能为空'})
+
+        for page in pages:
+            name = self.member_path(page['content_image_name'])
+            if name is None:
+                raise serializers.ValidationError(
+                    {'pages': f'扫描件路径无效：{page["content_image_name"]}'})
+            page['content_image_name'] = name
+            if Path(name).suffix.lower() not in self.IMAGE_SUFFIXES:
+                raise serializers.ValidationError(
+                    {'pages': f'{name} 不是支持的图片格式'})
+            if name not in images:
+                raise serializers.ValidationError(
+                    {'pages': f'未上传扫描件 {name}'})
+
+        attrs['pages'] = pages
+        attrs['images'] = images
+        return attrs
+
+    def create(self, validated_data):
+        pages = validated_data.pop('pages')
+        images = validated_data.pop('images')
+        batch_id = uuid.uuid4().hex
+
+        # 扫描件在事务外写入并登记，后续失败回滚时由 gc_media 回收
+        raw_data = []
+        for page in pages:
+            with images[page['content_image_name']]() as fp:
+                content_image = save_media(fp, page['content_image_name'])
+            raw_data.append(RawData(
+                **validated_data,
+                **page,
+                content_image=content_image,
+                batch_id=batch_id,
+            ))
+        register([media_name(item.content_image) for item in raw_data])
+
+        with transaction.atomic():
+            RawData.objects.bulk_create(
+                raw_data, batch_size=self.BULK_BATCH_SIZE)
+            acquire([media_name(item.content_image) for item in raw_data])
+
+            # NOTE MySQL bulk_create 不返回自增 id，通过批次号取回
+            raw_data_ids = list(RawData.objects.filter(
+                batch_id=batch_id).values_list('id', flat=True))
+            AuditOrder.objects.bulk_create(
+                [AuditOrder(raw_data_id=raw_data_id)
+                 for raw_data_id in raw_data_ids],
+                batch_size=self.BULK_BATCH_SIZE,
+            )
+            AuditOrder.objects.filter(
+                raw_data_id__in=raw_data_ids,
+                order_id='',
+            ).update(order_id=AuditOrder.order_id_expression())
+            progress.add_orders(validated_data.get('book_id'),
+                                validated_data['book_name'],
+                                len(raw_data_ids))
+            dispatch.expire('first_audit')
+
+        return {'batch_id': batch_id, 'count': len(raw_data_ids)}
+
+
+class BookAuditStatSerializer(serializers.ModelSerializer):
+    """书籍校对统计"""
+
+    ocr_error_rate = serializers.FloatField(read_only=True)
+    correction_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookAuditStat
+        fields = (
+            'book_id',
+            'book_name',
+            'pages',
+            'audited_pages',
+            'second_audited_pages',
+            'ocr_chars',
+            'ocr_errors',
+            'ocr_error_rate',
+            'first_chars',
+            'second_corrections',
+            'correction_rate',
+            'hot_chars',
+            'computed_time',
+        )
+
+
+class BookProgressSerializer(serializers.ModelSerializer):
+    """书籍校对进度"""
+
+    pages = serializers.IntegerField(read_only=True)
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = BookProgress
+        fields = (
+            'book_id',
+            'book_name',
+            'pages',
+            'progress',
+            *progress.COUNTERS,
+            'updated_time',
+        )
+
+
+class AuditMetricRollupSerializer(serializers.ModelSerializer):
+    """每小时校对吞吐量和状态停留时长"""
+
+    user_nickname = serializers.CharField(
+        source='user.nickname', read_only=True, default=None)
+
+    class Meta:
+        model = AuditMetricRollup
+        fields = (
+            'hour',
+            'user',
+            'user_nickname',
+            'audit_step',
+            'assigned',
+            'submitted',
+            'suspended',
+            'durations',
+            'computed_time',
+        )
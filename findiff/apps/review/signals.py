@@ -0,0 +1,58 @@
+import datetime
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from findiff.common import storage, textdiff
+
+from .models import AuditOrder, RawData
+
+RESULT_FIELDS = (
+    'first_audit_result',
+    'first_audit_patch',
+    'second_audit_result',
+    'second_audit_patch',
+)
+
+
+@receiver(pre_save, sender=RawData)
+def freeze_audit_patches(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    """修改 OCR 文字前，把按补丁存储的校对结果还原为全文
+
+    NOTE 补丁基于修改前的 OCR 文字生成，修改后无法再还原；
+    直接 queryset.update() 修改 content_text 不会触发本信号。
+    bulk_update 不会自动更新 auto_now 字段，显式写入 updated_time
+    """
+
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'content_text' not in update_fields:
+        return
+    old_text = RawData.objects.filter(pk=instance.pk).values_list(
+        'content_text', flat=True).first()
+    if old_text is None or old_text == instance.content_text:
+        return
+
+    orders = list(AuditOrder.objects.filter(
+        Q(first_audit_patch__isnull=False) |
+        Q(second_audit_patch__isnull=False),
+        raw_data_id=instance.pk,
+    ).only('id', *RESULT_FIELDS))
+    now = datetime.datetime.now()
+    for order in orders:
+        first, second = textdiff.resolve_chain(old_text, [
+            (order.first_audit_result, order.first_audit_patch),
+            (order.second_audit_result, order.second_audit_patch),
+        ])
+        order.set_audit_results(first, second, use_patch=False)
+        order.updated_time = now
+    AuditOrder.objects.bulk_update(orders, [*RESULT_FIELDS, 'updated_time'])
+
+
+@receiver(post_delete, sender=RawData)
+def release_content_image(sender, instance, **kwargs):
+    """原始数据删除后释放扫描件引用"""
+
+    storage.release([storage.media_name(instance.content_image)])
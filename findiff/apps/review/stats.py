@@ -0,0 +1,77 @@
+"""书籍校对统计
+
+page_stats 在子进程中计算一组页面的编辑距离，merge_stats 汇总为整本书的结果。
+只统计状态为 success 的初审、复审结果，挂起等未完成的草稿不计入；
+每页的最终文字为复审结果，未完成复审时为初审结果。
+"""
+from collections import Counter
+
+from findiff.common import textdiff
+
+HOT_CHARS_LIMIT = 20
+COUNT_FIELDS = (
+    'pages',
+    'audited_pages',
+    'second_audited_pages',
+    'ocr_chars',
+    'ocr_errors',
+    'first_chars',
+    'second_corrections',
+)
+
+
+def source_length(stats):
+    """比对前文字的字数"""
+
+    return stats['equal'] + stats['delete'] + stats['replace']
+
+
+def page_stats(pages):
+    """pages: [(初审状态, 复审状态, OCR 文字, 初审结果, 初审补丁,
+    复审结果, 复审补丁), ...]"""
+
+    stats = dict.fromkeys(COUNT_FIELDS, 0)
+    hot_chars = Counter()
+    for first_status, second_status, content_text, *results in pages:
+        stats['pages'] += 1
+        if first_status != 'success':
+            continue
+        first_result, second_result = textdiff.resolve_chain(
+            content_text, [results[:2], results[2:]])
+        if second_status != 'success':
+            second_result = None
+
+        stats['audited_pages'] += 1
+        final = second_result or first_result
+        result = textdiff.diff(content_text, final)
+        stats['ocr_chars'] += source_length(result['stats'])
+        stats['ocr_errors'] += result['stats']['distance']
+        for tag, source, target in result['opcodes']:
+            if tag in ('replace', 'delete'):
+                hot_chars[(source, target)] += 1
+
+        if second_result:
+            stats['second_audited_pages'] += 1
+            result = textdiff.diff(first_result, second_result)
+            stats['first_chars'] += source_length(result['stats'])
+            stats['second_corrections'] += result['stats']['distance']
+
+    stats['hot_chars'] = hot_chars
+    return stats
+
+
+def merge_stats(results):
+    """汇总多个 page_stats 的结果，hot_chars 保留最多的 HOT_CHARS_LIMIT 个"""
+
+    stats = dict.fromkeys(COUNT_FIELDS, 0)
+    hot_chars = Counter()
+    for result in results:
+        for field in COUNT_FIELDS:
+            stats[field] += result[field]
+        hot_chars.update(result['hot_chars'])
+
+    stats['hot_chars'] = [
+        {'source': source, 'target': target, 'count': count}
+        for (source, target), count in hot_chars.most_common(HOT_CHARS_LIMIT)
+    ]
+    return stats
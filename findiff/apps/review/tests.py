@@ -1,3 +1,962 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import random
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from findiff.apps.userprofile.models import UserProfile
+from findiff.common import textdiff
+from findiff.models import MediaFile
+
+from . import dispatch, dispatch_queue, events, metrics, progress
+from .models import (AuditDraft, AuditMetricRollup, AuditOrder,
+                     AuditOrderEvent, BookAuditStat, BookProgress, RawData)
+from .stats import merge_stats, page_stats
+
+
+def create_orders(count, book_id='', **fields):
+    """创建 count 个工单，fields 为工单字段"""
+
+    orders = []
+    for index in range(count):
+        raw_data = RawData.objects.create(
+            book_id=book_id,
+            book_name='测试书籍',
+            writing_mode='v',
+            content_image=f'/media/{index}.png',
+            content_text='天地玄黄宇宙洪荒',
+            content_text_name=f'{index:04d}.txt',
+            content_image_name=f'{index}.png',
+        )
+        orders.append(AuditOrder.objects.create(raw_data=raw_data, **fields))
+    return orders
+
+
+class AuditOrderQueryCountTest(TestCase):
+    """校对工单列表、详情的查询数不随分页大小变化"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', password='admin')
+        first_user = UserProfile.objects.create(user=cls.user)
+        second_user = UserProfile.objects.create(
+            user=User.objects.create_user('proofreader'))
+
+        for index in range(30):
+            raw_data = RawData.objects.create(
+                book_name='测试书籍',
+                writing_mode='v',
+                content_image=f'/media/{index}.png',
+                content_text=f'第{index}页',
+                content_text_name=f'{index}.txt',
+                content_image_name=f'{index}.png',
+            )
+            AuditOrder.objects.create(
+                raw_data=raw_data,
+                first_audit_user=first_user,
+                first_order_status='success',
+                first_audit_result=f'第{index}页初审',
+                second_audit_user=second_user if index % 2 else None,
+                second_order_status='unaudit' if index % 2 else 'unassign',
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count(self):
+        for page_size in (5, 25):
+            cache.clear()
+            with self.assertNumQueries(2):  # count + 当前页
+                response = self.client.get(
+                    '/order/audit/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+            # count 已缓存
+            with self.assertNumQueries(1):
+                self.client.get(response.data['next'])
+
+    def test_list_cursor(self):
+        expected = list(AuditOrder.objects.order_by(
+            '-created_time', '-id').values_list('id', flat=True))
+
+        ids = []
+        url = '/order/audit/?page_size=7'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.data['count'], len(expected))
+            self.assertEqual(response.data['total_page'], 5)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], expected[21:28])
+
+        # 兼容 page 参数
+        response = self.client.get(
+            '/order/audit/', {'page_size': 7, 'page': 2})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], expected[7:14])
+
+    def test_list_invalid_params(self):
+        cursors = [
+            'garbage',
+            ['2024-01-01T00:00:00', 'x', 'next'],
+            ['2024-01-01T00:00:00', 1, 'sideways'],
+            [1, 1, 'next'],
+        ]
+        for cursor in cursors:
+            if not isinstance(cursor, str):
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(cursor).encode()).decode()
+            response = self.client.get('/order/audit/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('/order/audit/', {'ordering': 'id'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_omits_text(self):
+        response = self.client.get('/order/audit/')
+        item = response.data['results'][0]
+        self.assertNotIn('audit_result', item)
+        self.assertNotIn('raw_data', item)
+
+        response = self.client.get('/order/audit/', {'fields': 'id,audit_user'})
+        self.assertEqual(
+            set(response.data['results'][0]), {'id', 'audit_user'})
+
+    def test_retrieve_audit_result(self):
+        for order in AuditOrder.objects.all():
+            response = self.client.get(f'/order/audit/{order.id}/')
+            self.assertEqual(
+                response.data['audit_result'], order.first_audit_result)
+
+    def test_retrieve_query_count(self):
+        order = AuditOrder.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/order/audit/{order.id}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class DispatchTest(TestCase):
+    """领单：同一工单只能被领取一次，按优先级分配"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first_user = UserProfile.objects.create(
+            user=User.objects.create_user('first'))
+        cls.second_user = UserProfile.objects.create(
+            user=User.objects.create_user('second'))
+
+    def test_assign_race(self):
+        order = create_orders(1)[0]
+        self.assertTrue(dispatch.assign(
+            order.id, 'first_audit', self.first_user))
+        # 已被领取的工单再次分配失败，不覆盖初审人
+        self.assertFalse(dispatch.assign(
+            order.id, 'first_audit', self.second_user))
+
+        order.refresh_from_db()
+        self.assertEqual(order.first_audit_user, self.first_user)
+        self.assertEqual(order.first_order_status, 'unaudit')
+        self.assertEqual(order.version, 1)
+
+    def test_second_audit_excludes_first_user(self):
+        order = create_orders(
+            1, first_audit_user=self.first_user, first_order_status='success')[0]
+        self.assertFalse(dispatch.assign(
+            order.id, 'second_audit', self.first_user))
+        self.assertTrue(dispatch.assign(
+            order.id, 'second_audit', self.second_user))
+        self.assertFalse(dispatch.assign(
+            order.id, 'second_audit', self.second_user))
+
+    def test_next_order_priority(self):
+        first, second = create_orders(2)
+        own = create_orders(
+            1, first_audit_user=self.first_user, first_order_status='suspend')[0]
+        reviewable = create_orders(
+            1, first_audit_user=self.second_user, first_order_status='success')[0]
+
+        # 本人挂起的工单 > 复审待分配 > 初审待分配
+        self.assertEqual(dispatch.next_order_id(self.first_user), own.id)
+        AuditOrder.objects.filter(id=own.id).update(first_order_status='success')
+        self.assertEqual(dispatch.next_order_id(self.first_user), reviewable.id)
+        # 领到的复审工单未提交前继续返回该工单
+        self.assertEqual(dispatch.next_order_id(self.first_user), reviewable.id)
+        AuditOrder.objects.filter(id=reviewable.id).update(
+            second_order_status='success')
+        self.assertEqual(dispatch.next_order_id(self.first_user), first.id)
+
+        # 本人初审的工单不能复审，只能领初审工单
+        self.assertEqual(dispatch.next_order_id(self.second_user), own.id)
+        AuditOrder.objects.filter(id=own.id).update(second_order_status='success')
+        self.assertEqual(dispatch.next_order_id(self.second_user), second.id)
+
+    def test_no_order(self):
+        self.assertIsNone(dispatch.next_order_id(self.first_user))
+        user = self.first_user.user
+        user.is_superuser = True
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/order/audit/apply/')
+        self.assertEqual(response.status_code, 400)
+
+
+class AuditOrderSubmitTest(TestCase):
+    """提交工单：If-Match 与当前版本号不一致时返回 409 及比对结果"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', password='admin')
+        cls.userprofile = UserProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.order = create_orders(
+            1, first_audit_user=self.userprofile,
+            first_order_status='unaudit')[0]
+        self.url = f'/order/audit/{self.order.id}/'
+
+    def submit(self, text, **headers):
+        return self.client.patch(self.url, {
+            'audit_step': 'first_audit', 'audit_result': text,
+        }, format='json', **headers)
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"{self.order.version}"')
+
+    def test_if_match(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.submit('天地元黄宇宙洪荒', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        order = AuditOrder.objects.get(id=self.order.id)
+        self.assertEqual(order.version, self.order.version + 1)
+        self.assertEqual(order.first_order_status, 'success')
+        self.assertEqual(order.get_first_audit_result(), '天地元黄宇宙洪荒')
+        self.assertEqual(self.client.get(self.url)['ETag'],
+                         f'"{order.version}"')
+
+        # 用过期的 ETag 再次提交
+        response = self.submit('天地玄黄宇宙洪荒。', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], order.version)
+        self.assertEqual(response.data['audit_result'], '天地元黄宇宙洪荒')
+        self.assertEqual(response.data['diff']['opcodes'], [
+            ['equal', '天地', '天地'],
+            ['replace', '元', '玄'],
+            ['equal', '黄宇宙洪荒', '黄宇宙洪荒'],
+            ['insert', '', '。'],
+        ])
+        self.assertEqual(
+            AuditOrder.objects.get(id=self.order.id).version, order.version)
+
+    def test_version_over_if_match(self):
+        # 请求中的 version 优先于 If-Match
+        response = self.client.patch(self.url, {
+            'audit_step': 'first_audit',
+            'audit_result': '天地元黄宇宙洪荒',
+            'version': self.order.version + 1,
+        }, format='json', HTTP_IF_MATCH=f'"{self.order.version}"')
+        self.assertEqual(response.status_code, 409)
+
+        response = self.submit('天地元黄宇宙洪荒', HTTP_IF_MATCH='"abc"')
+        self.assertEqual(response.status_code, 400)
+
+
+class AuditDraftTest(TestCase):
+    """草稿按序号增量保存，提交工单时可使用草稿"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', password='admin')
+        cls.userprofile = UserProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.order = create_orders(
+            1, first_audit_user=self.userprofile,
+            first_order_status='unaudit')[0]
+        self.url = f'/order/audit/{self.order.id}/draft/'
+
+    def save_draft(self, seq, **data):
+        return self.client.patch(self.url, {
+            'audit_step': 'first_audit', 'seq': seq, **data}, format='json')
+
+    def get_draft(self):
+        return self.client.get(self.url, {'audit_step': 'first_audit'}).data
+
+    def test_ops(self):
+        # 没有草稿时为 OCR 文字
+        self.assertEqual(self.get_draft(), {
+            'audit_step': 'first_audit', 'seq': 0, 'text': '天地玄黄宇宙洪荒'})
+
+        response = self.save_draft(0, ops=[[2, 3, '元'], [8, 8, '。']])
+        self.assertEqual(response.data, {'audit_step': 'first_audit', 'seq': 1})
+        response = self.save_draft(1, ops=[[0, 0, '\U00020000']])
+        self.assertEqual(response.data['seq'], 2)
+        self.assertEqual(self.get_draft()['text'], '\U00020000天地元黄宇宙洪荒。')
+
+        response = self.save_draft(2, text='日月盈昃')
+        self.assertEqual(self.get_draft(), {
+            'audit_step': 'first_audit', 'seq': 3, 'text': '日月盈昃'})
+
+        for data in ({'ops': [[0, 10, '']]}, {'ops': [[3, 1, '']]},
+                     {'ops': [], 'text': ''}, {}):
+            response = self.save_draft(3, **data)
+            self.assertEqual(response.status_code, 400)
+
+    def test_seq_conflict(self):
+        self.save_draft(0, text='天地元黄')
+        response = self.save_draft(0, text='天地玄黄。')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['seq'], 1)
+        self.assertEqual(self.get_draft()['text'], '天地元黄')
+
+        # 尚未创建草稿时序号不为 0 也是冲突
+        AuditDraft.objects.all().delete()
+        response = self.save_draft(1, text='天地玄黄。')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['seq'], 0)
+
+    def test_submit_use_draft(self):
+        submit_url = f'/order/audit/{self.order.id}/'
+        response = self.client.patch(submit_url, {
+            'audit_step': 'first_audit', 'use_draft': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.save_draft(0, ops=[[2, 3, '元']])
+        response = self.client.patch(submit_url, {
+            'audit_step': 'first_audit', 'use_draft': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order = AuditOrder.objects.get(id=self.order.id)
+        self.assertEqual(order.get_first_audit_result(), '天地元黄宇宙洪荒')
+        self.assertEqual(order.first_order_status, 'success')
+        self.assertFalse(AuditDraft.objects.filter(order=order).exists())
+
+
+class BatchInitTest(TestCase):
+    """批量创建工单：清单、压缩包解析，失败回滚后扫描件可被回收"""
+
+    URL = '/order/audit/batch_init/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', password='admin')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @staticmethod
+    def manifest(names):
+        return [{'content_image_name': name, 'content_text': f'第{index}页',
+                 'content_text_name': f'{index:04d}.txt'}
+                for index, name in enumerate(names, 1)]
+
+    def post(self, **data):
+        return self.client.post(self.URL, {
+            'book_name': '千字文', 'book_id': 'B001', 'writing_mode': 'v',
+            **data}, format='multipart')
+
+    def post_images(self, count):
+        names = [f'{index:04d}.png' for index in range(1, count + 1)]
+        return self.post(
+            pages=json.dumps(self.manifest(names)),
+            content_images=[SimpleUploadedFile(name, name.encode())
+                            for name in names])
+
+    def post_archive(self, files, manifest=None, kind='zip'):
+        buffer = io.BytesIO()
+        if manifest is not None:
+            files = {'manifest.json': json.dumps(manifest), **files}
+        if kind == 'zip':
+            with zipfile.ZipFile(buffer, 'w') as package:
+                for name, content in files.items():
+                    package.writestr(name, content)
+        else:
+            with tarfile.open(fileobj=buffer, mode='w') as package:
+                for name, content in files.items():
+                    content = content.encode()
+                    info = tarfile.TarInfo(name)
+                    info.size = len(content)
+                    package.addfile(info, io.BytesIO(content))
+        archive = SimpleUploadedFile(f'book.{kind}', buffer.getvalue())
+        return self.post(archive=archive)
+
+    def test_images(self):
+        response = self.post_images(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['count'], 3)
+        orders = AuditOrder.objects.select_related('raw_data').order_by('id')
+        self.assertEqual(
+            [order.raw_data.content_text for order in orders],
+            ['第1页', '第2页', '第3页'])
+        self.assertTrue(all(order.order_id for order in orders))
+        self.assertEqual(
+            list(MediaFile.objects.values_list('ref_count', flat=True)),
+            [1, 1, 1])
+        self.assertEqual(BookProgress.objects.get().first_unassign, 3)
+
+    def test_archive(self):
+        # 不同目录下的同名扫描件分别对应各自的页面
+        names = ['a/0001.png', './b/0001.png']
+        for kind in ('zip', 'tar'):
+            AuditOrder.objects.all().delete()
+            RawData.objects.all().delete()
+            response = self.post_archive(
+                {'a/0001.png': 'a', 'b/0001.png': 'b'},
+                self.manifest(names), kind=kind)
+            self.assertEqual(response.status_code, 201)
+            images = list(RawData.objects.order_by('id').values_list(
+                'content_image_name', 'content_image'))
+            self.assertEqual([name for name, _ in images],
+                             ['a/0001.png', 'b/0001.png'])
+            self.assertNotEqual(images[0][1], images[1][1])
+
+    def test_invalid(self):
+        cases = [
+            ({'0001.png': 'a'}, None),
+            ({'0001.png': 'a'}, self.manifest(['0002.png'])),
+            ({'0001.txt': 'a'}, self.manifest(['0001.txt'])),
+            ({'a/0001.png': 'a', 'a/./0001.png': 'b'},
+             self.manifest(['a/0001.png'])),
+            ({'../0001.png': 'a'}, self.manifest(['0001.png'])),
+            ({'/0001.png': 'a'}, self.manifest(['0001.png'])),
+            ({'0001.png': 'a'}, self.manifest(['../0001.png'])),
+        ]
+        for files, manifest in cases:
+            for kind in ('zip', 'tar'):
+                response = self.post_archive(files, manifest, kind=kind)
+                self.assertEqual(response.status_code, 400, (files, kind))
+        response = self.post(pages=json.dumps(self.manifest(['0001.png'])))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RawData.objects.exists())
+
+    def test_rollback(self):
+        with mock.patch.object(progress, 'add_orders',
+                               side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), \
+                    self.assertLogs('django.request', 'ERROR'):
+                self.post_images(2)
+        self.assertFalse(RawData.objects.exists())
+        self.assertFalse(AuditOrder.objects.exists())
+        # 已写入的扫描件已登记，引用数为 0，由 gc_media 回收
+        self.assertEqual(
+            list(MediaFile.objects.values_list('ref_count', flat=True)),
+            [0, 0])
+
+    def test_query_count(self):
+        self.post_images(1)
+        # 查询数不随页数增加
+        with self.assertNumQueries(11):
+            self.post_images(2)
+        with self.assertNumQueries(11):
+            self.post_images(6)
+
+
+class BookProgressTest(TestCase):
+    """书籍进度计数随工单状态增减，rebuild 修正计数偏差"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', password='admin')
+        cls.userprofile = UserProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.orders = create_orders(3, book_id='B001')
+        progress.add_orders('B001', '测试书籍', 3)
+
+    def counts(self):
+        book_progress = BookProgress.objects.get(book_id='B001')
+        return {field: getattr(book_progress, field)
+                for field in progress.COUNTERS}
+
+    def assertCounts(self, **expected):
+        counts = self.counts()
+        self.assertEqual(counts, progress.count_orders('B001'))
+        self.assertEqual(
+            {field: value for field, value in counts.items() if value},
+            expected)
+
+    def test_transition(self):
+        self.assertCounts(first_unassign=3, second_unassign=3)
+
+        order = self.orders[0]
+        self.assertTrue(dispatch.assign(
+            order.id, 'first_audit', self.userprofile))
+        # 领单失败时不改变计数
+        self.assertFalse(dispatch.assign(
+            order.id, 'first_audit', self.userprofile))
+        self.assertCounts(first_unassign=2, first_unaudit=1,
+                          second_unassign=3)
+
+        url = f'/order/audit/{order.id}/'
+        self.client.patch(url, {
+            'audit_step': 'first_audit', 'audit_result': '天地元黄',
+            'need_suspend': True}, format='json')
+        self.assertCounts(first_unassign=2, first_suspend=1,
+                          second_unassign=3)
+        self.client.patch(url, {
+            'audit_step': 'first_audit', 'audit_result': '天地元黄'},
+            format='json')
+        self.assertCounts(first_unassign=2, first_success=1,
+                          second_unassign=3)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertCounts(first_unassign=2, second_unassign=2)
+
+        response = self.client.get('/order/book_progress/B001/')
+        self.assertEqual(response.data['first_unassign'], 2)
+
+    def test_rebuild(self):
+        AuditOrder.objects.filter(id=self.orders[0].id).update(
+            first_order_status='success')
+        BookProgress.objects.filter(book_id='B001').update(second_unassign=7)
+
+        book_progress, changed = progress.rebuild('B001')
+        self.assertTrue(changed)
+        self.assertEqual(book_progress.first_success, 1)
+        self.assertCounts(first_unassign=2, first_success=1,
+                          second_unassign=3)
+        self.assertFalse(progress.rebuild('B001')[1])
+
+        # 已没有工单的书籍删除进度
+        BookProgress.objects.create(book_id='B999', book_name='已删除')
+        call_command('reconcile_book_progress', stdout=io.StringIO())
+        self.assertEqual(list(BookProgress.objects.values_list(
+            'book_id', flat=True)), ['B001'])
+
+
+class DispatchQueueTest(TestCase):
+    """领单预取队列的补充、弹出、追加和过期"""
+
+    BACKENDS = (
+        dispatch_queue.MemoryDispatchQueue,
+        dispatch_queue.CacheDispatchQueue,
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.orders = create_orders(3)
+        self.source = dispatch.first_audit_orders()
+
+    def test_pop(self):
+        for backend in self.BACKENDS:
+            queue = backend(batch_size=2)
+            queue.clear()
+            # 队列为空时从数据库补充一批
+            self.assertEqual(queue.pop('first_audit', 1, self.source),
+                             self.orders[0].id)
+            self.assertEqual(queue.pop('first_audit', 1, self.source),
+                             self.orders[1].id)
+            # 队列中的 id 只是候选，工单未被领取时补充后仍会再次弹出
+            self.assertEqual(queue.pop('first_audit', 1, self.source),
+                             self.orders[0].id)
+
+    def test_pop_skips_own_first_audit(self):
+        for backend in self.BACKENDS:
+            queue = backend()
+            queue.clear()
+            state = queue.empty_state()
+            state['entries'] = [(self.orders[0].id, 7), (self.orders[1].id, 8)]
+            queue.store('second_audit', state)
+            self.assertEqual(queue.pop('second_audit', 7, self.source),
+                             self.orders[1].id)
+            self.assertIsNone(queue.pop('second_audit', 7, self.source))
+
+    def test_push_and_expire(self):
+        for backend in self.BACKENDS:
+            queue = backend(batch_size=10)
+            queue.clear()
+            # 未取完数据库中的候选工单时忽略追加
+            queue.push('first_audit', [(100, None)])
+            self.assertEqual(list(queue.load('first_audit')['entries']), [])
+
+            queue.pop('first_audit', 1, self.source)
+            self.assertTrue(queue.load('first_audit')['exhausted'])
+            queue.push('first_audit', [(100, None)])
+            self.assertEqual(
+                [entry[0] for entry in queue.load('first_audit')['entries']],
+                [self.orders[1].id, self.orders[2].id, 100])
+
+            queue.expire('first_audit')
+            self.assertFalse(queue.load('first_audit')['exhausted'])
+            queue.push('first_audit', [(101, None)])
+            self.assertEqual(len(queue.load('first_audit')['entries']), 3)
+
+    @override_settings(DISPATCH_QUEUE={
+        'BACKEND': 'findiff.apps.review.dispatch_queue.MemoryDispatchQueue'})
+    def test_claim_queued_race(self):
+        dispatch_queue._queue = None
+        self.addCleanup(setattr, dispatch_queue, '_queue', None)
+        first_user, second_user, other = [
+            UserProfile.objects.create(user=User.objects.create_user(name))
+            for name in ('first', 'second', 'other')]
+
+        self.assertEqual(dispatch.claim_queued('first_audit', first_user),
+                         self.orders[0].id)
+        # 其他进程绕过本进程队列领走了队列中的下一张工单
+        self.assertTrue(dispatch.assign(
+            self.orders[1].id, 'first_audit', other))
+        self.assertEqual(dispatch.claim_queued('first_audit', second_user),
+                         self.orders[2].id)
+        self.assertIsNone(dispatch.claim_queued('first_audit', second_user))
+
+        order = AuditOrder.objects.get(id=self.orders[1].id)
+        self.assertEqual(order.first_audit_user, other)
+
+
+def random_text(size, seed=0):
+    rng = random.Random(seed)
+    return ''.join(rng.choice('天地玄黄宇宙洪荒日月盈昃') for _ in range(size))
+
+
+def lcs_length(a, b):
+    """最长公共子序列长度，用于校验 Myers 算法的结果是最短编辑脚本"""
+
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b, 1):
+            previous, row[j] = row[j], previous + 1 if x == y \
+                else max(row[j], row[j - 1])
+    return row[-1]
+
+
+class TextDiffTest(TestCase):
+
+    def test_tokenize(self):
+        # 异体字选择符跟随前一个字，字母数字连续成词
+        self.assertEqual(textdiff.tokenize('葛\U000e0100城 ab12，x'),
+                         ['葛\U000e0100', '城', ' ', 'ab12', '，', 'x'])
+        self.assertEqual(textdiff.tokenize(None), [])
+
+    def test_opcodes_shortest(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            a = [rng.choice('天地玄黄宇') for _ in range(rng.randint(0, 12))]
+            b = [rng.choice('天地玄黄宙') for _ in range(rng.randint(0, 12))]
+            opcodes = textdiff.myers_opcodes(a, b)
+
+            rebuilt = []
+            equal = 0
+            for tag, i1, i2, j1, j2 in opcodes:
+                if tag == 'equal':
+                    self.assertEqual(a[i1:i2], b[j1:j2])
+                    equal += i2 - i1
+                rebuilt.extend(b[j1:j2])
+            self.assertEqual(rebuilt, b)
+            self.assertEqual(equal, lcs_length(a, b))
+
+    def test_diff(self):
+        result = textdiff.diff('天地玄黄，宇宙洪荒', '天地元黄宇宙洪荒。')
+        self.assertEqual(result['opcodes'], [
+            ['equal', '天地', '天地'],
+            ['replace', '玄', '元'],
+            ['equal', '黄', '黄'],
+            ['delete', '，', ''],
+            ['equal', '宇宙洪荒', '宇宙洪荒'],
+            ['insert', '', '。'],
+        ])
+        self.assertEqual(result['stats'], {
+            'equal': 7, 'insert': 1, 'delete': 1, 'replace': 1,
+            'distance': 3, 'ratio': round(14 / 18, 4)})
+
+        self.assertEqual(textdiff.diff('', '')['stats']['ratio'], 1.0)
+        self.assertEqual(textdiff.diff('', '天')['opcodes'],
+                         [['insert', '', '天']])
+
+    def test_patch_round_trip(self):
+        rng = random.Random(1)
+        base = random_text(200)
+        for _ in range(50):
+            text = list(base)
+            for _ in range(rng.randint(0, 5)):
+                index = rng.randrange(len(text))
+                text[index:index + rng.randint(0, 3)] = rng.choice(
+                    ['', '元', '。', '辰宿列张'])
+            text = ''.join(text)
+            patch = textdiff.make_patch(base, text)
+            self.assertIsNotNone(patch)
+            self.assertEqual(textdiff.apply_patch(base, patch), text)
+
+        # 补丁不比全文小时不生成补丁
+        self.assertIsNone(textdiff.make_patch('天地', '宇宙'))
+        with self.assertRaises(textdiff.PatchMismatch):
+            textdiff.apply_patch(base + '。', textdiff.make_patch(base, base))
+
+    def test_resolve_chain(self):
+        base = random_text(100)
+        first = base.replace('玄', '元')
+        second = first + '。'
+        self.assertEqual(textdiff.resolve_chain(base, [
+            (None, textdiff.make_patch(base, first)),
+            (None, textdiff.make_patch(first, second)),
+        ]), [first, second])
+        # 复审按全文存储、初审尚未提交时基于 OCR 文字还原
+        self.assertEqual(textdiff.resolve_chain(base, [
+            ('', None), (None, textdiff.make_patch(base, second)),
+        ]), ['', second])
+
+
+class RawDataEditTest(TestCase):
+    """修改 OCR 文字后按补丁存储的校对结果仍可读取"""
+
+    def test_freeze_patches(self):
+        order = create_orders(1)[0]
+        raw_data = order.raw_data
+        raw_data.content_text = random_text(100)
+        raw_data.save()
+        first = raw_data.content_text.replace('玄', '元')
+        second = first + '。'
+        order.set_audit_results(first, second, use_patch=True)
+        order.save()
+        self.assertIsNotNone(order.first_audit_patch)
+        self.assertIsNotNone(order.second_audit_patch)
+
+        raw_data.content_text = '日月盈昃'
+        raw_data.save()
+        order = AuditOrder.objects.select_related('raw_data').get(id=order.id)
+        self.assertIsNone(order.first_audit_patch)
+        self.assertIsNone(order.second_audit_patch)
+        self.assertEqual(order.get_audit_results(), (first, second))
+
+        # 只保存其他字段时不读取原文
+        with self.assertNumQueries(1):
+            raw_data.save(update_fields=['book_name'])
+
+    def test_diff_after_edit(self):
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_superuser('admin', password='admin'))
+        patched, full_text = create_orders(2)
+        for order in (patched, full_text):
+            order.set_audit_results('天地元黄宇宙洪荒', '',
+                                    use_patch=order is patched)
+            order.save()
+        self.assertIsNotNone(patched.first_audit_patch)
+        self.assertIsNone(full_text.first_audit_patch)
+
+        def diff(order):
+            response = client.get(f'/order/audit/{order.id}/diff/')
+            self.assertEqual(response.status_code, 200)
+            return response.data['diffs']['first_audit']['opcodes']
+
+        for order in (patched, full_text):
+            self.assertEqual(diff(order), [
+                ['equal', '天地', '天地'],
+                ['replace', '玄', '元'],
+                ['equal', '黄宇宙洪荒', '黄宇宙洪荒'],
+            ])
+            # 修改 OCR 文字后不使用缓存中的比对结果
+            raw_data = order.raw_data
+            raw_data.content_text = '天地元黄宇宙洪荒。'
+            raw_data.save()
+            self.assertEqual(diff(order), [
+                ['equal', '天地元黄宇宙洪荒', '天地元黄宇宙洪荒'],
+                ['delete', '。', ''],
+            ])
+
+        # 直接 update 修改时同样失效
+        RawData.objects.filter(id=full_text.raw_data_id).update(
+            content_text='天地元黄')
+        self.assertEqual(diff(full_text), [
+            ['equal', '天地元黄', '天地元黄'],
+            ['insert', '', '宇宙洪荒'],
+        ])
+        self.assertGreater(
+            AuditOrder.objects.get(id=patched.id).updated_time,
+            patched.updated_time)
+
+
+class BookStatsTest(TestCase):
+    """书籍校对统计只计入已提交的初审、复审结果"""
+
+    def test_page_stats(self):
+        stats = page_stats([
+            ('success', 'success', '天地玄黄', '天地元黄', None, '天地元黄。', None),
+            ('success', 'unassign', '宇宙洪荒', '宇宙洪荒', None, None, None),
+            # 挂起的草稿不计入
+            ('suspend', 'unassign', '日月盈昃', '日月盈仄', None, None, None),
+            ('success', 'suspend', '辰宿列张', '辰宿列张', None, '辰宿列帐', None),
+            ('unassign', 'unassign', '寒来暑往', None, None, None, None),
+        ])
+        self.assertEqual(stats['hot_chars'], {('玄', '元'): 1})
+        del stats['hot_chars']
+        self.assertEqual(stats, {
+            'pages': 5,
+            'audited_pages': 3,
+            'second_audited_pages': 1,
+            'ocr_chars': 12,
+            'ocr_errors': 2,
+            'first_chars': 4,
+            'second_corrections': 1,
+        })
+
+    def test_page_stats_patch(self):
+        base = '天地玄黄宇宙洪荒'
+        first = '天地元黄宇宙洪荒'
+        patch = textdiff.make_patch(base, first)
+        stats = merge_stats([page_stats([
+            ('success', 'unassign', base, None, patch, None, None)])])
+        self.assertEqual(stats['ocr_errors'], 1)
+        self.assertEqual(stats['hot_chars'],
+                         [{'source': '玄', 'target': '元', 'count': 1}])
+
+    def test_command(self):
+        orders = create_orders(3, book_id='B001')
+        create_orders(1, book_id='B002')
+        orders[0].set_audit_results('天地元黄宇宙洪荒', '')
+        orders[0].first_order_status = 'success'
+        orders[0].save()
+        orders[1].set_audit_results('天地玄黄宇宙洪', '')
+        orders[1].first_order_status = 'suspend'
+        orders[1].save()
+
+        call_command('compute_book_stats', '--book', 'B001',
+                     '--processes', '1', '--chunk-size', '2',
+                     '--fetch-size', '2', stdout=io.StringIO())
+        stat = BookAuditStat.objects.get()
+        self.assertEqual(stat.book_id, 'B001')
+        self.assertEqual(stat.book_name, '测试书籍')
+        self.assertEqual(
+            (stat.pages, stat.audited_pages, stat.second_audited_pages),
+            (3, 1, 0))
+        self.assertEqual((stat.ocr_chars, stat.ocr_errors), (8, 1))
+        self.assertEqual(stat.hot_chars,
+                         [{'source': '玄', 'target': '元', 'count': 1}])
+
+
+class EventBufferTest(TestCase):
+    """事件缓冲区满 batch_size 条或定时写入"""
+
+    def setUp(self):
+        self.written = []
+        self.flushed = threading.Event()
+
+        def write(items):
+            self.written.append(items)
+            self.flushed.set()
+
+        patcher = mock.patch.object(events, 'write', write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_size(self):
+        buffer = events.EventBuffer(batch_size=3, flush_interval=60)
+        self.addCleanup(buffer.close)
+        buffer.add(1)
+        buffer.add(2)
+        self.assertEqual(self.written, [])
+        buffer.add(3)
+        buffer.add(4)
+        self.assertEqual(self.written, [[1, 2, 3]])
+
+        buffer.close()
+        self.assertEqual(self.written, [[1, 2, 3], [4]])
+        buffer.flush()
+        self.assertEqual(len(self.written), 2)
+
+    def test_flush_interval(self):
+        buffer = events.EventBuffer(batch_size=100, flush_interval=0.01)
+        self.addCleanup(buffer.close)
+        buffer.add(1)
+        # 没有新事件时由后台线程写入
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(self.written, [[1]])
+
+
+class MetricsTest(TestCase):
+    """每小时汇总吞吐量和状态停留时长百分位"""
+
+    HOUR = datetime.datetime(2024, 1, 1, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserProfile.objects.create(
+            user=User.objects.create_user('proofreader'))
+
+    def at(self, minutes):
+        return self.HOUR + datetime.timedelta(minutes=minutes)
+
+    def create_events(self, *items):
+        order = create_orders(1)[0]
+        AuditOrder.objects.filter(id=order.id).update(created_time=self.HOUR)
+        AuditOrderEvent.objects.bulk_create([
+            AuditOrderEvent(order=order, audit_step='first_audit', event=event,
+                            from_status=status, user=self.user,
+                            created_time=self.at(minutes))
+            for minutes, event, status in items
+        ])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([metrics.percentile(values, p) for p in (50, 90, 99)],
+                         [50, 90, 99])
+        self.assertEqual(metrics.summarize([5.0]), {
+            'count': 1, 'avg': 5.0, 'p50': 5.0, 'p90': 5.0, 'p99': 5.0})
+
+    def test_rollup_hour(self):
+        self.create_events((10, 'assigned', 'unassign'),
+                           (30, 'submitted', 'unaudit'))
+        self.create_events((20, 'assigned', 'unassign'),
+                           (50, 'suspended', 'unaudit'),
+                           (70, 'submitted', 'suspend'))
+        # 上一个事件在前一小时
+        self.create_events((-10, 'assigned', 'unassign'),
+                           (5, 'submitted', 'unaudit'))
+
+        rollups = metrics.rollup_hour(self.HOUR)
+        self.assertEqual(
+            sorted(rollup.user_id or 0 for rollup in rollups),
+            [0, self.user.id])
+        for rollup in rollups:
+            self.assertEqual(rollup.hour, self.HOUR)
+            self.assertEqual(
+                (rollup.assigned, rollup.submitted, rollup.suspended),
+                (2, 2, 1))
+            self.assertEqual(rollup.durations, {
+                'unassign': {'count': 2, 'avg': 900.0,
+                             'p50': 600.0, 'p90': 1200.0, 'p99': 1200.0},
+                'unaudit': {'count': 3, 'avg': 1300.0,
+                            'p50': 1200.0, 'p90': 1800.0, 'p99': 1800.0},
+            })
+
+    def test_command_lookback(self):
+        last = metrics.truncate_hour(datetime.datetime.now()) - metrics.HOUR
+        AuditMetricRollup.objects.create(hour=last, audit_step='first_audit')
+        out = io.StringIO()
+        call_command('rollup_audit_events', '--lookback-hours', 2, stdout=out)
+        hours = [line[:13] for line in out.getvalue().splitlines()[:-1]]
+        self.assertEqual(hours, [
+            f'{last + offset * metrics.HOUR:%Y-%m-%d %H}'
+            for offset in range(-2, 2)])
+        self.assertFalse(AuditMetricRollup.objects.exists())
@@ -1,9 +1,14 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import ApplyAuditOrderView, AuditOrderViewSet
+from .views import (ApplyAuditOrderView, AuditMetricRollupViewSet,
+                    AuditOrderViewSet, BookAuditStatViewSet,
+                    BookProgressViewSet)
 
 router = DefaultRouter()
 router.register('audit', AuditOrderViewSet)
+router.register('book_stats', BookAuditStatViewSet)
+router.register('book_progress', BookProgressViewSet)
+router.register('metrics', AuditMetricRollupViewSet)
 
 urlpatterns = [
     path('audit/apply/', ApplyAuditOrderView.as_view()),
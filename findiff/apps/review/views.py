@@ -1,17 +1,33 @@
+from django.db import transaction
+from django.db.models.functions import MD5
+from django.utils.http import quote_etag
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
 from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.settings import api_settings
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from findiff.common.pagination import KeysetPagination
 from findiff.common.permissions.perms import PermsRequired
 
-from .models import AuditOrder
+from . import progress
+from .models import (AUDIT_STEP_CHOICES, AuditMetricRollup, AuditOrder,
+                     BookAuditStat, BookProgress)
 from .serializers import (
     ApplyAuditOrderSerializer,
+    AuditDraftSerializer,
+    AuditMetricRollupSerializer,
+    AuditOrderDiffSerializer,
+    AuditOrderListSerializer,
     AuditOrderSerializer,
+    BatchCreateAuditOrderSerializer,
+    BookAuditStatSerializer,
+    BookProgressSerializer,
     CreateAuditOrderSerializer,
     UpdateAuditOrderSerializer,
 )
@@ -45,6 +61,12 @@ class AuditOrderViewSet(ModelViewSet):
 
     queryset = AuditOrder.objects.all()
     serializer_class = AuditOrderSerializer
+    pagination_class = KeysetPagination
+    # NOTE 游标分页固定按 (created_time, id) 排序，不提供 ordering 参数
+    filter_backends = [
+        backend for backend in api_settings.DEFAULT_FILTER_BACKENDS
+        if not issubclass(backend, OrderingFilter)
+    ]
 
     def get_permissions(self):
         actions_perms = {
@@ -60,9 +82,45 @@ class AuditOrderViewSet(ModelViewSet):
             self.permission_classes = [PermsRequired(*perms)]
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.select_related(
+                'raw_data', 'first_audit_user', 'second_audit_user')
+        elif self.action in ('update', 'partial_update', 'draft', 'destroy'):
+            # 按补丁存储结果、草稿初始内容需要 OCR 文字，删除时需要书籍ID
+            queryset = queryset.select_related('raw_data')
+        elif self.action == 'list':
+            # 只读取列表字段用到的列，不读取页面文字
+            fields = AuditOrderListSerializer.requested_fields(self.request)
+            columns = AuditOrderListSerializer.columns(fields)
+            relations = sorted({column.split('__')[0] for column in columns
+                                if '__' in column})
+            queryset = queryset.select_related(*relations).only(
+                *columns, *relations, self.paginator.ordering_field)
+        elif self.action == 'diff':
+            # 比对结果命中缓存时不需要读取文字，OCR 文字只在数据库中计算 md5
+            queryset = queryset.only(
+                'id', 'order_id', 'updated_time').annotate(
+                raw_text_md5=MD5('raw_data__content_text'))
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # 提交时通过 If-Match 带回，用于检测并发修改
+        response['ETag'] = quote_etag(str(response.data['version']))
+        return response
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            progress.remove_order(instance)
+            instance.delete()
+
     def get_serializer_class(self):
         if self.action in ('update', 'partial_update'):
             return UpdateAuditOrderSerializer
+        if self.action == 'list':
+            return AuditOrderListSerializer
         return self.serializer_class
 
     @action(
@@ -76,3 +134,90 @@ class AuditOrderViewSet(ModelViewSet):
         res.is_valid(raise_exception=True)
         res.save()
         return Response(status=201)
+
+    @action(
+        methods=['post'],
+        detail=False,
+        parser_classes=[MultiPartParser],
+        serializer_class=BatchCreateAuditOrderSerializer,
+        permission_classes=[PermsRequired('userprofile.create_audit_order')])
+    def batch_init(self, request, *args, **kwargs):
+        res = self.get_serializer(data=request.data)
+        res.is_valid(raise_exception=True)
+        res.save()
+        return Response(res.data, status=201)
+
+    @action(
+        methods=['get'],
+        detail=True,
+        serializer_class=AuditOrderDiffSerializer,
+        permission_classes=[PermsRequired('userprofile.scan_audit_order')])
+    def diff(self, request, *args, **kwargs):
+        """OCR 文字、初审、复审结果的逐字比对及编辑统计"""
+
+        res = self.get_serializer(self.get_object())
+        return Response(res.data)
+
+    @action(
+        methods=['get', 'patch'],
+        detail=True,
+        serializer_class=AuditDraftSerializer,
+        permission_classes=[PermsRequired('userprofile.submit_audit_order')])
+    def draft(self, request, *args, **kwargs):
+        """校对草稿：GET 读取草稿，PATCH 提交增量自动保存
+
+        提交工单时传 use_draft=true 可直接使用草稿内容
+        """
+
+        order = self.get_object()
+        if request.method == 'GET':
+            step = request.query_params.get('audit_step')
+            if step not in dict(AUDIT_STEP_CHOICES):
+                raise ValidationError({'audit_step': '无效的审核阶段'})
+            return Response(AuditDraftSerializer.draft_data(order, step))
+
+        res = self.get_serializer(data=request.data)
+        res.is_valid(raise_exception=True)
+        return Response(res.save(order))
+
+
+class BookAuditStatViewSet(ReadOnlyModelViewSet):
+    """书籍校对统计，数据由 compute_book_stats 命令生成"""
+
+    queryset = BookAuditStat.objects.order_by('book_id')
+    serializer_class = BookAuditStatSerializer
+    permission_classes = [PermsRequired('userprofile.list_audit_order')]
+    lookup_field = 'book_id'
+    search_fields = ('book_id', 'book_name')
+    ordering_fields = ('book_id', 'pages', 'ocr_errors', 'second_corrections',
+                       'computed_time')
+
+
+class BookProgressViewSet(ReadOnlyModelViewSet):
+    """书籍校对进度，工单状态变化时增量更新，reconcile_book_progress 命令重新统计"""
+
+    queryset = BookProgress.objects.order_by('book_id')
+    serializer_class = BookProgressSerializer
+    permission_classes = [PermsRequired('userprofile.list_audit_order')]
+    lookup_field = 'book_id'
+    search_fields = ('book_id', 'book_name')
+    ordering_fields = ('book_id', 'first_unassign', 'second_success',
+                       'updated_time')
+
+
+class AuditMetricRollupViewSet(ReadOnlyModelViewSet):
+    """每小时校对吞吐量和状态停留时长，数据由 rollup_audit_events 命令生成
+
+    user__isnull=true 为全部校对人的汇总
+    """
+
+    queryset = AuditMetricRollup.objects.select_related('user').order_by(
+        '-hour', 'user_id', 'audit_step')
+    serializer_class = AuditMetricRollupSerializer
+    permission_classes = [PermsRequired('userprofile.list_audit_order')]
+    filterset_fields = {
+        'hour': ['gte', 'lt'],
+        'user': ['exact', 'isnull'],
+        'audit_step': ['exact'],
+    }
+    ordering_fields = ('hour', 'submitted', 'assigned')
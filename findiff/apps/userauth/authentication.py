@@ -0,0 +1,58 @@
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+
+from findiff.apps.userprofile.models import UserProfile
+from . import claims
+
+
+class ClaimsTokenUser(TokenUser):
+    """由 token 权限声明构造的用户，不查询数据库"""
+
+    @cached_property
+    def is_superuser(self):
+        return self.token.get(claims.SUPERUSER_CLAIM, False)
+
+    @cached_property
+    def perms(self):
+        return claims.decode_perms(self.token[claims.PERMS_CLAIM])
+
+    @cached_property
+    def userprofile_id(self):
+        return self.token.get(claims.PROFILE_CLAIM)
+
+    @cached_property
+    def userprofile(self):
+        # NOTE 访问 userprofile 仍会查询数据库，只需要 id 时使用 userprofile_id
+        return UserProfile.objects.get(pk=self.userprofile_id)
+
+    def get_all_permissions(self, obj=None):
+        return self.perms
+
+    def has_perm(self, perm, obj=None):
+        return self.is_superuser or perm in self.perms
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """token 中带有权限声明时按声明鉴权，只校验权限版本号
+
+    版本号从 CACHES 中的副本读取，未命中时才查询数据库；权限变化后共享
+    CACHES 的进程立即拒绝旧 token，其他服务器最多延迟 VERSION_TIMEOUT 秒，
+    见 findiff.common.versions
+
+    没有权限声明的 token（未开启 JWT_PERMS_CLAIMS 时签发）按原方式查询用户
+    """
+
+    def get_user(self, validated_token):
+        if claims.PERMS_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        user = ClaimsTokenUser(validated_token)
+        version = validated_token.get(claims.PERMS_VERSION_CLAIM)
+        if version != claims.perms_version(user.id):
+            raise InvalidToken('权限已变更，请刷新 token')
+        return user
@@ -0,0 +1,56 @@
+"""JWT 中的权限声明
+
+开启 settings.JWT_PERMS_CLAIMS 后，签发 token 时写入以下声明：
+    su: 是否超级管理员
+    pm: 按 ALL_PERMS 顺序编码的权限位图（十六进制字符串）
+    pv: 签发时的权限版本号 [全局版本号, 用户版本号, 权限配置摘要]
+    pid: 用户 UserProfile id
+
+NOTE ALL_PERMS 的顺序决定位图的含义，权限配置变化时摘要随之变化，
+已签发的 token 会因版本不一致而失效
+"""
+import hashlib
+
+from findiff.common.permissions.cache import get_perms_version
+from findiff.common.permissions.perm_config import ALL_PERMS
+
+PERMS_PREFIX = 'userprofile.'
+PERMS_CODES = [PERMS_PREFIX + codename for codename, _ in ALL_PERMS]
+PERMS_DIGEST = hashlib.md5(
+    ','.join(PERMS_CODES).encode()).hexdigest()[:8]
+
+SUPERUSER_CLAIM = 'su'
+PERMS_CLAIM = 'pm'
+PERMS_VERSION_CLAIM = 'pv'
+PROFILE_CLAIM = 'pid'
+
+
+def encode_perms(perms):
+    """权限集合编码为位图，不在 ALL_PERMS 中的权限忽略"""
+
+    mask = 0
+    for index, code in enumerate(PERMS_CODES):
+        if code in perms:
+            mask |= 1 << index
+    return format(mask, 'x')
+
+
+def decode_perms(value):
+    mask = int(value, 16)
+    return {code for index, code in enumerate(PERMS_CODES)
+            if mask >> index & 1}
+
+
+def perms_version(user_id):
+    return [*get_perms_version(user_id), PERMS_DIGEST]
+
+
+def add_perms_claims(token, user):
+    """写入权限声明，版本号先于权限读取，避免读取期间权限变化未被察觉"""
+
+    token[PERMS_VERSION_CLAIM] = perms_version(user.id)
+    token[SUPERUSER_CLAIM] = user.is_superuser
+    token[PERMS_CLAIM] = encode_perms(user.get_all_permissions())
+    userprofile = getattr(user, 'userprofile', None)
+    token[PROFILE_CLAIM] = userprofile.id if userprofile else None
+    return token
@@ -1,14 +1,22 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import (
     TokenObtainPairSerializer,
     TokenRefreshSerializer,
 )
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.serializers import ValidationError
 
+from .claims import add_perms_claims
+
 
 class LoginSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
+        if settings.JWT_PERMS_CLAIMS:
+            add_perms_claims(token, user)
         return token
 
     def validate(self, attrs):
@@ -23,5 +31,22 @@ class LoginSerializer(TokenObtainPairSerializer):
 
 class TokenRefreshSerializer(TokenRefreshSerializer):
     def validate(self, attrs):
-        data = super().validate(attrs)
+        if not settings.JWT_PERMS_CLAIMS:
+            return super().validate(attrs)
+
+        # refresh token 中的权限声明可能已过期，刷新时按当前权限重新生成
+        refresh = RefreshToken(attrs['refresh'])
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]},
+            is_active=True,
+        ).select_related('userprofile').first()
+        if user is None:
+            raise ValidationError('用户不存在或已停用')
+        add_perms_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            data['refresh'] = str(refresh)
         return data
@@ -1,3 +1,108 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import InvalidToken
 
-# Create your tests here.
+from findiff.apps.userprofile.models import UserProfile
+from findiff.common.permissions.perm_config import insert_perms_to_db
+
+from . import claims
+from .authentication import ClaimsJWTAuthentication
+
+
+class PermsCodingTest(TestCase):
+
+    def test_round_trip(self):
+        for perms in (set(), set(claims.PERMS_CODES),
+                      set(claims.PERMS_CODES[::2]), {claims.PERMS_CODES[-1]}):
+            self.assertEqual(
+                claims.decode_perms(claims.encode_perms(perms)), perms)
+
+    def test_unknown_perms_ignored(self):
+        value = claims.encode_perms({'auth.add_user', claims.PERMS_CODES[0]})
+        self.assertEqual(value, '1')
+        self.assertEqual(claims.decode_perms(value), {claims.PERMS_CODES[0]})
+
+
+@override_settings(JWT_PERMS_CLAIMS=True)
+class ClaimsAuthenticationTest(TestCase):
+    """token 权限声明：权限变化后 token 失效，刷新后按当前权限重新生成"""
+
+    @classmethod
+    def setUpTestData(cls):
+        insert_perms_to_db()
+        cls.user = User.objects.create_user('reader', password='reader123')
+        UserProfile.objects.create(user=cls.user, nickname='校对员')
+        cls.group = Group.objects.create(name='校对')
+        cls.group.permissions.set(Permission.objects.filter(
+            codename__in=['list_audit_order', 'apply_audit_order']))
+        cls.user.groups.add(cls.group)
+
+    def setUp(self):
+        # 测试之间数据库回滚，CACHES 中的版本号副本不回滚
+        cache.clear()
+        self.client = APIClient()
+        response = self.client.post('/auth/token/', {
+            'username': 'reader', 'password': 'reader123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.access = response.data['access']
+        self.refresh = response.data['refresh']
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'JWT {access}')
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_claims(self):
+        # 签发 token 时已缓存版本号，之后鉴权不查询数据库
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.access)
+        self.assertEqual(user.get_all_permissions(), {
+            'userprofile.list_audit_order', 'userprofile.apply_audit_order'})
+        self.assertFalse(user.is_superuser)
+        self.assertEqual(user.userprofile_id, self.user.userprofile.id)
+
+        # 版本号副本被淘汰时只读取权限版本号
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.authenticate(self.access)
+        with self.assertNumQueries(0):
+            self.authenticate(self.access)
+
+    def test_version_mismatch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.remove(
+                Permission.objects.get(codename='apply_audit_order'))
+        with self.assertRaises(InvalidToken):
+            self.authenticate(self.access)
+
+        # 缓存被清空后版本号不回退，已失效的 token 不会重新生效
+        cache.clear()
+        with self.assertRaises(InvalidToken):
+            self.authenticate(self.access)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {self.access}')
+        response = self.client.get('/order/audit/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_regenerates_claims(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.group)
+
+        response = self.client.post(
+            '/auth/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        user = self.authenticate(response.data['access'])
+        self.assertEqual(user.get_all_permissions(), set())
+
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'JWT {response.data["access"]}')
+        response = self.client.get('/order/audit/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_refresh_inactive_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(
+            '/auth/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UserProfileConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'findiff.apps.userprofile'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:45
+
+from django.db import migrations, models
+
+from findiff.common.fulltext import fulltext_index
+
+
+def fill_search_text(apps, schema_editor):
+    UserProfile = apps.get_model('userprofile', 'UserProfile')
+    profiles = UserProfile.objects.select_related('user').only(
+        'nickname', 'user__username', 'user__email')
+    for profile in profiles.iterator():
+        user = profile.user
+        values = [profile.nickname]
+        if user:
+            values += [user.username, user.email]
+        profile.search_text = ' '.join(value for value in values if value)
+        UserProfile.objects.filter(pk=profile.pk).update(
+            search_text=profile.search_text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprofile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='昵称、用户名、邮箱拼接的文本，用于全文检索', verbose_name='搜索文本'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        fulltext_index('userprofile_userprofile', 'userprofile_search_ft',
+                       ['search_text']),
+    ]
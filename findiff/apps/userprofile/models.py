@@ -37,6 +37,13 @@ class UserProfile(models.Model):
         help_text='更新时间',
         auto_now=True,
     )
+    search_text = models.TextField(
+        '搜索文本',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='昵称、用户名、邮箱拼接的文本，用于全文检索',
+    )
     operator = models.ForeignKey(
         'userprofile.UserProfile',
         on_delete=models.PROTECT,
@@ -53,8 +60,21 @@ class UserProfile(models.Model):
     def save(self, *args, **kwargs):
         if not self.nickname:
             self.nickname = self.user.username
+        self.search_text = self.build_search_text(self.nickname, self.user)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def build_search_text(nickname, user):
+        """search_text 的内容，User 修改时见 signals.user_saved"""
+
+        values = [nickname]
+        if user:
+            values += [user.username, user.email]
+        return ' '.join(value for value in values if value)
+
     class Meta:
         verbose_name = '系统用户'
         verbose_name_plural = verbose_name
@@ -1,6 +1,9 @@
 from rest_framework import serializers
-# from django.db import transaction
-from django.contrib.auth.models import Group, Permission
+from django.db import transaction
+from django.contrib.auth.models import Group, Permission, User
+from django.utils import timezone
+
+from findiff.common.permissions.cache import bump_perms_version
 from .models import UserProfile
 
 
@@ -29,7 +32,7 @@ class EmbedGroupSerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
 
     user_id = serializers.IntegerField(source='user.id', read_only=True)
-    username = serializers.CharField(source='user.usernanme', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
     create_time = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S')
     update_time = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S')
     is_active = serializers.BooleanField(
@@ -64,7 +67,8 @@ class RoleSerializer(serializers.ModelSerializer):
     perms = serializers.SerializerMethodField()
 
     def get_perms(self, obj):
-        return list(obj.permissions.all().values_list('codename', flat=True))
+        # 使用 prefetch_related 预取的权限，不再单独查询
+        return [perm.codename for perm in obj.permissions.all()]
 
     class Meta:
         model = Group
@@ -94,6 +98,7 @@ class UpsertRoleSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         permissions = validated_data.pop('perms', [])
         instance.name = validated_data.get('name', instance.name)
+        instance.save()
         perms_ins = Permission.objects.filter(codename__in=permissions)
         instance.permissions.set(perms_ins)
         return instance
@@ -104,17 +109,75 @@ class UpsertRoleSerializer(serializers.ModelSerializer):
 
 
 class UserProfileWithRoleSerializer(serializers.Serializer):
-    """用户管理"""
-
-    user_list = serializers.PrimaryKeyRelatedField(
-        queryset=UserProfile.objects.all(), many=True)
-    role_list = serializers.PrimaryKeyRelatedField(
-        queryset=Group.objects.all(), many=True)
+    """用户管理，将用户的角色设置为 role_list
+
+    按 auth_user_groups 现有数据计算差异，在一个事务中批量删除、插入，
+    查询次数与用户数无关
+    """
+
+    user_list = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False)
+    role_list = serializers.ListField(child=serializers.IntegerField())
+    added = serializers.IntegerField(read_only=True)
+    removed = serializers.IntegerField(read_only=True)
+    users = serializers.IntegerField(read_only=True)
+
+    def validate_user_list(self, value):
+        value = set(value)
+        # NOTE user 为空（关联的 User 已删除）的用户资料不参与角色分配
+        self.user_map = dict(UserProfile.objects.filter(
+            id__in=value, user__isnull=False).values_list('id', 'user_id'))
+        missing = value - set(self.user_map)
+        if missing:
+            raise serializers.ValidationError(
+                f'用户不存在：{sorted(missing)}')
+        return sorted(value)
+
+    def validate_role_list(self, value):
+        value = set(value)
+        missing = value - set(
+            Group.objects.filter(id__in=value).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'角色不存在：{sorted(missing)}')
+        return sorted(value)
 
     def save(self):
-        users = self.validated_data['user_list']
-        roles = self.validated_data['role_list']
-
-        for user in users:
-            user.user.groups.set(roles)
-            user.save()
+        user_ids = set(self.user_map.values())
+        role_ids = set(self.validated_data['role_list'])
+        through = User.groups.through
+
+        with transaction.atomic():
+            existing = through.objects.filter(
+                user_id__in=user_ids).values_list('id', 'user_id', 'group_id')
+            remove_ids, changed = [], set()
+            current = set()
+            for row_id, user_id, group_id in existing:
+                if group_id in role_ids:
+                    current.add((user_id, group_id))
+                else:
+                    remove_ids.append(row_id)
+                    changed.add(user_id)
+            rows = [through(user_id=user_id, group_id=group_id)
+                    for user_id in user_ids for group_id in role_ids
+                    if (user_id, group_id) not in current]
+            changed.update(row.user_id for row in rows)
+
+            if remove_ids:
+                through.objects.filter(id__in=remove_ids).delete()
+            if rows:
+                through.objects.bulk_create(rows, ignore_conflicts=True)
+            if changed:
+                UserProfile.objects.filter(user_id__in=changed).update(
+                    update_time=timezone.now())
+                # 批量操作不会发送 m2m_changed 信号，手动使权限缓存失效
+                bump_perms_version(changed)
+
+        self.instance = {
+            'user_list': self.validated_data['user_list'],
+            'role_list': self.validated_data['role_list'],
+            'added': len(rows),
+            'removed': len(remove_ids),
+            'users': len(changed),
+        }
+        return self.instance
@@ -0,0 +1,60 @@
+"""角色、权限变化时使权限缓存失效
+
+覆盖接口（UpsertRoleSerializer、UserProfileWithRoleSerializer）和
+Django Admin 中对角色权限、用户角色、用户权限的修改。
+角色增删改时同时使角色下拉选项的缓存失效，
+用户修改时同步用户资料的搜索文本。
+"""
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from findiff.common.httpcache import bump_version
+from findiff.common.permissions.cache import bump_perms_version
+
+from .models import UserProfile
+
+ROLE_OPTIONS_CACHE = 'role_options'
+
+CHANGED_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_perms_changed(sender, instance, action, **kwargs):
+    if action not in CHANGED_ACTIONS:
+        return
+    # 从角色、权限一侧修改时无法确定全部受影响的用户，递增全局版本号
+    bump_perms_version([instance.pk] if isinstance(instance, User) else None)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_perms_changed(sender, action, **kwargs):
+    if action in CHANGED_ACTIONS:
+        bump_perms_version()
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, **kwargs):
+    bump_perms_version()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    bump_version(ROLE_OPTIONS_CACHE)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # 停用、取消超级管理员等修改需要让已签发的 token 失效，仅更新登录时间时忽略
+    if created or update_fields == frozenset(['last_login']):
+        return
+    bump_perms_version([instance.pk])
+
+    # 用户名、邮箱变化时同步用户资料的搜索文本
+    profile = UserProfile.objects.filter(user=instance).only('nickname').first()
+    if profile:
+        UserProfile.objects.filter(pk=profile.pk).update(
+            search_text=UserProfile.build_search_text(
+                profile.nickname, instance))
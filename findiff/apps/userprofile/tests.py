@@ -1,3 +1,258 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from findiff.common.permissions.cache import (
+    PERMS_VERSION_KEY, get_perms_version, get_user_perms)
+from findiff.common.versions import VERSION_KEY
+
+from .models import UserProfile
+
+
+class UserProfileListTest(TestCase):
+    """用户列表的查询数不随分页大小变化"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+        groups = [Group.objects.create(name=f'角色{index}')
+                  for index in range(3)]
+        for index in range(20):
+            user = User.objects.create_user(
+                f'proofreader{index}', email=f'reader{index}@example.com')
+            user.groups.set(groups[:index % 3 + 1])
+            UserProfile.objects.create(user=user, nickname=f'校对员{index}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_query_count(self):
+        # count、分页数据（join auth_user）、预取角色
+        for page_size in (5, 20):
+            with self.assertNumQueries(3):
+                res = self.client.get(
+                    '/user/users/', {'page_size': page_size})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(len(res.data['results']), page_size)
+
+        # 按创建时间倒序
+        row = res.data['results'][0]
+        self.assertEqual(row['username'], 'proofreader19')
+        self.assertEqual(row['email'], 'reader19@example.com')
+        self.assertEqual([group['name'] for group in row['groups']],
+                         ['角色0', '角色1'])
+
+    def test_search(self):
+        res = self.client.get('/user/users/', {'search': 'reader13@'})
+        self.assertEqual([row['nickname'] for row in res.data['results']],
+                         ['校对员13'])
+
+        # 修改用户名后搜索文本同步更新
+        user = User.objects.get(username='proofreader7')
+        user.username = 'renamed'
+        user.save()
+        res = self.client.get('/user/users/', {'search': 'renamed'})
+        self.assertEqual([row['nickname'] for row in res.data['results']],
+                         ['校对员7'])
+
+
+class PermsCacheTest(TestCase):
+    """角色变化后权限缓存失效，缓存被清空后版本号不回退"""
+
+    def setUp(self):
+        # 测试之间数据库回滚，CACHES 中的版本号副本不回滚
+        cache.clear()
+
+    def test_revoke_role(self):
+        permission = Permission.objects.select_related('content_type').first()
+        name = f'{permission.content_type.app_label}.{permission.codename}'
+        group = Group.objects.create(name='校对')
+        group.permissions.add(permission)
+        user = User.objects.create_user('reader')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.add(group)
+        self.assertIn(name, get_user_perms(User.objects.get(pk=user.pk)))
+        version = get_perms_version(user.pk)
+
+        cache.clear()
+        self.assertEqual(get_perms_version(user.pk), version)
+        self.assertIn(name, get_user_perms(User.objects.get(pk=user.pk)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.remove(group)
+        self.assertGreater(get_perms_version(user.pk), version)
+        self.assertNotIn(name, get_user_perms(User.objects.get(pk=user.pk)))
+
+    def test_warm_check(self):
+        user = User.objects.create_user('reader')
+        with self.assertNumQueries(3):  # 版本号、用户权限、角色权限
+            perms = get_user_perms(user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_perms(user), perms)
+
+        # 版本号副本被淘汰时查询表，不重新读取权限
+        cache.delete_many([VERSION_KEY % PERMS_VERSION_KEY])
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_perms(user), perms)
+
+    def test_bump_after_commit(self):
+        user = User.objects.create_user('reader')
+        version = get_perms_version(user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.user_permissions.add(Permission.objects.first())
+        # 提交前版本号不变
+        self.assertEqual(get_perms_version(user.pk), version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_perms_version(user.pk),
+                         (version[0], version[1] + 1))
+
+
+class AssignRoleTest(TestCase):
+    """批量分配角色：只增删有变化的角色，查询数不随用户数变化"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+        cls.groups = [Group.objects.create(name=f'角色{index}')
+                      for index in range(3)]
+        cls.profiles = [
+            UserProfile.objects.create(
+                user=User.objects.create_user(f'proofreader{index}'),
+                nickname=f'校对员{index}')
+            for index in range(10)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def assign(self, profiles, groups):
+        res = self.client.post('/user/roles/assign_role/', {
+            'user_list': [profile.id for profile in profiles],
+            'role_list': [group.id for group in groups],
+        }, format='json')
+        self.assertEqual(res.status_code, 200)
+        return res.data['added'], res.data['removed'], res.data['users']
+
+    def roles(self, profile):
+        return sorted(profile.user.groups.values_list('name', flat=True))
+
+    def test_assign(self):
+        profiles = self.profiles[:3]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.assign(profiles, self.groups[:2]),
+                             (6, 0, 3))
+        self.assertEqual(self.roles(profiles[0]), ['角色0', '角色1'])
+        self.assertEqual(self.roles(self.profiles[3]), [])
+
+        # 只删除、插入有变化的角色
+        self.profiles[0].user.groups.add(self.groups[2])
+        versions = [get_perms_version(profile.user_id)
+                    for profile in profiles]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.assign(profiles, self.groups[1:]),
+                             (2, 3, 3))
+        for profile, version in zip(profiles, versions):
+            self.assertEqual(self.roles(profile), ['角色1', '角色2'])
+            self.assertGreater(get_perms_version(profile.user_id), version)
+
+        # 角色未变化时不修改数据，不使权限缓存失效
+        versions = [get_perms_version(profile.user_id)
+                    for profile in profiles]
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.assign(profiles, self.groups[1:]),
+                             (0, 0, 0))
+        self.assertEqual(callbacks, [])
+        self.assertEqual([get_perms_version(profile.user_id)
+                          for profile in profiles], versions)
+
+        # 角色为空时移除全部角色
+        self.assertEqual(self.assign(profiles, []), (0, 6, 3))
+        self.assertEqual(self.roles(profiles[0]), [])
+
+    def test_invalid(self):
+        res = self.client.post('/user/roles/assign_role/', {
+            'user_list': [self.profiles[0].id, 0],
+            'role_list': [self.groups[0].id, 0],
+        }, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(set(res.data), {'user_list', 'role_list'})
+        self.assertFalse(self.profiles[0].user.groups.exists())
+
+    def test_query_count(self):
+        for count in (2, 10):
+            profiles = self.profiles[:count]
+            # 用户资料、角色、现有角色、插入、更新用户资料，以及事务的 savepoint
+            with self.assertNumQueries(7):
+                self.assign(profiles, self.groups[:2])
+            # 删除、插入
+            with self.assertNumQueries(8):
+                self.assign(profiles, self.groups[1:])
+            # 没有变化时只查询
+            with self.assertNumQueries(5):
+                self.assign(profiles, self.groups[1:])
+            self.assign(profiles, [])
+
+
+class RoleOptionsTest(TestCase):
+    """角色下拉选项：ETag 未变化时返回 304，角色修改、删除后返回新数据"""
+
+    url = '/user/roles/options/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+        cls.groups = [Group.objects.create(name=f'角色{index}')
+                      for index in range(12)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.data['results'])
+
+    def test_all_roles(self):
+        # 不按分页参数截断，也不修改请求的查询参数
+        response = self.client.get(self.url, {'page': 2, 'page_size': 5})
+        self.assertEqual(len(self.names(response)), 12)
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(response.wsgi_request.GET['page_size'], '5')
+
+        response = self.client.get(self.url, {'search': '角色1'})
+        self.assertEqual(self.names(response), ['角色1', '角色10', '角色11'])
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(len(self.names(response)), 12)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # ETag 不一致时返回数据
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(len(self.names(response)), 12)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.groups[0].name = '校对'
+            self.groups[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertIn('校对', self.names(response))
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.groups[0].delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotIn('校对', self.names(response))
+        self.assertEqual(len(response.data['results']), 11)
@@ -1,13 +1,21 @@
+import math
+from collections import OrderedDict
+
 from django.contrib.auth.models import Group
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from findiff.common.fulltext import FullTextSearchFilter
+from findiff.common.httpcache import cached_response
 from findiff.common.permissions.perm_config import PERMS_CONFIG
 from findiff.common.permissions.perms import PermsRequired
 
 from .models import UserProfile
+from .signals import ROLE_OPTIONS_CACHE
 from .serializers import (
     EmbedGroupSerializer,
     RoleSerializer,
@@ -16,14 +24,21 @@ from .serializers import (
     UserProfileWithRoleSerializer,
 )
 
+OPTIONS_PAGE_SIZE = 1000
+
 
 class UserProfileViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     """用户列表"""
 
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user').prefetch_related(
+        'user__groups').order_by('-create_time', '-id')
     serializer_class = UserProfileSerializer
     permission_classes = [PermsRequired('userprofile.check_user_list')]
-    search_fields = ('nickname', 'user__username', 'user__email')
+    filter_backends = (DjangoFilterBackend, FullTextSearchFilter,
+                       OrderingFilter)
+    # search_text 为昵称、用户名、邮箱拼接的文本，MySQL 上使用全文索引检索
+    search_fields = ('search_text',)
+    fulltext_fields = ('search_text',)
 
 
 class RoleViewSet(viewsets.ModelViewSet):
@@ -36,6 +51,12 @@ class RoleViewSet(viewsets.ModelViewSet):
     serializer_class = RoleSerializer
     search_fields = ('name',)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related('permissions')
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return UpsertRoleSerializer
@@ -58,11 +79,25 @@ class RoleViewSet(viewsets.ModelViewSet):
         detail=False,
         serializer_class=EmbedGroupSerializer)
     def options(self, request, *args, **kwargs):
-        request.GET._mutable = True
-        request.GET['page_size'] = 1000
-        request.GET['page'] = 1
-        request.GET._mutable = False
-        return self.list(request, *args, **kwargs)
+        """角色下拉选项，角色增删改时缓存失效"""
+
+        def build():
+            # NOTE 不经过分页，直接返回前 OPTIONS_PAGE_SIZE 个角色，
+            # 返回格式与分页接口一致
+            queryset = self.filter_queryset(self.get_queryset())
+            roles = self.get_serializer(
+                queryset[:OPTIONS_PAGE_SIZE], many=True).data
+            count = queryset.count()
+            return OrderedDict([
+                ('count', count),
+                ('page_size', OPTIONS_PAGE_SIZE),
+                ('total_page', math.ceil(count / OPTIONS_PAGE_SIZE)),
+                ('next', None),
+                ('previous', None),
+                ('results', roles),
+            ])
+
+        return cached_response(request, ROLE_OPTIONS_CACHE, build)
 
     @action(
         methods=['post'],
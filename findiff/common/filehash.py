@@ -1,28 +1,77 @@
+import functools
 import hashlib
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
 
+DEFAULT_ALGORITHM = 'md5'
+BUFFER_SIZE = 1024 * 1024  # 1 MiB
 
-def filehash(filepath=None, file=None):
+
+def _update_from_file(hash, fp, buffer_size):
+    readinto = getattr(fp, 'readinto', None)
+    if readinto is None:
+        for chunk in iter(functools.partial(fp.read, buffer_size), b''):
+            hash.update(chunk)
+        return
+
+    # 复用同一块缓冲区，避免每次 read 都分配新的 bytes
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    while True:
+        size = readinto(buffer)
+        if not size:
+            break
+        hash.update(view[:size])
+
+
+def _update_from_path(hash, filepath, buffer_size, use_mmap):
+    with open(filepath, 'rb') as fp:
+        if use_mmap and os.fstat(fp.fileno()).st_size > 0:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hash.update(mm)
+        else:
+            _update_from_file(hash, fp, buffer_size)
+
+
+def filehash(filepath=None, file=None, algorithm=DEFAULT_ALGORITHM,
+             buffer_size=BUFFER_SIZE, use_mmap=True):
     """生成文件内容 hash, file_content_hash
         filepath: string that file of path
-        return: md5 hash
+        file: 已打开的二进制文件对象，从文件开头计算，计算后回到文件开头
+        algorithm: hashlib 支持的算法，如 md5、sha1、sha256、blake2b
+        buffer_size: 每次读取的字节数
+        use_mmap: 按 filepath 计算时使用 mmap 读取
+        return: hex digest
     """
 
-    hash = hashlib.md5()
-    fp = None
-    chunk = 0
+    hash = hashlib.new(algorithm)
 
     if filepath:
-        fp = open(filepath, 'rb')
+        _update_from_path(hash, filepath, buffer_size, use_mmap)
     elif file:
-        fp = file
+        seekable = getattr(file, 'seekable', lambda: False)()
+        if seekable:
+            file.seek(0)
+        _update_from_file(hash, file, buffer_size)
+        if seekable:
+            file.seek(0)
     else:
         raise Exception('arguments: filepath or file need at least.')
 
-    while chunk != b'':
-        chunk = fp.read(2048)  # read 2048 bytes at a time
-        hash.update(chunk)
+    return hash.hexdigest()
 
-    if filepath:
-        fp.close()
 
-    return hash.hexdigest()
+def filehash_many(filepaths, processes=None, **kwargs):
+    """多进程计算一组文件的 hash，返回顺序与 filepaths 一致
+        processes: 进程数，默认为 CPU 核数
+        kwargs: 传给 filehash 的参数
+    """
+
+    filepaths = list(filepaths)
+    if processes == 1 or len(filepaths) < 2:
+        return [filehash(filepath, **kwargs) for filepath in filepaths]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(
+            functools.partial(filehash, **kwargs), filepaths))
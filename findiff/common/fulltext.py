@@ -0,0 +1,80 @@
+"""MySQL 全文索引（ngram 分词）检索
+
+1. fulltext_index 生成建索引的迁移操作，仅在 MySQL 上执行
+2. match_against 生成 MATCH ... AGAINST 条件，可直接用于 filter
+3. FullTextSearchFilter 替代 SearchFilter，在 MySQL 上使用全文索引，
+   其他数据库或检索词过短时退回 icontains
+
+NOTE ngram 分词长度由 MySQL 的 ngram_token_size 决定，默认 2，
+短于该长度的检索词无法使用全文索引
+"""
+from django.db import connections, migrations
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+NGRAM_TOKEN_SIZE = 2
+
+
+def fulltext_index(table, name, columns):
+    """创建 ngram 全文索引的迁移操作，非 MySQL 数据库跳过"""
+
+    def forwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'mysql':
+            return
+        quote = schema_editor.quote_name
+        schema_editor.execute(
+            f'ALTER TABLE {quote(table)} ADD FULLTEXT INDEX {quote(name)} '
+            f'({", ".join(quote(column) for column in columns)}) '
+            f'WITH PARSER ngram')
+
+    def backwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'mysql':
+            return
+        quote = schema_editor.quote_name
+        schema_editor.execute(
+            f'ALTER TABLE {quote(table)} DROP INDEX {quote(name)}')
+
+    return migrations.RunPython(forwards, backwards)
+
+
+def fulltext_available(queryset, terms):
+    """queryset 所在数据库是 MySQL 且每个检索词都不短于分词长度"""
+
+    return connections[queryset.db].vendor == 'mysql' and all(
+        len(term) >= NGRAM_TOKEN_SIZE for term in terms)
+
+
+def boolean_query(terms):
+    """检索词转为 BOOLEAN MODE 查询串，每个词都必须以短语形式出现"""
+
+    return ' '.join('+"%s"' % term.replace('"', ' ') for term in terms)
+
+
+def match_against(model, columns, terms, score=False):
+    """MATCH(columns) AGAINST(terms IN BOOLEAN MODE)
+
+    score 为 True 时返回相关度表达式，用于 annotate、order_by
+    """
+
+    connection = connections['default']
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    match = ', '.join(f'{table}.{quote(column)}' for column in columns)
+    return RawSQL(
+        f'MATCH ({match}) AGAINST (%s IN BOOLEAN MODE)',
+        [boolean_query(terms)],
+        output_field=FloatField() if score else BooleanField(),
+    )
+
+
+class FullTextSearchFilter(SearchFilter):
+    """视图中 fulltext_fields 指定全文索引覆盖的列，
+    不能使用全文索引时按 search_fields 检索"""
+
+    def filter_queryset(self, request, queryset, view):
+        columns = getattr(view, 'fulltext_fields', None)
+        terms = self.get_search_terms(request)
+        if not columns or not terms or not fulltext_available(queryset, terms):
+            return super().filter_queryset(request, queryset, view)
+        return queryset.filter(match_against(queryset.model, columns, terms))
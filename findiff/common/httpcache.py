@@ -0,0 +1,108 @@
+"""接口响应缓存与 ETag 校验
+
+响应数据按 key 缓存，key 中带有版本号，数据变化时调用 bump_version
+递增版本号使缓存失效，版本号存放在数据库中，见 findiff.common.versions。
+客户端带 If-None-Match 且 ETag 未变化，或带 If-Modified-Since 且数据
+未更新时返回 304。
+
+Last-Modified 取数据的修改时间与版本号最后递增时间中较晚的一个：
+数据被删除、不再公开时没有可用的修改时间，但会递增版本号。
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import (
+    http_date, parse_etags, parse_http_date_safe, quote_etag)
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from findiff.common.versions import (
+    bump_versions, get_version_rows, get_versions)
+
+VERSION_KEY = 'httpcache:%s'
+RESPONSE_KEY = 'httpcache:%s:%s:%s'
+RESPONSE_TIMEOUT = 60 * 60
+
+
+def get_version(name):
+    return get_versions([VERSION_KEY % name])[VERSION_KEY % name]
+
+
+def bump_version(*names):
+    """事务提交后使 names 下全部缓存的响应失效"""
+
+    bump_versions([VERSION_KEY % name for name in names])
+
+
+def make_etag(data):
+    content = json.dumps(data, cls=JSONEncoder, sort_keys=True,
+                         ensure_ascii=False)
+    return quote_etag(hashlib.md5(content.encode()).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """按 If-None-Match、If-Modified-Since 判断客户端缓存是否仍有效"""
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in parse_etags(if_none_match)
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+    return bool(since and last_modified and last_modified <= since)
+
+
+def etag_response(request, data, etag, last_modified=None, max_age=None):
+    """客户端缓存有效时返回 304，否则返回数据并带上 ETag
+
+    last_modified: 数据最后修改时间的时间戳
+    max_age: 设置后带上 Cache-Control: public, max-age
+    """
+
+    if not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    if max_age is not None:
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def cached_response(request, name, build, params=None, depends=(),
+                    timeout=RESPONSE_TIMEOUT, max_age=None):
+    """缓存 build() 返回的数据，返回带 ETag 的响应
+
+    name: 缓存名称，bump_version(name) 使其失效
+    build: 无参函数，返回响应数据，或 (响应数据, 最后修改时间)
+    params: 影响响应内容的参数，默认使用请求的查询参数
+    depends: 响应同时依赖的其他缓存名称，与 name 的版本号一次读取
+    max_age: 允许客户端、CDN 缓存的秒数
+    """
+
+    names = [name, *depends]
+    rows = get_version_rows([VERSION_KEY % item for item in names])
+    versions, bumped = zip(*(rows[VERSION_KEY % item] for item in names))
+    if params is None:
+        params = sorted(request.query_params.lists())
+    digest = hashlib.md5(
+        json.dumps([params, versions[1:]]).encode()).hexdigest()
+    key = RESPONSE_KEY % (name, versions[0], digest)
+
+    cached = cache.get(key)
+    if cached is None:
+        data = build()
+        modified_times = [time for time in bumped if time]
+        if isinstance(data, tuple):
+            data, modified_time = data
+            if modified_time:
+                modified_times.append(modified_time)
+        last_modified = int(max(modified_times).timestamp()) \
+            if modified_times else None
+        cached = (make_etag(data), data, last_modified)
+        cache.set(key, cached, timeout)
+    etag, data, last_modified = cached
+    return etag_response(request, data, etag, last_modified, max_age)
@@ -1,7 +1,15 @@
+import base64
+import datetime
+import hashlib
+import json
 from collections import OrderedDict
 
+from django.core.cache import cache
+from django.db import connections
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class Pagination(pagination.PageNumberPagination):
@@ -26,3 +34,168 @@ class Pagination(pagination.PageNumberPagination):
             ret.update({"meta": meta})
 
         return Response(ret)
+
+
+class KeysetPagination(pagination.BasePagination):
+    """按 (created_time, id) 倒序的游标分页，返回格式与 Pagination 一致
+
+    1. next、previous 为带 cursor 参数的链接，翻页使用 WHERE 条件定位，
+       不再使用 OFFSET
+    2. 兼容旧的 page 参数，未传 cursor 时按 page 计算 OFFSET
+    3. 排序固定，传 ordering 参数时返回 400
+    4. count 不再每次 COUNT(*)：无过滤条件时使用 InnoDB 统计的估算行数，
+       有过滤条件时缓存 COUNT(*) 结果 count_cache_timeout 秒
+    """
+
+    page_size = pagination.api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    page_query_param = 'page'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    ordering_field = 'created_time'
+    count_cache_timeout = 60
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 \
+            else self.page_size
+
+    def encode_cursor(self, obj, direction):
+        value = getattr(obj, self.ordering_field)
+        data = json.dumps([value.isoformat(), obj.pk, direction])
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value, pk, direction = data
+            value = datetime.datetime.fromisoformat(value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound('无效的游标')
+        if direction not in ('next', 'previous'):
+            raise NotFound('无效的游标')
+        return value, pk, direction
+
+    def get_page_number(self, request):
+        try:
+            return max(int(request.query_params[self.page_query_param]), 1)
+        except (KeyError, ValueError):
+            return 1
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if self.ordering_query_param in request.query_params:
+            raise ValidationError({
+                self.ordering_query_param:
+                    f'按 {self.ordering_field} 倒序分页，不支持指定排序'})
+        self.page_size_value = self.get_page_size(request)
+        self.count = self.get_count(queryset)
+
+        field = self.ordering_field
+        cursor = request.query_params.get(self.cursor_query_param)
+        size = self.page_size_value
+
+        if cursor:
+            value, pk, direction = self.decode_cursor(cursor)
+            if direction == 'next':
+                queryset = queryset.filter(**{f'{field}__lte': value}).exclude(
+                    **{field: value, 'pk__gte': pk}).order_by(f'-{field}', '-pk')
+            else:
+                queryset = queryset.filter(**{f'{field}__gte': value}).exclude(
+                    **{field: value, 'pk__lte': pk}).order_by(field, 'pk')
+            rows = list(queryset[:size + 1])
+            has_more = len(rows) > size
+            rows = rows[:size]
+            if direction == 'previous':
+                rows.reverse()
+                self.has_next, self.has_previous = True, has_more
+            else:
+                self.has_next, self.has_previous = has_more, True
+        else:
+            offset = (self.get_page_number(request) - 1) * size
+            queryset = queryset.order_by(f'-{field}', '-pk')
+            rows = list(queryset[offset:offset + size + 1])
+            self.has_next = len(rows) > size
+            self.has_previous = offset > 0
+            rows = rows[:size]
+
+        self.rows = rows
+        return rows
+
+    def get_count(self, queryset):
+        queryset = queryset.order_by()
+        if not queryset.query.where:
+            estimate = self.estimate_table_rows(queryset)
+            if estimate is not None:
+                return estimate
+
+        sql = str(queryset.query).encode()
+        key = 'pagination:count:%s' % hashlib.md5(sql).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def estimate_table_rows(self, queryset):
+        """InnoDB 统计的表行数，非 MySQL 返回 None"""
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'mysql':
+            return None
+
+        table = queryset.model._meta.db_table
+        key = f'pagination:table_rows:{table}'
+        rows = cache.get(key)
+        if rows is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                    'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                    [table],
+                )
+                row = cursor.fetchone()
+            rows = int(row[0] or 0) if row else 0
+            cache.set(key, rows, self.count_cache_timeout)
+        return rows
+
+    def get_link(self, obj, direction):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(obj, direction))
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self.get_link(self.rows[-1], 'next')
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self.get_link(self.rows[0], 'previous')
+
+    def get_paginated_response(self, data, meta=None):
+        page_size = self.page_size_value
+
+        total_page = int(self.count / page_size)
+        if self.count % page_size:
+            total_page += 1
+
+        ret = OrderedDict([
+            ('count', self.count),
+            ('page_size', page_size),
+            ('total_page', total_page),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ])
+        if meta:
+            ret.update({"meta": meta})
+
+        return Response(ret)
@@ -0,0 +1,46 @@
+"""用户权限缓存
+
+缓存 key 中带有全局版本号和用户版本号：
+    1. 角色权限变化、角色删除、权限配置变化时递增全局版本号，全部用户的缓存失效
+    2. 用户角色、用户权限变化时递增该用户的版本号
+
+版本号存放在 CacheVersion 表中并在 CACHES 中缓存副本，见 findiff.common.versions，
+缓存命中时检查权限不查询数据库
+"""
+from django.core.cache import cache
+
+from findiff.common.versions import bump_versions, get_versions
+
+PERMS_VERSION_KEY = 'perms:version'
+USER_PERMS_VERSION_KEY = 'perms:version:user:%s'
+USER_PERMS_KEY = 'perms:user:%s:%s:%s'
+PERMS_TIMEOUT = 24 * 60 * 60
+
+
+def get_perms_version(user_id):
+    """返回 (全局版本号, 用户版本号)"""
+
+    user_key = USER_PERMS_VERSION_KEY % user_id
+    versions = get_versions([PERMS_VERSION_KEY, user_key])
+    return versions[PERMS_VERSION_KEY], versions[user_key]
+
+
+def get_user_perms(user):
+    """用户全部权限，等同于 user.get_all_permissions()，结果按版本号缓存"""
+
+    key = USER_PERMS_KEY % (user.id, *get_perms_version(user.id))
+    perms = cache.get(key)
+    if perms is None:
+        perms = user.get_all_permissions()
+        cache.set(key, perms, PERMS_TIMEOUT)
+    return perms
+
+
+def bump_perms_version(user_ids=None):
+    """事务提交后递增权限版本号，user_ids 为空时递增全局版本号"""
+
+    if user_ids is None:
+        keys = [PERMS_VERSION_KEY]
+    else:
+        keys = [USER_PERMS_VERSION_KEY % user_id for user_id in user_ids]
+    bump_versions(keys)
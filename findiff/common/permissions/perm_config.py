@@ -2,6 +2,8 @@ import itertools
 from functools import reduce
 from django.contrib.auth.models import Permission, ContentType
 
+from .cache import bump_perms_version
+
 # BUG NOTIFY_AUTH 不存在的时候，无法分配该权限给角色
 # from django.conf import settings
 # NOTIFY_AUTH = getattr(settings, 'NOTIFY_AUTH', '')
@@ -120,3 +122,4 @@ def insert_perms_to_db():
             "content_type": content_type
         }
         Permission.objects.update_or_create(defaults=default, codename=codename)
+    bump_perms_version()
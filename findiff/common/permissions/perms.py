@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .cache import get_user_perms
+
 
 class PermsRequired(permissions.BasePermission):
 
@@ -15,5 +17,12 @@ class PermsRequired(permissions.BasePermission):
         if user.is_superuser:
             return True
 
-        user_perms = user.get_all_permissions()
+        if not user.is_authenticated:
+            return False
+
+        # token 权限声明构造的用户直接使用声明中的权限，不访问缓存和数据库
+        if hasattr(user, 'token'):
+            user_perms = user.get_all_permissions()
+        else:
+            user_perms = get_user_perms(user)
         return True if user_perms & set(self.perms) else False
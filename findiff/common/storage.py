@@ -0,0 +1,209 @@
+"""按内容 hash 存储上传文件
+
+文件按 hash 前缀分两级目录存储：<hash[:2]>/<hash[2:4]>/<hash><suffix>，
+hash 算法由 settings.MEDIA_HASH_ALGORITHM 指定，默认 md5。
+相同内容只落盘一次：
+    1. 已落盘的临时上传文件：读一遍计算 hash，目标不存在时直接 rename 过去；
+       临时目录与 MEDIA_ROOT 不在同一文件系统时先复制到分片目录再 rename
+    2. 内存中的上传文件：先在内存计算 hash，目标不存在时才写盘
+    3. 其他文件流：边读边计算 hash 边写临时文件，完成后原子 rename，
+       目标已存在时丢弃临时文件
+写入的文件 fsync 后才 rename 到 hash 路径，中途失败不会留下内容不完整的文件。
+
+文件被哪些数据引用记录在 MediaFile 引用计数表中，引用数据创建、删除时
+调用 acquire、release 维护计数，gc_media 命令只清理计数归零的文件。
+"""
+import datetime
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db.models import Case, F, IntegerField, Value, When
+
+from findiff.common.filehash import DEFAULT_ALGORITHM, filehash
+from findiff.models import MediaFile
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+def _algorithm():
+    return getattr(settings, 'MEDIA_HASH_ALGORITHM', DEFAULT_ALGORITHM)
+
+
+def _file_mode():
+    return settings.FILE_UPLOAD_PERMISSIONS or 0o644
+
+
+def _read_chunks(fp):
+    if hasattr(fp, 'seek'):
+        fp.seek(0)
+    while True:
+        chunk = fp.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _hash_chunks(chunks):
+    hash = hashlib.new(_algorithm())
+    for chunk in chunks:
+        hash.update(chunk)
+    return hash.hexdigest()
+
+
+def shard_path(root, digest, suffix):
+    """hash 对应的分片存储路径，并确保分片目录存在"""
+
+    directory = Path(root) / digest[:2] / digest[2:4]
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'{digest}{suffix}'
+
+
+def _exists(target):
+    """文件已存在时刷新 mtime，避免被 gc_media 当作过期文件清理"""
+
+    try:
+        os.utime(target)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _same_filesystem(path, directory):
+    return os.stat(path).st_dev == os.stat(directory).st_dev
+
+
+def _store_temporary(upload, root, suffix):
+    path = upload.temporary_file_path()
+    digest = filehash(filepath=path, algorithm=_algorithm())
+    target = shard_path(root, digest, suffix)
+    if _exists(target):
+        return target
+    if _same_filesystem(path, target.parent):
+        with open(path, 'rb') as fp:
+            os.fsync(fp.fileno())
+        os.chmod(path, _file_mode())
+    else:
+        # NOTE 跨文件系统时 rename 不可用，先完整复制到同一目录再原子替换
+        with open(path, 'rb') as fp:
+            path = _write_temp(_read_chunks(fp), target.parent)
+    os.replace(path, target)
+    return target
+
+
+def _store_in_memory(upload, root, suffix):
+    target = shard_path(root, _hash_chunks(upload.chunks()), suffix)
+    if not _exists(target):
+        os.replace(_write_temp(upload.chunks(), root), target)
+    return target
+
+
+def _store_stream(fp, root, suffix):
+    hash = hashlib.new(_algorithm())
+
+    def chunks():
+        for chunk in _read_chunks(fp):
+            hash.update(chunk)
+            yield chunk
+
+    tmp_path = _write_temp(chunks(), root)
+    target = shard_path(root, hash.hexdigest(), suffix)
+    if _exists(target):
+        os.unlink(tmp_path)
+    else:
+        os.replace(tmp_path, target)
+    return target
+
+
+def _write_temp(chunks, directory):
+    """写入 directory 下的临时文件并 fsync，返回临时文件路径"""
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        os.chmod(tmp_path, _file_mode())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+
+def store_file(fp, name, root=None):
+    """存储文件，返回相对 root 的文件路径
+
+    fp: Django UploadedFile 或任意二进制文件对象
+    name: 原始文件名，用于保留后缀
+    root: 存储目录，默认 settings.MEDIA_ROOT
+    """
+
+    root = Path(root or settings.MEDIA_ROOT)
+    suffix = Path(name).suffix
+    if hasattr(fp, 'temporary_file_path'):
+        target = _store_temporary(fp, root, suffix)
+    elif isinstance(fp, InMemoryUploadedFile):
+        target = _store_in_memory(fp, root, suffix)
+    else:
+        target = _store_stream(fp, root, suffix)
+    return target.relative_to(root).as_posix()
+
+
+def media_name(url):
+    """访问 URL 转为相对 MEDIA_ROOT 的文件路径"""
+
+    if url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):]
+    return url
+
+
+def _update_ref_count(counts, sign):
+    MediaFile.objects.filter(name__in=counts).update(
+        ref_count=F('ref_count') + Case(
+            *[When(name=name, then=Value(sign * count))
+              for name, count in counts.items()],
+            output_field=IntegerField(),
+        ),
+        updated_time=datetime.datetime.now(),
+    )
+
+
+def register(names):
+    """登记新写入的文件，引用数为 0，未被引用时由 gc_media 在宽限期后清理
+
+    NOTE 在创建引用数据的事务之前调用，事务回滚后写入的文件仍能被回收
+    """
+
+    names = set(names)
+    if names:
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name) for name in names],
+            ignore_conflicts=True,
+        )
+
+
+def acquire(names):
+    """增加文件引用计数，names 中重复的文件按出现次数计数"""
+
+    counts = Counter(names)
+    if not counts:
+        return
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in counts],
+        ignore_conflicts=True,
+    )
+    _update_ref_count(counts, 1)
+
+
+def release(names):
+    """减少文件引用计数，计数归零的文件由 gc_media 清理"""
+
+    counts = Counter(names)
+    if counts:
+        _update_ref_count(counts, -1)
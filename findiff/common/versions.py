@@ -0,0 +1,78 @@
+"""缓存版本号
+
+缓存 key 中带上版本号，数据变化时递增版本号使旧缓存失效。版本号存放在
+CacheVersion 表中，不会像 CACHES 中的 key 一样被淘汰后回退为 0；
+递增使用 UPDATE ... SET value = value + 1，并发递增不会丢失。
+
+读取时先读 CACHES 中的副本，未命中时查询 CacheVersion 表并缓存
+VERSION_TIMEOUT 秒；递增后用表中的新版本号覆盖副本。
+NOTE 副本被淘汰时回退为查询表，版本号不会回退；多台服务器不共享 CACHES 时，
+其他服务器最多在 VERSION_TIMEOUT 秒后读到新版本号
+"""
+import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from findiff.models import CacheVersion
+
+VERSION_KEY = 'version:%s'
+VERSION_TIMEOUT = 60
+
+
+def get_version_rows(names):
+    """返回 {名称: (版本号, 最后递增时间)}，从未递增过的为 (0, None)"""
+
+    cached = cache.get_many([VERSION_KEY % name for name in names])
+    rows = {name: cached[VERSION_KEY % name] for name in names
+            if VERSION_KEY % name in cached}
+    missing = [name for name in names if name not in rows]
+    if missing:
+        found = {name: (value, updated_time) for name, value, updated_time
+                 in CacheVersion.objects.filter(name__in=missing).values_list(
+                     'name', 'value', 'updated_time')}
+        for name in missing:
+            rows[name] = found.get(name, (0, None))
+            # NOTE 使用 add，不覆盖查询期间递增后写入的新版本号
+            cache.add(VERSION_KEY % name, rows[name], VERSION_TIMEOUT)
+    return {name: rows[name] for name in names}
+
+
+def get_versions(names):
+    """返回 {名称: 版本号}，从未递增过的版本号为 0"""
+
+    return {name: value
+            for name, (value, _) in get_version_rows(names).items()}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_versions(names):
+    """事务提交后递增版本号
+
+    NOTE 提交前递增时，并发请求可能按新版本号缓存提交前的数据
+    """
+
+    names = sorted(set(names))
+    if not names:
+        return
+
+    def bump():
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(name=name) for name in names],
+            ignore_conflicts=True,
+        )
+        CacheVersion.objects.filter(name__in=names).update(
+            value=F('value') + 1,
+            updated_time=datetime.datetime.now(),
+        )
+        rows = CacheVersion.objects.filter(name__in=names).values_list(
+            'name', 'value', 'updated_time')
+        cache.set_many({VERSION_KEY % name: (value, updated_time)
+                        for name, value, updated_time in rows},
+                       VERSION_TIMEOUT)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from findiff.common.filehash import filehash, filehash_many
+
+
+def parse_size(value):
+    """解析 64K、1M 这样的字节数"""
+
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    value = value.strip().upper()
+    if value[-1] in units:
+        return int(value[:-1]) * units[value[-1]]
+    return int(value)
+
+
+class Command(BaseCommand):
+    help = '对比不同 hash 算法、缓冲区大小、mmap 及多进程下 filehash 的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', default='32M', help='每个测试文件的大小，默认 32M')
+        parser.add_argument(
+            '--files', type=int, default=8, help='多进程测试的文件数，默认 8')
+        parser.add_argument(
+            '--processes', type=int, default=None, help='多进程测试的进程数')
+        parser.add_argument(
+            '--algorithms',
+            default='md5,sha1,sha256,blake2b',
+            help='逗号分隔的算法列表',
+        )
+        parser.add_argument(
+            '--buffer-sizes',
+            default='2K,64K,1M,8M',
+            help='逗号分隔的缓冲区大小列表',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3, help='每项取最好成绩的重复次数')
+
+    def measure(self, func, total_bytes, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            cost = time.perf_counter() - start
+            best = cost if best is None else min(best, cost)
+        return total_bytes / best / 1024 ** 2
+
+    def report(self, algorithm, mode, mbps):
+        self.stdout.write(f'{algorithm:<10}{mode:<24}{mbps:>10.1f} MB/s')
+
+    def handle(self, *args, **options):
+        size = parse_size(options['size'])
+        repeat = options['repeat']
+        algorithms = options['algorithms'].split(',')
+        buffer_sizes = [parse_size(value)
+                        for value in options['buffer_sizes'].split(',')]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for index in range(max(options['files'], 1)):
+                path = os.path.join(tmpdir, f'{index}.bin')
+                with open(path, 'wb') as fp:
+                    fp.write(os.urandom(size))
+                paths.append(path)
+            path = paths[0]
+
+            self.stdout.write(f'{"algorithm":<10}{"mode":<24}{"throughput":>15}')
+            for algorithm in algorithms:
+                for buffer_size in buffer_sizes:
+                    def stream():
+                        with open(path, 'rb') as fp:
+                            filehash(file=fp, algorithm=algorithm,
+                                     buffer_size=buffer_size)
+                    mbps = self.measure(stream, size, repeat)
+                    self.report(algorithm, f'read {buffer_size // 1024}K', mbps)
+
+                mbps = self.measure(
+                    lambda: filehash(filepath=path, algorithm=algorithm),
+                    size, repeat)
+                self.report(algorithm, 'mmap', mbps)
+
+                mbps = self.measure(
+                    lambda: filehash_many(
+                        paths, processes=options['processes'],
+                        algorithm=algorithm),
+                    size * len(paths), repeat)
+                self.report(algorithm, f'mmap x{len(paths)} files pool', mbps)
@@ -0,0 +1,98 @@
+import datetime
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from findiff.models import MediaFile
+
+
+class Command(BaseCommand):
+    help = '清理引用数归零的媒体文件，只读取引用计数表，不扫描目录'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=24,
+            help='引用数归零超过该时长才清理，默认 24 小时',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批处理的文件数',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只列出将被清理的文件',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = datetime.datetime.now() - datetime.timedelta(
+            hours=options['grace_hours'])
+        root = Path(settings.MEDIA_ROOT)
+        last_id = 0
+        removed = 0
+
+        while True:
+            candidates = MediaFile.objects.filter(
+                ref_count__lte=0,
+                updated_time__lt=cutoff,
+                id__gt=last_id,
+            ).order_by('id')
+            with transaction.atomic():
+                # 锁定候选行，清理期间新的引用会等待本批次结束
+                batch = list(candidates.select_for_update(
+                    skip_locked=True)[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                expired = []
+                for media in batch:
+                    path = root / media.name
+                    if options['dry_run']:
+                        if self.recently_used(path, cutoff):
+                            continue
+                    elif not self.remove(path, cutoff):
+                        continue
+                    expired.append(media.id)
+                    self.stdout.write(media.name)
+
+                if not options['dry_run']:
+                    MediaFile.objects.filter(id__in=expired).delete()
+                removed += len(expired)
+
+        self.stdout.write(self.style.SUCCESS(f'已清理 {removed} 个文件'))
+
+    def recently_used(self, path, cutoff):
+        """去重命中时 storage 会刷新 mtime，说明文件刚被复用"""
+
+        try:
+            return path.stat().st_mtime > cutoff.timestamp()
+        except FileNotFoundError:
+            return False
+
+    def remove(self, path, cutoff):
+        """删除文件，文件刚被复用时保留，返回是否已删除
+
+        NOTE 先原子改名再检查 mtime：改名前被复用的文件 mtime 已刷新，
+        改名后 storage 刷新 mtime 失败会重新写入文件，检查与删除之间
+        不会有被复用的文件被删除
+        """
+
+        trash = path.with_name(f'.gc-{path.name}')
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return True
+        if self.recently_used(trash, cutoff):
+            # 期间重新写入的文件内容相同，直接覆盖
+            os.replace(trash, path)
+            return False
+        os.unlink(trash)
+        return True
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findiff', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='相对 MEDIA_ROOT 的文件路径', max_length=200, unique=True, verbose_name='文件路径')),
+                ('ref_count', models.IntegerField(default=0, help_text='引用该文件的数据条数，归零后由 gc_media 清理', verbose_name='引用数')),
+                ('created_time', models.DateTimeField(auto_now_add=True, help_text='数据入库时间', verbose_name='创建时间')),
+                ('updated_time', models.DateTimeField(auto_now=True, help_text='引用数最后变更时间', verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '媒体文件',
+                'verbose_name_plural': '媒体文件',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mediafile',
+            index=models.Index(fields=['ref_count', 'updated_time'], name='media_gc_idx'),
+        ),
+    ]
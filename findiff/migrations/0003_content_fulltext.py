@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from findiff.common.fulltext import fulltext_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findiff', '0002_mediafile'),
+    ]
+
+    operations = [
+        fulltext_index('findiff_book', 'book_name_ft', ['book_name']),
+        fulltext_index('findiff_article', 'article_content_ft',
+                       ['article_title', 'content_text']),
+    ]
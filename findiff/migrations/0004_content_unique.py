@@ -0,0 +1,21 @@
+# Generated by Django 3.2.5 on 2026-10-19 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findiff', '0003_content_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='article',
+            constraint=models.UniqueConstraint(fields=('book_id', 'article_snum'), name='article_book_snum_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('book_snum',), name='book_snum_uniq'),
+        ),
+    ]
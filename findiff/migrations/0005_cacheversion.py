@@ -0,0 +1,26 @@
+# Generated by Django 3.2.5 on 2026-10-19 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findiff', '0004_content_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='名称')),
+                ('value', models.BigIntegerField(default=0, verbose_name='版本号')),
+                ('updated_time', models.DateTimeField(auto_now=True, help_text='版本号最后递增时间', verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '缓存版本号',
+                'verbose_name_plural': '缓存版本号',
+            },
+        ),
+    ]
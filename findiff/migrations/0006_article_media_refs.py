@@ -0,0 +1,38 @@
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import F
+
+from findiff.common.storage import media_name
+
+
+def update_refs(apps, sign):
+    """已有文章的扫描件计入引用数，避免删除文章时误减原始数据的引用"""
+
+    Article = apps.get_model('findiff', 'Article')
+    MediaFile = apps.get_model('findiff', 'MediaFile')
+    counts = Counter(
+        media_name(url) for url in Article.objects.values_list(
+            'content_image', flat=True).iterator())
+    for name, count in counts.items():
+        MediaFile.objects.filter(name=name).update(
+            ref_count=F('ref_count') + sign * count)
+
+
+def forwards(apps, schema_editor):
+    update_refs(apps, 1)
+
+
+def backwards(apps, schema_editor):
+    update_refs(apps, -1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('findiff', '0005_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -1 +1,3 @@
 from .content import Author, Book, Article  # noqa: F401
+from .media import MediaFile  # noqa: F401
+from .version import CacheVersion  # noqa: F401
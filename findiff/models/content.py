@@ -128,6 +128,11 @@ class Book(models.Model):
     class Meta:
         verbose_name = '书籍'
         verbose_name_plural = verbose_name
+        constraints = [
+            # NOTE 校对结果发布（promote_audit_orders）按书籍编号更新书籍
+            models.UniqueConstraint(
+                fields=['book_snum'], name='book_snum_uniq'),
+        ]
 
 
 class Article(models.Model):
@@ -227,3 +232,8 @@ class Article(models.Model):
     class Meta:
         verbose_name = '文章'
         verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(
+                fields=['book_id', 'article_snum'],
+                name='article_book_snum_uniq'),
+        ]
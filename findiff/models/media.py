@@ -0,0 +1,40 @@
+from django.db import models
+
+
+class MediaFile(models.Model):
+    '''媒体文件引用计数表，文件按内容 hash 去重存储'''
+
+    name = models.CharField(
+        '文件路径',
+        help_text='相对 MEDIA_ROOT 的文件路径',
+        max_length=200,
+        unique=True,
+    )
+    ref_count = models.IntegerField(
+        '引用数',
+        help_text='引用该文件的数据条数，归零后由 gc_media 清理',
+        default=0,
+    )
+    created_time = models.DateTimeField(
+        '创建时间',
+        help_text='数据入库时间',
+        auto_now_add=True,
+    )
+    updated_time = models.DateTimeField(
+        '更新时间',
+        help_text='引用数最后变更时间',
+        auto_now=True,
+    )
+
+    def __str__(self):
+        return f'{self.id}-{self.name}'
+
+    class Meta:
+        verbose_name = '媒体文件'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(
+                fields=['ref_count', 'updated_time'],
+                name='media_gc_idx',
+            ),
+        ]
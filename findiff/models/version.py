@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class CacheVersion(models.Model):
+    '''缓存版本号，递增后 key 中带有旧版本号的缓存失效
+
+    NOTE 版本号被缓存淘汰后会回退为 0，重新命中旧版本的缓存，
+    所以存放在数据库中，不放在 CACHES 里
+    '''
+
+    name = models.CharField(
+        '名称',
+        max_length=200,
+        unique=True,
+    )
+    value = models.BigIntegerField(
+        '版本号',
+        default=0,
+    )
+    updated_time = models.DateTimeField(
+        '更新时间',
+        help_text='版本号最后递增时间',
+        auto_now=True,
+    )
+
+    def __str__(self):
+        return f'{self.name}-{self.value}'
+
+    class Meta:
+        verbose_name = '缓存版本号'
+        verbose_name_plural = verbose_name
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'findiff.apps.fguserprofile',
     'findiff.apps.userauth',
     'findiff.apps.review',
+    'findiff.apps.content',
     *config.INSTALLED_APPS,
 ]
 
@@ -94,6 +95,20 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# NOTE 权限缓存、接口响应缓存等需要在 uwsgi 多进程间共享，不能使用进程内缓存；
+# 缓存可能被淘汰，版本号等不能丢失的数据存放在数据库（findiff.common.versions）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/data/cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -186,13 +201,40 @@ LOGGING = {
     },
 }
 
+# 领单预取队列，配置为 None 时直接从数据库锁行领单
+# 可选 BACKEND：
+#   findiff.apps.review.dispatch_queue.MemoryDispatchQueue  进程内队列
+#   findiff.apps.review.dispatch_queue.CacheDispatchQueue   基于 CACHES 的共享队列
+# NOTE uwsgi 多进程时每个进程的 MemoryDispatchQueue 会预取相同的工单，
+# CacheDispatchQueue 需要 Redis 等支持原子 add 的共享缓存，默认不使用队列
+# 配置示例：
+#   DISPATCH_QUEUE = {
+#       'BACKEND': 'findiff.apps.review.dispatch_queue.CacheDispatchQueue',
+#       'OPTIONS': {'batch_size': 200},
+#   }
+DISPATCH_QUEUE = None
+
+# 工单状态变化事件的进程内缓冲，满 batch_size 条或超过 flush_interval 秒
+# 批量写入，配置为 None 时逐条写入
+AUDIT_EVENT_BUFFER = {
+    'batch_size': 100,
+    'flush_interval': 10,
+}
+
+# 媒体文件去重使用的 hash 算法，修改后新上传文件不再与已存储文件去重
+MEDIA_HASH_ALGORITHM = 'md5'
+
+# 初审、复审结果按压缩补丁存储（OCR → 初审 → 复审），只影响之后写入的结果，
+# 已有数据使用 convert_audit_results 命令转换
+AUDIT_RESULT_PATCH = False
+
 # Thrid lib settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'findiff.apps.userauth.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
@@ -242,6 +284,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT', ),
 }
 
+# 签发的 token 中写入权限声明，鉴权时不再查询用户和权限
+# 权限版本号变化后 token 失效，需使用 refresh token 重新获取
+JWT_PERMS_CLAIMS = False
+
 # django-cors-headers
 # https://github.com/adamchainz/django-cors-headers#cors_allow_all_origins
 CORS_ALLOW_ALL_ORIGINS = True
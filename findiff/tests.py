@@ -0,0 +1,232 @@
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from findiff.apps.review.models import RawData
+from findiff.apps.userprofile.models import UserProfile
+from findiff.common import storage
+from findiff.common.filehash import filehash, filehash_many
+from findiff.management.commands.gc_media import Command
+from findiff.models import Article, Author, Book, MediaFile
+
+
+def temporary_upload(content, name='0001.png'):
+    upload = TemporaryUploadedFile(name, 'image/png', len(content), None)
+    upload.write(content)
+    upload.flush()
+    return upload
+
+
+class MediaRootMixin(object):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(MEDIA_ROOT=str(self.root))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def files(self):
+        return sorted(path.relative_to(self.root).as_posix()
+                      for path in self.root.rglob('*') if path.is_file())
+
+
+class StorageTest(MediaRootMixin, TestCase):
+    """按内容 hash 存储：中途失败不会在 hash 路径留下不完整的文件"""
+
+    def test_store_temporary(self):
+        content = os.urandom(3 * storage.CHUNK_SIZE // 2)
+        digest = hashlib.md5(content).hexdigest()
+        expected = f'{digest[:2]}/{digest[2:4]}/{digest}.png'
+        for same_filesystem in (True, False):
+            with mock.patch.object(storage, '_same_filesystem',
+                                   return_value=same_filesystem):
+                upload = temporary_upload(content)
+                self.assertEqual(storage.store_file(upload, upload.name),
+                                 expected)
+                upload.close()
+            self.assertEqual((self.root / expected).read_bytes(), content)
+            self.assertEqual(self.files(), [expected])
+            os.unlink(self.root / expected)
+
+    def test_partial_write(self):
+        content = os.urandom(3 * storage.CHUNK_SIZE)
+        digest = hashlib.md5(content).hexdigest()
+        target = self.root / digest[:2] / digest[2:4] / f'{digest}.png'
+        read_chunks = storage._read_chunks
+
+        def fail_after_first_chunk(fp):
+            chunks = read_chunks(fp)
+            yield next(chunks)
+            raise OSError(28, 'No space left on device')
+
+        upload = temporary_upload(content)
+        with mock.patch.object(storage, '_same_filesystem',
+                               return_value=False), \
+                mock.patch.object(storage, '_read_chunks',
+                                  fail_after_first_chunk):
+            with self.assertRaises(OSError):
+                storage.store_file(upload, upload.name)
+        self.assertFalse(target.exists())
+        self.assertEqual(self.files(), [])
+
+        # 再次上传时完整写入
+        with mock.patch.object(storage, '_same_filesystem',
+                               return_value=False):
+            storage.store_file(upload, upload.name)
+        self.assertEqual(target.read_bytes(), content)
+        upload.close()
+
+
+class FileHashTest(TestCase):
+    """分块计算的 hash 与一次性计算整个文件的结果一致"""
+
+    def test_filehash(self):
+        content = os.urandom(3 * 1024 + 7)
+        with tempfile.NamedTemporaryFile() as fp:
+            fp.write(content)
+            fp.flush()
+            for algorithm in ('md5', 'sha256'):
+                expected = hashlib.new(algorithm, content).hexdigest()
+                for use_mmap in (True, False):
+                    self.assertEqual(filehash(
+                        fp.name, algorithm=algorithm, buffer_size=1024,
+                        use_mmap=use_mmap), expected)
+
+                # 从文件开头计算，计算后回到文件开头
+                fp.seek(100)
+                self.assertEqual(filehash(
+                    file=fp, algorithm=algorithm, buffer_size=1000), expected)
+                self.assertEqual(fp.tell(), 0)
+                self.assertEqual(filehash(
+                    file=io.BufferedReader(io.BytesIO(content)),
+                    algorithm=algorithm), expected)
+
+            self.assertEqual(filehash_many([fp.name] * 2, processes=1),
+                             [hashlib.md5(content).hexdigest()] * 2)
+
+        with tempfile.NamedTemporaryFile() as fp:
+            self.assertEqual(filehash(fp.name), hashlib.md5().hexdigest())
+
+
+class MediaRefTest(MediaRootMixin, TestCase):
+    """引用计数随数据创建、更换、删除增减，gc_media 只清理无引用的过期文件"""
+
+    def store(self, content):
+        name = storage.store_file(io.BytesIO(content), 'scan.png')
+        return name, f'/media/{name}'
+
+    def ref_count(self, name):
+        return MediaFile.objects.get(name=name).ref_count
+
+    def create_raw_data(self, url):
+        raw_data = RawData.objects.create(
+            book_name='千字文', writing_mode='v', content_image=url,
+            content_text='天地玄黄', content_text_name='0001.txt',
+            content_image_name='0001.png')
+        storage.acquire([storage.media_name(url)])
+        return raw_data
+
+    def test_ref_count(self):
+        name, url = self.store(b'scan')
+        # 相同内容的文件只存一份，按引用数据计数
+        self.assertEqual(self.store(b'scan'), (name, url))
+        first = self.create_raw_data(url)
+        second = self.create_raw_data(url)
+        self.assertEqual(self.ref_count(name), 2)
+
+        operator = UserProfile.objects.create(
+            user=User.objects.create_user('editor'))
+        article = Article.objects.create(
+            book_id=Book.objects.create(
+                book_snum='B001', book_name='千字文', writing_mode='v',
+                reading_mode='rl', operator=operator),
+            author_id=Author.objects.create(name='周兴嗣', operator=operator),
+            article_snum='1', article_title='0001', content_image=url,
+            content_text='天地玄黄', operator=operator)
+        self.assertEqual(self.ref_count(name), 3)
+
+        # 更换扫描件时释放原文件、引用新文件
+        new_name, new_url = self.store(b'rescan')
+        article.content_image = new_url
+        article.save()
+        self.assertEqual(self.ref_count(name), 2)
+        self.assertEqual(self.ref_count(new_name), 1)
+        article.save(update_fields=['content_text'])
+        self.assertEqual(self.ref_count(new_name), 1)
+
+        article.delete()
+        first.delete()
+        self.assertEqual(self.ref_count(new_name), 0)
+        self.assertEqual(self.ref_count(name), 1)
+        second.delete()
+        self.assertEqual(self.ref_count(name), 0)
+
+    def expire(self, name, hours=48):
+        """引用数归零、文件 mtime 都在 hours 小时前"""
+
+        past = datetime.datetime.now() - datetime.timedelta(hours=hours)
+        MediaFile.objects.filter(name=name).update(updated_time=past)
+        os.utime(self.root / name, (past.timestamp(), past.timestamp()))
+
+    def gc(self):
+        call_command('gc_media', stdout=io.StringIO())
+
+    def test_gc(self):
+        names = [self.store(content)[0] for content in (b'a', b'b', b'c')]
+        storage.register(names)
+        for name in names:
+            self.expire(name)
+
+        # 宽限期内重新引用的文件不清理
+        storage.acquire([names[1]])
+        # 引用数仍为 0，但去重命中刷新了 mtime
+        self.assertEqual(self.store(b'c')[0], names[2])
+
+        self.gc()
+        self.assertFalse((self.root / names[0]).exists())
+        self.assertTrue((self.root / names[1]).exists())
+        self.assertTrue((self.root / names[2]).exists())
+        self.assertEqual(
+            sorted(MediaFile.objects.values_list('name', flat=True)),
+            sorted(names[1:]))
+
+        # 未过宽限期的无引用文件不清理
+        MediaFile.objects.filter(name=names[2]).update(
+            updated_time=datetime.datetime.now())
+        self.gc()
+        self.assertTrue((self.root / names[2]).exists())
+
+    def test_gc_reused_after_rename(self):
+        name = self.store(b'a')[0]
+        self.expire(name)
+        path = self.root / name
+        cutoff = datetime.datetime.now() - datetime.timedelta(hours=24)
+        rename = os.rename
+
+        def reuse_after_rename(source, target):
+            # 改名后、检查 mtime 前，同内容的文件被重新上传
+            rename(source, target)
+            self.store(b'a')
+
+        # 改名前被复用：mtime 已刷新，保留原文件
+        os.utime(path)
+        self.assertFalse(Command().remove(path, cutoff))
+        self.assertEqual(self.files(), [name])
+
+        # 改名后被复用：storage 重新写入文件，只删除改名后的旧文件
+        self.expire(name)
+        with mock.patch('os.rename', reuse_after_rename):
+            Command().remove(path, cutoff)
+        self.assertEqual(path.read_bytes(), b'a')
+        self.assertEqual(self.files(), [name])
@@ -42,6 +42,7 @@ urlpatterns = [
     path('auth/', include('findiff.apps.userauth.urls')),
     path('user/', include('findiff.apps.userprofile.urls')),
     path('order/', include('findiff.apps.review.urls')),
+    path('content/', include('findiff.apps.content.urls')),
     path('fguser/', include('findiff.apps.fguserprofile.url')),
 ]
 